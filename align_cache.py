@@ -0,0 +1,93 @@
+"""
+對齊結果快取：以 (音訊內容, 歌詞內容, 模型, 對齊參數) 為鍵保存對齊後的歌詞
+相同的歌曲與歌詞再次請求時直接回傳，不必重新執行 model.align
+每個 (音訊, 模型, 對齊參數) 另外記錄最近一次的對齊結果，歌詞修改後可據此增量對齊
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import config
+from content_hash import file_sha256, text_sha256
+from lyrics_store import COLUMNAR_SUFFIX, JSON_SUFFIX, read_document, write_document
+from metrics import record_cache
+
+
+class AlignmentCache:
+    """以內容雜湊為鍵的對齊結果快取"""
+
+    def __init__(self, cache_dir: str = os.path.join(config.CACHE_DIR, 'align')):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, audio_path: str, text: str, model_name: str,
+                 options: Optional[Dict[str, Any]] = None) -> str:
+        """產生快取鍵"""
+        parts = {
+            "audio": file_sha256(audio_path),
+            "text": text_sha256(text),
+            "model": model_name,
+            "options": options or {},
+        }
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def make_audio_key(self, audio_path: str, model_name: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """不含歌詞的鍵，用於找出同一段音訊最近一次的對齊結果"""
+        parts = {"audio": file_sha256(audio_path), "model": model_name, "options": options or {}}
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _read(self, key: str, suffixes: Tuple[str, ...] = (COLUMNAR_SUFFIX, JSON_SUFFIX)) -> Optional[Dict[str, Any]]:
+        for suffix in suffixes:
+            path = self._path(key, suffix)
+            if os.path.exists(path):
+                break
+        else:
+            return None
+        try:
+            return read_document(path)
+        except (OSError, ValueError) as e:
+            print(f"讀取對齊快取錯誤 ({key}): {e}")
+            return None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        取得快取的對齊結果（也讀取舊版的 .json 快取），不存在時回傳 None
+        檔案損壞而無法讀取時計為未命中
+        """
+        result = self._read(key)
+        record_cache('align', result is not None)
+        return result
+
+    def put(self, key: str, result: Dict[str, Any], audio_key: Optional[str] = None):
+        """
+        以欄式格式保存對齊結果（先寫入暫存檔再取代，避免讀到寫到一半的檔案）
+        有 audio_key 時同時記錄為該音訊最近一次的對齊結果
+        """
+        write_document(self._path(key, COLUMNAR_SUFFIX), result)
+        if audio_key is not None:
+            latest_path = self._path(f'latest-{audio_key}', '')
+            temp_path = f'{latest_path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(key)
+            os.replace(temp_path, latest_path)
+
+    def latest(self, audio_key: str) -> Optional[Dict[str, Any]]:
+        """同一段音訊最近一次的對齊結果，沒有時回傳 None"""
+        try:
+            with open(self._path(f'latest-{audio_key}', ''), 'r', encoding='utf-8') as f:
+                key = f.read().strip()
+        except OSError:
+            record_cache('align_latest', False)
+            return None
+        result = self._read(key, (COLUMNAR_SUFFIX,))
+        record_cache('align_latest', result is not None)
+        return result
+
+
+alignment_cache = AlignmentCache()
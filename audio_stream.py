@@ -0,0 +1,222 @@
+"""
+音訊檔案的 HTTP 範圍串流
+- 支援單一、開放式 (bytes=500-)、後綴 (bytes=-500) 及多重範圍 (multipart/byteranges)
+- 正確回應 206 / 416，並支援 ETag、Last-Modified、If-None-Match、If-Modified-Since、If-Range
+- 分塊讀取檔案，不會將整個範圍讀入記憶體；伺服器支援 ASGI zero-copy 擴充時直接以 sendfile 傳送
+"""
+import mimetypes
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+import config
+
+# 每次讀取並送出的大小
+CHUNK_SIZE = 256 * 1024
+
+# 範圍數量超過此值時忽略 Range，直接回傳整個檔案（避免被大量小範圍拖垮）
+MAX_RANGES = 16
+
+ByteRange = Tuple[int, int]  # [start, end)
+
+
+class RangeNotSatisfiable(Exception):
+    """Range 標頭中沒有任何可滿足的範圍"""
+
+
+def parse_range_header(value: str, file_size: int) -> Optional[List[ByteRange]]:
+    """
+    解析 Range 標頭，回傳排序並合併後的 [start, end) 範圍
+    格式錯誤時回傳 None（依 RFC 9110 忽略該標頭），全部範圍都無法滿足時拋出 RangeNotSatisfiable
+    """
+    units, _, range_set = value.partition('=')
+    if units.strip().lower() != 'bytes' or not range_set.strip():
+        return None
+
+    ranges: List[ByteRange] = []
+    for spec in range_set.split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        first, sep, last = spec.partition('-')
+        first, last = first.strip(), last.strip()
+        if not sep or not (first.isdigit() or last.isdigit()):
+            return None
+        if first and last and not (first.isdigit() and last.isdigit()):
+            return None
+
+        if not first:
+            # 後綴範圍：最後 N 個位元組
+            suffix_length = int(last)
+            if suffix_length == 0:
+                continue
+            ranges.append((max(0, file_size - suffix_length), file_size))
+            continue
+
+        start = int(first)
+        end = int(last) + 1 if last else file_size
+        if last and end <= start:
+            return None
+        if start >= file_size:
+            continue
+        ranges.append((start, min(end, file_size)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    # 合併重疊或相鄰的範圍
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """以檔案大小與修改時間產生強 ETag"""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def _etag_matches(header_value: str, etag: str) -> bool:
+    """If-None-Match 使用弱比較"""
+    if header_value.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in header_value.split(',')]
+    return any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+def _not_modified_since(header_value: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header_value).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+
+class RangeFileResponse(Response):
+    """依範圍分塊串流檔案"""
+
+    def __init__(self, path: str, file_size: int, ranges: Optional[List[ByteRange]],
+                 headers: dict, media_type: str):
+        self.path = path
+        self.file_size = file_size
+        self.ranges = ranges
+        self.media_type = media_type
+        self.background = None
+        self.boundary: Optional[str] = None
+        self.part_headers: List[bytes] = []
+
+        if ranges is None:
+            self.status_code = 200
+            content_length = file_size
+        elif len(ranges) == 1:
+            self.status_code = 206
+            start, end = ranges[0]
+            headers['Content-Range'] = f'bytes {start}-{end - 1}/{file_size}'
+            content_length = end - start
+        else:
+            self.status_code = 206
+            self.boundary = secrets.token_hex(16)
+            self.part_headers = [
+                (f'--{self.boundary}\r\nContent-Type: {media_type}\r\n'
+                 f'Content-Range: bytes {start}-{end - 1}/{file_size}\r\n\r\n').encode('latin-1')
+                for start, end in ranges
+            ]
+            content_length = sum(len(h) for h in self.part_headers) \
+                + sum(end - start for start, end in ranges) \
+                + 2 * len(ranges) + len(self._closing_boundary())
+            # 多重範圍的 Content-Type 改為 multipart
+            self.media_type = f'multipart/byteranges; boundary={self.boundary}'
+
+        headers['Content-Length'] = str(content_length)
+        self.init_headers(headers)
+
+    def _closing_boundary(self) -> bytes:
+        return f'--{self.boundary}--\r\n'.encode('latin-1')
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        zero_copy = "http.response.zerocopy" in scope.get("extensions", {})
+        ranges = self.ranges if self.ranges is not None else [(0, self.file_size)]
+        with open(self.path, 'rb') as file:
+            for index, (start, end) in enumerate(ranges):
+                if self.boundary is not None:
+                    await send({"type": "http.response.body", "body": self.part_headers[index], "more_body": True})
+                if zero_copy:
+                    await send({"type": "http.response.zerocopy", "file": file,
+                                "offset": start, "count": end - start, "more_body": True})
+                else:
+                    await self._send_chunks(send, file, start, end)
+                if self.boundary is not None:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+        closing = self._closing_boundary() if self.boundary is not None else b""
+        await send({"type": "http.response.body", "body": closing, "more_body": False})
+
+    @staticmethod
+    async def _send_chunks(send: Send, file, start: int, end: int):
+        def read_at(offset: int, size: int) -> bytes:
+            file.seek(offset)
+            return file.read(size)
+
+        position = start
+        while position < end:
+            chunk = await anyio.to_thread.run_sync(read_at, position, min(CHUNK_SIZE, end - position))
+            if not chunk:
+                break
+            position += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+
+def file_response(request: Request, path: str, media_type: Optional[str] = None) -> Response:
+    """依請求標頭回傳 200 / 206 / 304 / 416 的檔案回應"""
+    stat_result = os.stat(path)
+    file_size = stat_result.st_size
+    etag = make_etag(stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    media_type = media_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': last_modified,
+        'Cache-Control': f'public, max-age={config.AUDIO_CACHE_MAX_AGE}',
+    }
+
+    request_headers: Headers = request.headers
+    if_none_match = request_headers.get('if-none-match')
+    if_modified_since = request_headers.get('if-modified-since')
+    if (if_none_match is not None and _etag_matches(if_none_match, etag)) or \
+            (if_none_match is None and if_modified_since is not None
+             and _not_modified_since(if_modified_since, stat_result.st_mtime)):
+        return Response(status_code=304, headers=headers)
+
+    ranges: Optional[List[ByteRange]] = None
+    header_range = request_headers.get('range')
+    if_range = request_headers.get('if-range')
+    # If-Range 不符合（檔案已變更）時忽略 Range，回傳完整檔案；ETag 需強比較
+    use_range = header_range is not None and \
+        (if_range is None or if_range.strip() in (etag, last_modified))
+    if use_range:
+        try:
+            ranges = parse_range_header(header_range, file_size)  # type: ignore
+        except RangeNotSatisfiable:
+            headers['Content-Range'] = f'bytes */{file_size}'
+            return Response(status_code=416, headers=headers)
+        if ranges is not None and len(ranges) > MAX_RANGES:
+            ranges = None
+
+    return RangeFileResponse(path, file_size, ranges, headers, media_type)
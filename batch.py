@@ -0,0 +1,251 @@
+"""
+批次處理：輸入播放清單網址或連結檔案，預先處理整個曲庫
+下載、歌詞搜尋、轉錄與對齊分為三個階段同時進行：
+後面歌曲的下載與爬蟲，和目前歌曲的推論重疊執行，推論執行緒不會閒置
+處理進度寫入清單檔 (JSON Lines)，中斷後再次執行會從停下的地方繼續
+
+使用方式:
+    python batch.py "https://music.youtube.com/playlist?list=..." links.txt
+    python batch.py                       # 繼續上次未完成的工作
+    python batch.py --retry-failed        # 連同失敗的歌曲一起重試
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from yt_dlp import YoutubeDL
+
+import config
+from chunked_transcribe import shutdown_pool
+from downloader import download_audio, fetch_video_info, find_audio_path, read_info
+from http_client import http_client
+from job_executor import download_executor
+from lyrics_index import lyrics_index
+from lyrics_search import search_lyrics
+from lyrics_store import lyrics_exists
+from web import get_lyrics_by_video_name
+
+MANIFEST_PATH = './downloads/batch_manifest.jsonl'
+
+# 批次工作的優先度低於網頁上的即時請求
+BATCH_PRIORITY = -1
+
+Track = Dict[str, Any]
+
+
+class Manifest:
+    """
+    批次處理清單：每次狀態變更附加一行，讀取時以最後一筆為準
+    只附加不改寫，中斷時最多遺失最後一行
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.tracks: Dict[str, Track] = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.tracks.setdefault(record['id'], {}).update(record)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def update(self, video_id: str, **fields: Any):
+        record = {"id": video_id, **fields, "updated": time.time()}
+        self.tracks.setdefault(video_id, {}).update(record)
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def add(self, video_id: str, url: str, title: Optional[str]):
+        """加入新歌曲，已在清單中的歌曲不重複加入"""
+        if video_id not in self.tracks:
+            self.update(video_id, url=url, title=title, status='pending')
+
+    def unfinished(self, retry_failed: bool = False) -> List[Track]:
+        skip = {'done'} if retry_failed else {'done', 'failed'}
+        return [dict(track) for track in self.tracks.values() if track.get('status') not in skip]
+
+    def close(self):
+        self._file.close()
+
+
+def _read_inputs(inputs: List[str]) -> List[str]:
+    """展開連結檔案：每行一個網址，忽略空行與 # 開頭的註解"""
+    urls = []
+    for item in inputs:
+        if os.path.isfile(item):
+            with open(item, 'r', encoding='utf-8') as f:
+                urls += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        else:
+            urls.append(item)
+    return urls
+
+
+def expand_urls(urls: List[str]) -> List[Track]:
+    """以 yt-dlp 展開播放清單（只取清單內容，不下載）"""
+    tracks = []
+    with YoutubeDL({'extract_flat': 'in_playlist', 'skip_download': True, 'quiet': True}) as ydl:
+        for url in urls:
+            try:
+                info = ydl.extract_info(url, download=False)
+            except Exception as e:
+                print(f"無法展開 {url}: {e}")
+                continue
+            if info is None:
+                continue
+            entries = info.get('entries')
+            if entries is None:
+                entries = [info]
+            for entry in entries:
+                if not entry or not entry.get('id'):
+                    continue
+                tracks.append({
+                    "id": entry['id'],
+                    "url": entry.get('webpage_url') or entry.get('url') or url,
+                    "title": entry.get('title'),
+                })
+    return tracks
+
+
+class BatchPipeline:
+    """三階段的批次處理：下載 -> 歌詞搜尋 -> 轉錄／對齊"""
+
+    def __init__(self, manifest: Manifest, download_workers: int, lookup_workers: int,
+                 inference_workers: int, prefetch: int, force_realign: bool = False):
+        self.manifest = manifest
+        self.download_workers = download_workers
+        self.lookup_workers = lookup_workers
+        self.inference_workers = inference_workers
+        self.prefetch = prefetch
+        self.force_realign = force_realign
+
+    async def _download(self, track: Track):
+        """已下載的歌曲只讀取資訊檔"""
+        video_id, url = track['id'], track['url']
+        info = read_info(video_id)
+        if find_audio_path(video_id) is None:
+            info = await download_executor.submit(download_audio, url, video_id, priority=BATCH_PRIORITY)
+        elif info is None:
+            info = await download_executor.submit(fetch_video_info, url, video_id, priority=BATCH_PRIORITY)
+        track['title'] = info.get('title') or track.get('title') or video_id
+        self.manifest.update(video_id, status='downloaded', title=track['title'])
+
+    async def _lookup(self, track: Track):
+        """
+        先查已下載歌詞的索引，找不到才爬取
+        結果存在歌詞搜尋快取，推論階段直接使用，不會重複爬取
+        """
+        video_id, title = track['id'], track['title']
+        found = lyrics_exists(video_id)
+        if not found:
+            found = await asyncio.to_thread(lyrics_index.find, title, video_id) is not None
+        if not found:
+            found = await search_lyrics(title) is not None
+        self.manifest.update(video_id, status='looked_up', lyrics_found=found)
+
+    async def _infer(self, track: Track):
+        video_id = track['id']
+        lyrics_json = await get_lyrics_by_video_name(
+            track['title'], video_id, self.force_realign, BATCH_PRIORITY)
+        self.manifest.update(video_id, status='done', source=lyrics_json.get('source'))
+
+    async def _stage(self, name: str, handler: Callable[[Track], Awaitable[None]],
+                     inbox: "asyncio.Queue[Optional[Track]]", outbox: "Optional[asyncio.Queue[Optional[Track]]]",
+                     workers: int, next_workers: int):
+        async def worker():
+            while (track := await inbox.get()) is not None:
+                started = time.perf_counter()
+                try:
+                    await handler(track)
+                except Exception as e:
+                    print(f"[{name}] {track['id']} 失敗: {e}")
+                    self.manifest.update(track['id'], status='failed', stage=name, error=str(e))
+                    continue
+                print(f"[{name}] {track['id']} 完成 ({time.perf_counter() - started:.1f}s)")
+                if outbox is not None:
+                    # 佇列已滿時等待，下載最多只領先推論 prefetch 首歌
+                    await outbox.put(track)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if outbox is not None:
+            for _ in range(next_workers):
+                await outbox.put(None)
+
+    async def run(self, tracks: List[Track]):
+        download_queue: "asyncio.Queue[Optional[Track]]" = asyncio.Queue()
+        lookup_queue: "asyncio.Queue[Optional[Track]]" = asyncio.Queue(self.prefetch)
+        inference_queue: "asyncio.Queue[Optional[Track]]" = asyncio.Queue(self.prefetch)
+        for track in tracks:
+            download_queue.put_nowait(track)
+        for _ in range(self.download_workers):
+            download_queue.put_nowait(None)
+
+        await asyncio.gather(
+            self._stage('download', self._download, download_queue, lookup_queue,
+                        self.download_workers, self.lookup_workers),
+            self._stage('lyrics', self._lookup, lookup_queue, inference_queue,
+                        self.lookup_workers, self.inference_workers),
+            self._stage('inference', self._infer, inference_queue, None,
+                        self.inference_workers, 0),
+        )
+
+
+async def main(args: argparse.Namespace):
+    manifest = Manifest(args.manifest)
+    try:
+        urls = _read_inputs(args.inputs)
+        if urls:
+            for track in await asyncio.to_thread(expand_urls, urls):
+                manifest.add(track['id'], track['url'], track.get('title'))
+
+        tracks = manifest.unfinished(args.retry_failed)
+        print(f"清單共 {len(manifest.tracks)} 首，待處理 {len(tracks)} 首")
+        if not tracks:
+            return
+
+        pipeline = BatchPipeline(
+            manifest,
+            download_workers=args.download_workers,
+            lookup_workers=args.lookup_workers,
+            inference_workers=args.inference_workers,
+            prefetch=args.prefetch,
+            force_realign=args.force_realign)
+        started = time.time()
+        await pipeline.run(tracks)
+        elapsed = time.time() - started
+
+        statuses = Counter(track.get('status', 'pending') for track in manifest.tracks.values())
+        done = sum(1 for track in tracks if manifest.tracks[track['id']].get('status') == 'done')
+        rate = done / elapsed * 3600 if elapsed > 0 else 0.0
+        print(f"完成 {done}/{len(tracks)} 首，耗時 {elapsed:.0f} 秒（每小時 {rate:.1f} 首）")
+        print("清單狀態: " + ", ".join(f"{status} {count}" for status, count in sorted(statuses.items())))
+    finally:
+        manifest.close()
+        shutdown_pool()
+        await http_client.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="批次下載並處理歌詞")
+    parser.add_argument('inputs', nargs='*', help="播放清單或影片網址，或每行一個網址的檔案")
+    parser.add_argument('--manifest', default=MANIFEST_PATH, help="批次處理清單檔")
+    parser.add_argument('--retry-failed', action='store_true', help="重試先前失敗的歌曲")
+    parser.add_argument('--force-realign', action='store_true', help="忽略對齊快取重新對齊")
+    parser.add_argument('--download-workers', type=int, default=config.DOWNLOAD_WORKERS,
+                        help="同時下載的歌曲數")
+    parser.add_argument('--lookup-workers', type=int, default=8, help="同時搜尋歌詞的歌曲數")
+    parser.add_argument('--inference-workers', type=int, default=config.INFERENCE_WORKERS + 1,
+                        help="同時送入推論的歌曲數（多一首排隊，推論執行緒不會閒置）")
+    parser.add_argument('--prefetch', type=int, default=8, help="各階段之間最多暫存的歌曲數")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
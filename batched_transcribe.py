@@ -0,0 +1,84 @@
+"""
+多首歌合併轉錄：把多個工作的人聲接在一起，以 faster-whisper 的 BatchedInferencePipeline 一次解碼
+- 每首歌各自以 VAD 切成不超過 30 秒的語音區段，換算為合併後音訊中的位置作為 clip_timestamps
+  （區段不會跨越兩首歌）
+- 不同歌曲的區段放在同一批次送進編碼器與解碼器，批次越滿 CPU 的向量化效率越好
+- 解出的段落依 seek（所屬區段的起點）分回原本的歌曲，並換回歌曲內的時間
+- 同一次解碼共用一個語言，因此先逐首偵測語言，相同語言的歌曲才合併
+"""
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from faster_whisper import BatchedInferencePipeline
+from faster_whisper.vad import VadOptions, get_speech_timestamps, merge_segments
+
+import config
+from pcm_cache import SAMPLE_RATE
+
+# faster-whisper 每秒的特徵幀數（seek 的單位）
+FRAMES_PER_SECOND = 100
+
+# (歌曲序號, 段落) -> None，每解出一個段落呼叫一次
+SegmentCallback = Callable[[int, Dict[str, Any]], None]
+
+
+def detect_language(model: Any, audio: np.ndarray) -> str:
+    """偵測單首歌的語言（只使用有人聲的部分）"""
+    language, _, _ = model.detect_language(audio, vad_filter=True)
+    return language
+
+
+def speech_clips(audio: np.ndarray, chunk_length: int) -> List[Dict[str, int]]:
+    """VAD 偵測到的語音，合併為不超過 chunk_length 秒的區段（取樣點位置）"""
+    vad_options = VadOptions(max_speech_duration_s=chunk_length, min_silence_duration_ms=160)
+    active = get_speech_timestamps(audio, vad_options)
+    return [{"start": clip["start"], "end": clip["end"]} for clip in merge_segments(active, vad_options)]
+
+
+def _segment_dict(segment: Any, offset: float) -> Dict[str, Any]:
+    """轉為與 WhisperResult.to_dict() 相同的格式，時間換回歌曲內的時間"""
+    words = [
+        {"word": word.word, "start": round(word.start - offset, 3), "end": round(word.end - offset, 3),
+         "probability": word.probability}
+        for word in (segment.words or [])
+    ]
+    return {"start": round(segment.start - offset, 3), "end": round(segment.end - offset, 3),
+            "text": segment.text, "words": words}
+
+
+def transcribe_batch(model: Any, audios: List[np.ndarray], language: str,
+                     on_segment: Optional[SegmentCallback] = None) -> List[List[Dict[str, Any]]]:
+    """
+    合併轉錄多首相同語言的歌，回傳每首歌的段落（時間為各自歌曲內的時間）
+    model 為已載入的 faster-whisper 模型
+    """
+    pipeline = BatchedInferencePipeline(model)
+    chunk_length = model.feature_extractor.chunk_length
+
+    # 各歌曲在合併音訊中的起點（取樣點），以及換算後的語音區段
+    starts: List[int] = []
+    clips: List[Dict[str, int]] = []
+    offset = 0
+    for audio in audios:
+        starts.append(offset)
+        clips += [{"start": clip["start"] + offset, "end": clip["end"] + offset}
+                  for clip in speech_clips(audio, chunk_length)]
+        offset += len(audio)
+
+    results: List[List[Dict[str, Any]]] = [[] for _ in audios]
+    if not clips:
+        return results
+
+    segments, _ = pipeline.transcribe(
+        np.concatenate(audios), language=language, clip_timestamps=clips, vad_filter=False,
+        batch_size=config.TRANSCRIBE_BATCH_SIZE, beam_size=config.WHISPER_BEAM_SIZE, word_timestamps=True)
+    start_frames = [start * FRAMES_PER_SECOND // SAMPLE_RATE for start in starts]
+    for segment in segments:
+        # seek 為所屬語音區段起點的幀位置（浮點換算可能少 1），區段不跨越歌曲
+        owner = bisect_right(start_frames, segment.seek + 1) - 1
+        converted = _segment_dict(segment, starts[owner] / SAMPLE_RATE)
+        results[owner].append(converted)
+        if on_segment is not None:
+            on_segment(owner, converted)
+    return results
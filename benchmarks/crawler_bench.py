@@ -0,0 +1,322 @@
+"""
+爬蟲離線效能測試：不連網，以本機替身伺服器提供錄製的網頁
+- 解析吞吐量：各網站歌詞頁的解析速度（魔鏡、Genius 另外比較 BeautifulSoup 備援路徑）
+- 端到端延遲：scrawl.py 與 simple_scrawl.py 的完整搜尋，以及各網站單獨搜尋的延遲百分位數
+- 連線數：替身伺服器收到的請求數與 TCP 連線數，檢查連線池是否重複使用連線
+替身伺服器可設定延遲與失敗注入（503 回應、直接斷線）
+
+使用方式（在專案根目錄執行）:
+    python -m benchmarks.crawler_bench --lookups 50 --concurrency 8 --latency-ms 80 --failure-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import urllib.parse
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# 統計資料寫入暫存目錄，不影響正式的歌詞搜尋快取
+os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='crawler_bench_'))
+
+from aiohttp import web  # noqa: E402
+
+import scrawl  # noqa: E402
+import simple_scrawl  # noqa: E402
+from http_client import HttpClient  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 測試用的影片標題；替身伺服器不論查詢內容都回傳錄製的網頁
+BENCH_TITLE = "Traditional - Amazing Grace"
+
+# (網站, 路徑判斷) -> 錄製的檔案
+ROUTES: List[Tuple[str, Callable[[str, str], bool], str]] = [
+    ('mojim.com', lambda path, query: path.endswith('.html'), 'mojim_search.html'),
+    ('mojim.com', lambda path, query: path.endswith('.htm'), 'mojim_lyrics.html'),
+    ('genius.com', lambda path, query: path.startswith('/api/search'), 'genius_search.json'),
+    ('genius.com', lambda path, query: True, 'genius_lyrics.html'),
+    ('www.azlyrics.com', lambda path, query: path.startswith('/lyrics/'), 'azlyrics_lyrics.html'),
+    ('www.kasi-time.com', lambda path, query: path.startswith('/search.php'), 'kasitime_search.html'),
+    ('www.kasi-time.com', lambda path, query: path.startswith('/item-'), 'kasitime_lyrics.html'),
+    ('lyricstranslate.com', lambda path, query: path.startswith('/en/search/'), 'lyricstranslate_search.html'),
+    ('lyricstranslate.com', lambda path, query: path.startswith('/en/'), 'lyricstranslate_lyrics.html'),
+]
+
+# 解析吞吐量測試：(網站, 爬蟲, 歌詞頁網址, 錄製的檔案)
+PARSE_CASES = [
+    ('mojim', scrawl.MojimCrawler, 'https://mojim.com/twy100001x1x1.htm', 'mojim_lyrics.html'),
+    ('genius', scrawl.GeniusCrawler, 'https://genius.com/John-newton-amazing-grace-lyrics', 'genius_lyrics.html'),
+    ('azlyrics', simple_scrawl.AZLyricsCrawler, 'https://www.azlyrics.com/lyrics/janetaylor/twinkle.html', 'azlyrics_lyrics.html'),
+    ('kasitime', simple_scrawl.KasitimeCrawler, 'https://www.kasi-time.com/item-10001.html', 'kasitime_lyrics.html'),
+    ('lyricstranslate', simple_scrawl.LyricsTranslateCrawler,
+     'https://lyricstranslate.com/en/traditional-scarborough-fair-lyrics.html', 'lyricstranslate_lyrics.html'),
+]
+
+
+def _pad_html(html: str, pad_kb: int) -> str:
+    """在 <body> 後插入與歌詞無關的標記，模擬實際網頁的大小（Genius 頁面常超過 500 KB）"""
+    if pad_kb <= 0 or '<body>' not in html:
+        return html
+    block = ('<div class="PageGrid__Row"><span class="Label">related</span>'
+             '<a href="/songs/1">Another song &amp; more</a><script>var x = "<div>";</script></div>\n')
+    filler = block * (pad_kb * 1024 // len(block) + 1)
+    return html.replace('<body>', '<body>' + filler, 1)
+
+
+def load_fixtures(pad_kb: int) -> Dict[str, str]:
+    fixtures = {}
+    for name in os.listdir(FIXTURE_DIR):
+        with open(os.path.join(FIXTURE_DIR, name), 'r', encoding='utf-8') as f:
+            content = f.read()
+        fixtures[name] = content if name.endswith('.json') else _pad_html(content, pad_kb)
+    return fixtures
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99),
+        "max": ordered[-1], "mean": statistics.fmean(ordered),
+    }
+
+
+class StandInServer:
+    """以錄製的網頁模擬各歌詞網站，可注入延遲與失敗"""
+
+    def __init__(self, fixtures: Dict[str, str], latency_ms: float, failure_rate: float, reset_rate: float):
+        self.fixtures = fixtures
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.reset_rate = reset_rate
+        self.requests = 0
+        self.failures = 0
+        self.connections: Set[Any] = set()
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ''
+
+    def reset_counters(self):
+        self.requests = 0
+        self.failures = 0
+        self.connections = set()
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info('peername') if request.transport else None)
+        if self.latency_ms > 0:
+            # 延遲在設定值的 50% ~ 150% 之間浮動
+            await asyncio.sleep(self.latency_ms / 1000 * random.uniform(0.5, 1.5))
+
+        roll = random.random()
+        if roll < self.reset_rate:
+            self.failures += 1
+            if request.transport is not None:
+                # 不回應直接中斷連線，客戶端會收到連線錯誤
+                request.transport.abort()
+            return web.Response(status=503)
+        if roll < self.reset_rate + self.failure_rate:
+            self.failures += 1
+            return web.Response(status=503)
+
+        host = request.match_info['host']
+        path = '/' + request.match_info['path']
+        for route_host, matches, name in ROUTES:
+            if route_host == host and matches(path, request.query_string):
+                content_type = 'application/json' if name.endswith('.json') else 'text/html'
+                return web.Response(text=self.fixtures[name], content_type=content_type, charset='utf-8')
+        return web.Response(status=404)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/{host}/{path:.*}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore
+        self.base_url = f'http://127.0.0.1:{port}'
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class StandInClient(HttpClient):
+    """將各網站的網址改寫到替身伺服器：https://host/path -> http://127.0.0.1:port/host/path"""
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                      json_body: bool = False, **kwargs) -> Optional[Any]:
+        parts = urllib.parse.urlsplit(url)
+        local_url = f'{self.base_url}/{parts.netloc}{parts.path}'
+        if parts.query:
+            local_url += f'?{parts.query}'
+        return await super().request(method, local_url, headers=headers, json_body=json_body, **kwargs)
+
+
+class FixtureClient(HttpClient):
+    """直接回傳錄製的網頁，只測量解析"""
+
+    def __init__(self, content: str):
+        super().__init__()
+        self.content = content
+
+    async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                      json_body: bool = False, **kwargs) -> Optional[Any]:
+        return json.loads(self.content) if json_body else self.content
+
+
+async def bench_parse(fixtures: Dict[str, str], iterations: int) -> Dict[str, Dict[str, float]]:
+    """各網站歌詞頁的解析吞吐量"""
+    report: Dict[str, Dict[str, float]] = {}
+    for site, crawler_cls, url, name in PARSE_CASES:
+        content = fixtures[name]
+        crawler = crawler_cls(client=FixtureClient(content))
+        result = await crawler.get_lyrics_by_url(url)
+        if not result:
+            print(f"警告: {site} 的錄製網頁無法解析")
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await crawler.get_lyrics_by_url(url)
+        elapsed = time.perf_counter() - started
+        report[site] = {
+            "pages_per_s": iterations / elapsed,
+            "mb_per_s": len(content.encode('utf-8')) * iterations / elapsed / 1e6,
+            "page_kb": len(content.encode('utf-8')) / 1024,
+        }
+        # BeautifulSoup 備援路徑
+        soup_parse = getattr(crawler, '_soup_lyrics', None)
+        if soup_parse is not None:
+            soup_iterations = max(1, iterations // 10)
+            started = time.perf_counter()
+            for _ in range(soup_iterations):
+                soup_parse(content)
+            elapsed = time.perf_counter() - started
+            report[f'{site} (soup)'] = {
+                "pages_per_s": soup_iterations / elapsed,
+                "mb_per_s": len(content.encode('utf-8')) * soup_iterations / elapsed / 1e6,
+                "page_kb": len(content.encode('utf-8')) / 1024,
+            }
+    return report
+
+
+async def run_lookups(make_lookup: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+                      lookups: int, concurrency: int) -> Dict[str, Any]:
+    """以固定並行數執行多次搜尋，回傳延遲（毫秒）與成功率"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    successes = 0
+
+    async def one():
+        nonlocal successes
+        async with semaphore:
+            started = time.perf_counter()
+            result = await make_lookup()
+            latencies.append((time.perf_counter() - started) * 1000)
+            if result:
+                successes += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(lookups)))
+    elapsed = time.perf_counter() - started
+    return {
+        "latency_ms": percentiles(latencies),
+        "success_rate": successes / lookups if lookups else 0.0,
+        "lookups_per_s": lookups / elapsed if elapsed else 0.0,
+    }
+
+
+async def bench_lookups(server: StandInServer, client: HttpClient, lookups: int,
+                        concurrency: int) -> Dict[str, Dict[str, Any]]:
+    """端到端搜尋延遲：各模組的公開接口，以及每個網站單獨搜尋"""
+    artist, song = BENCH_TITLE.split(' - ', 1)
+    cases: Dict[str, Callable[[], Awaitable[Optional[Dict[str, Any]]]]] = {
+        'scrawl.scrawl_lyrics_http': lambda: scrawl.scrawl_lyrics_http(BENCH_TITLE, client),
+        'simple_scrawl.scrawl_lyrics_http': lambda: simple_scrawl.scrawl_lyrics_http(BENCH_TITLE, client),
+    }
+    for crawler in [scrawl.MojimCrawler(client=client), scrawl.GeniusCrawler(client=client),
+                    *simple_scrawl._crawlers(client)]:
+        cases[f'site:{crawler.site_name}'] = (lambda c=crawler: c.search_lyrics(song, artist))
+
+    report: Dict[str, Dict[str, Any]] = {}
+    for name, make_lookup in cases.items():
+        server.reset_counters()
+        await client.close()  # 每個案例從空的連線池開始
+        result = await run_lookups(make_lookup, lookups, concurrency)
+        result.update({
+            "requests": server.requests,
+            "connections": len(server.connections),
+            "injected_failures": server.failures,
+        })
+        report[name] = result
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print("\n== 解析吞吐量 ==")
+    print(f"{'網站':<22}{'頁面大小(KB)':>14}{'頁/秒':>12}{'MB/秒':>10}")
+    for site, row in report["parse"].items():
+        print(f"{site:<22}{row['page_kb']:>14.1f}{row['pages_per_s']:>12.1f}{row['mb_per_s']:>10.2f}")
+
+    print("\n== 端到端搜尋 ==")
+    print(f"{'案例':<36}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}{'成功率':>8}{'請求':>7}{'連線':>6}{'失敗':>6}")
+    for name, row in report["lookups"].items():
+        latency = row["latency_ms"]
+        print(f"{name:<36}{latency.get('p50', 0):>8.1f}{latency.get('p90', 0):>8.1f}"
+              f"{latency.get('p99', 0):>8.1f}{latency.get('max', 0):>8.1f}{row['success_rate']:>8.0%}"
+              f"{row['requests']:>7}{row['connections']:>6}{row['injected_failures']:>6}")
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    random.seed(args.seed)
+    fixtures = load_fixtures(args.pad_kb)
+    report: Dict[str, Any] = {"settings": vars(args)}
+    report["parse"] = await bench_parse(fixtures, args.parse_iterations)
+
+    server = StandInServer(fixtures, args.latency_ms, args.failure_rate, args.reset_rate)
+    await server.start()
+    client = StandInClient(server.base_url, timeout=args.timeout, retries=args.retries, backoff=args.backoff)
+    try:
+        report["lookups"] = await bench_lookups(server, client, args.lookups, args.concurrency)
+    finally:
+        await client.close()
+        await server.stop()
+    return report
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="爬蟲離線效能測試")
+    parser.add_argument('--lookups', type=int, default=50, help="每個案例的搜尋次數")
+    parser.add_argument('--concurrency', type=int, default=8, help="同時進行的搜尋數")
+    parser.add_argument('--latency-ms', type=float, default=50, help="替身伺服器的平均回應延遲")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="回應 503 的機率")
+    parser.add_argument('--reset-rate', type=float, default=0.0, help="直接斷線的機率")
+    parser.add_argument('--pad-kb', type=int, default=256, help="每個網頁額外填充的大小 (KB)")
+    parser.add_argument('--parse-iterations', type=int, default=50, help="解析吞吐量測試的次數")
+    parser.add_argument('--timeout', type=float, default=10, help="單一請求的時間上限（秒）")
+    parser.add_argument('--retries', type=int, default=2, help="請求失敗時的重試次數")
+    parser.add_argument('--backoff', type=float, default=0.05, help="重試的基本等待秒數")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="將結果另存為 JSON 檔")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已保存到 {args.json}")
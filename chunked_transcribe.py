@@ -0,0 +1,183 @@
+"""
+長音訊分段平行轉錄：依 VAD 偵測到的靜音切成多個區段，交由多個程序同時轉錄
+完成後校正為全域時間戳，並移除區段邊界重複的單字
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+import av
+import numpy as np
+import stable_whisper
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+from stable_whisper.result import WhisperResult
+
+import config
+from job_executor import JobContext
+from pcm_cache import SAMPLE_RATE
+
+# 每個區段前後多取的音訊（秒），避免切在單字中間
+CHUNK_PADDING_SECONDS = 0.5
+
+
+def audio_duration(audio_path: str) -> float:
+    """取得音訊長度（秒），只讀取檔頭不解碼"""
+    with av.open(audio_path) as container:
+        if container.duration is None:
+            return 0.0
+        return container.duration / av.time_base
+
+
+def find_split_points(audio: np.ndarray, target_seconds: float) -> List[int]:
+    """
+    在靜音處尋找切點（取樣點位置）
+    每個區段至少 target_seconds 長，切點取兩段人聲之間靜音的中點
+    """
+    speech = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=300))
+    target_samples = int(target_seconds * SAMPLE_RATE)
+    split_points = []
+    last_split = 0
+    for current, following in zip(speech, speech[1:]):
+        gap_middle = (current['end'] + following['start']) // 2
+        if gap_middle - last_split >= target_samples:
+            split_points.append(gap_middle)
+            last_split = gap_middle
+    return split_points
+
+
+_worker_model: Any = None
+_worker_beam_size = 5
+
+
+def _init_worker(model_name: str, device: str, compute_type: str, cpu_threads: int, beam_size: int):
+    """程序池初始化：每個程序載入一份模型"""
+    global _worker_model, _worker_beam_size
+    _worker_model = stable_whisper.load_faster_whisper(
+        model_name, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+    _worker_beam_size = beam_size
+
+
+def _transcribe_chunk(audio: np.ndarray, language: Optional[str]) -> List[Dict[str, Any]]:
+    """在子程序中轉錄單一區段，時間戳為區段內的相對時間"""
+    result = _worker_model.transcribe(
+        audio, language=language, vad=True, regroup=False, word_timestamps=True, verbose=None,
+        beam_size=_worker_beam_size)
+    return result.to_dict()['segments']
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_model: Optional[str] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(model_name: str) -> ProcessPoolExecutor:
+    """取得程序池，模型不同時重建"""
+    with _pool_lock:
+        return _get_pool_locked(model_name)
+
+
+def _get_pool_locked(model_name: str) -> ProcessPoolExecutor:
+    global _pool, _pool_model
+    if _pool is not None and _pool_model != model_name:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+    if _pool is None:
+        workers = config.CHUNK_WORKERS
+        # 調校的每程序執行緒數，但所有子程序合計不超過核心數
+        per_worker = max(1, (os.cpu_count() or 1) // workers)
+        cpu_threads = min(config.WHISPER_CPU_THREADS, per_worker) if config.WHISPER_CPU_THREADS > 0 else per_worker
+        # 父程序已有執行緒與模型，使用 spawn 避免 fork 造成死結
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(model_name, config.WHISPER_DEVICE, config.WHISPER_COMPUTE_TYPE, cpu_threads,
+                      config.WHISPER_BEAM_SIZE))
+        _pool_model = model_name
+    return _pool
+
+
+def shutdown_pool():
+    """關閉程序池，用於應用程式結束時"""
+    global _pool, _pool_model
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+            _pool_model = None
+
+
+def _stitch_chunk(segments: List[Dict[str, Any]], offset: float,
+                  keep_start: float, keep_end: float) -> List[Dict[str, Any]]:
+    """
+    將區段結果轉為全域時間戳，只保留中點落在 [keep_start, keep_end) 的單字
+    前後補白區在相鄰區段也會出現，藉此去除重複
+    """
+    stitched = []
+    for segment in segments:
+        words = []
+        for word in segment.get('words') or []:
+            start = word['start'] + offset
+            end = word['end'] + offset
+            if keep_start <= (start + end) / 2 < keep_end:
+                words.append({**word, 'start': start, 'end': end})
+        if not words:
+            continue
+        stitched.append({
+            'start': words[0]['start'],
+            'end': words[-1]['end'],
+            'text': ''.join(word['word'] for word in words),
+            'words': words,
+        })
+    return stitched
+
+
+def transcribe_chunked(ctx: JobContext, audio: np.ndarray, model: Any, model_name: str,
+                       regroup: Any = True) -> WhisperResult:
+    """
+    分段平行轉錄整首音訊（16kHz 單聲道，通常為已分離的人聲）
+    model 為主程序中借出的模型，用於語言偵測；區段轉錄在程序池中進行
+    """
+    language, _, _ = model.detect_language(audio, vad_filter=True)
+
+    split_points = find_split_points(audio, config.CHUNK_TARGET_SECONDS)
+    bounds = [0] + split_points + [len(audio)]
+    padding = int(CHUNK_PADDING_SECONDS * SAMPLE_RATE)
+
+    pool = _get_pool(model_name)
+    futures: Dict[Future, Tuple[int, int, int]] = {}
+    for chunk_start, chunk_end in zip(bounds, bounds[1:]):
+        padded_start = max(0, chunk_start - padding)
+        padded_end = min(len(audio), chunk_end + padding)
+        future = pool.submit(_transcribe_chunk,
+                             audio[padded_start:padded_end], language)
+        futures[future] = (padded_start, chunk_start, chunk_end)
+
+    chunk_segments: Dict[int, List[Dict[str, Any]]] = {}
+    pending = set(futures)
+    ctx.report('transcribe', 0)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            ctx.check_cancelled()
+            for future in done:
+                padded_start, chunk_start, chunk_end = futures[future]
+                segments = _stitch_chunk(future.result(), padded_start / SAMPLE_RATE,
+                                         chunk_start / SAMPLE_RATE, chunk_end / SAMPLE_RATE)
+                chunk_segments[chunk_start] = segments
+                ctx.publish('segments_partial', segments)
+            ctx.report('transcribe', len(chunk_segments) / len(futures))
+    finally:
+        for future in pending:
+            future.cancel()
+
+    segments = [segment for chunk_start in sorted(chunk_segments)
+                for segment in chunk_segments[chunk_start]]
+    result = WhisperResult({'language': language, 'segments': segments})
+    if callable(regroup):
+        result = regroup(result)
+    elif regroup:
+        result.regroup()
+    return result
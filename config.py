@@ -0,0 +1,136 @@
+"""
+應用程式設定：統一由環境變數讀取，未設定時使用預設值
+"""
+import json
+import os
+import platform
+from typing import Any, Dict, List
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    """讀取以逗號分隔的環境變數"""
+    value = os.environ.get(name, default)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def host_fingerprint() -> str:
+    """主機硬體的識別字串（CPU 型號、核心數、記憶體），同型號的主機使用相同的調校結果"""
+    cpu_model = platform.processor() or platform.machine()
+    memory_gb = 0
+    try:
+        with open('/proc/cpuinfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    cpu_model = line.split(':', 1)[1].strip()
+                    break
+        with open('/proc/meminfo', 'r', encoding='utf-8') as f:
+            memory_gb = round(int(f.readline().split()[1]) / 1024 ** 2)
+    except (OSError, ValueError, IndexError):
+        pass
+    return f'{platform.machine()}|{cpu_model}|{os.cpu_count()}cpu|{memory_gb}GB'
+
+
+def _load_host_tuning(path: str) -> Dict[str, Any]:
+    """讀取本主機的調校結果，沒有時回傳空字典"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('hosts', {}).get(host_fingerprint(), {})
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+# 快取目錄（對齊結果、人聲分離等）
+CACHE_DIR = os.environ.get('CACHE_DIR', './downloads/cache')
+
+# 主機自動調校結果（python host_tuning.py calibrate 產生），依主機硬體分別保存
+# 環境變數未指定的 Whisper 設定使用本主機的調校值
+HOST_TUNING_FILE = os.environ.get('HOST_TUNING_FILE', os.path.join(CACHE_DIR, 'host_tuning.json'))
+HOST_TUNING = _load_host_tuning(HOST_TUNING_FILE)
+
+# Whisper 模型設定
+WHISPER_MODEL = os.environ.get('WHISPER_MODEL', HOST_TUNING.get('model', 'medium'))
+WHISPER_DEVICE = os.environ.get('WHISPER_DEVICE', 'auto')
+WHISPER_COMPUTE_TYPE = os.environ.get('WHISPER_COMPUTE_TYPE', HOST_TUNING.get('compute_type', 'default'))
+# faster-whisper 每個 worker 的 CPU 執行緒數（0 為函式庫預設）
+WHISPER_CPU_THREADS = int(os.environ.get('WHISPER_CPU_THREADS', str(HOST_TUNING.get('cpu_threads', 0))))
+# 每個模型的 faster-whisper worker 數（可同時處理的請求數，0 表示與 INFERENCE_WORKERS 相同）
+WHISPER_NUM_WORKERS = int(os.environ.get('WHISPER_NUM_WORKERS', '0'))
+# 轉錄的 beam size
+WHISPER_BEAM_SIZE = int(os.environ.get('WHISPER_BEAM_SIZE', str(HOST_TUNING.get('beam_size', 5))))
+
+# 啟動時預先載入的模型（逗號分隔，留空則不預載）
+WHISPER_PRELOAD_MODELS = _env_list('WHISPER_PRELOAD_MODELS', WHISPER_MODEL)
+
+# 模型常駐記憶體上限（MB），超過時淘汰最久未使用的模型
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get('MODEL_MEMORY_BUDGET_MB', '8192'))
+
+# 同時執行的下載工作數量
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', '4'))
+# 同時執行的轉錄／對齊工作數量
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', '1'))
+
+# 長度超過此秒數的音訊改用分段平行轉錄（0 表示停用）
+CHUNKED_TRANSCRIBE_MIN_SECONDS = float(os.environ.get('CHUNKED_TRANSCRIBE_MIN_SECONDS', '480'))
+# 分段轉錄時每個區段的目標長度（秒）
+CHUNK_TARGET_SECONDS = float(os.environ.get('CHUNK_TARGET_SECONDS', '120'))
+# 分段轉錄的程序數量，每個程序各自載入一份模型
+CHUNK_WORKERS = int(os.environ.get('CHUNK_WORKERS', str(max(1, (os.cpu_count() or 1) // 4))))
+
+# 對齊時是否使用 Demucs 分離出的人聲（與轉錄共用快取），否則使用原始音訊
+ALIGN_USE_VOCAL_STEM = os.environ.get('ALIGN_USE_VOCAL_STEM', 'true').lower() in ('1', 'true', 'yes')
+
+# /audio 回應的 Cache-Control max-age（秒）
+AUDIO_CACHE_MAX_AGE = int(os.environ.get('AUDIO_CACHE_MAX_AGE', '86400'))
+
+# 下載時保留原始音訊串流 (opus/m4a)，不轉成 mp3
+DOWNLOAD_KEEP_NATIVE = os.environ.get('DOWNLOAD_KEEP_NATIVE', 'false').lower() in ('1', 'true', 'yes')
+
+# 歌詞搜尋（所有網站同時查詢）的整體時間上限（秒）
+LYRICS_SEARCH_TIMEOUT = float(os.environ.get('LYRICS_SEARCH_TIMEOUT', '15'))
+
+# 爬蟲共用連線池：總連線數上限、每個網站的連線數上限、DNS 快取秒數
+HTTP_POOL_LIMIT = int(os.environ.get('HTTP_POOL_LIMIT', '100'))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get('HTTP_POOL_LIMIT_PER_HOST', '8'))
+HTTP_DNS_TTL = int(os.environ.get('HTTP_DNS_TTL', '300'))
+# 單一 HTTP 請求的時間上限（秒）及失敗時的重試次數
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '10'))
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', '2'))
+
+# 歌詞搜尋快取的有效期（秒）：找到歌詞的結果、以及所有網站都查無歌詞的結果
+LYRICS_CACHE_TTL = float(os.environ.get('LYRICS_CACHE_TTL', str(30 * 86400)))
+LYRICS_CACHE_NEGATIVE_TTL = float(os.environ.get('LYRICS_CACHE_NEGATIVE_TTL', str(6 * 3600)))
+
+# 已下載歌詞模糊索引的最低相似度（0~1），達到時直接沿用已有的歌詞
+LYRICS_INDEX_MIN_SCORE = float(os.environ.get('LYRICS_INDEX_MIN_SCORE', '0.8'))
+
+# 歌詞與對齊結果的儲存格式：columnar（欄式 .lyr，較小且讀取時才解碼）或 json
+LYRICS_STORAGE_FORMAT = os.environ.get('LYRICS_STORAGE_FORMAT', 'columnar')
+
+# 以一行 JSON 輸出結構化事件（工作各階段耗時、請求結果等）
+STRUCTURED_LOGS = os.environ.get('STRUCTURED_LOGS', 'true').lower() in ('1', 'true', 'yes')
+
+# 允許分析單一工作（websocket 的 profile 參數、/admin/profile 與 /profiles 端點）
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# sample 模式取樣呼叫堆疊的間隔（秒）
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+
+# 歌詞修改後只重新對齊變更的部分（沿用同一段音訊上次的對齊結果）
+INCREMENTAL_ALIGN = os.environ.get('INCREMENTAL_ALIGN', 'true').lower() in ('1', 'true', 'yes')
+# 變更的文字超過此比例（0~1）時改為整首重新對齊
+INCREMENTAL_ALIGN_MAX_CHANGE = float(os.environ.get('INCREMENTAL_ALIGN_MAX_CHANGE', '0.5'))
+
+# 啟動時若本主機尚未調校，先執行調校（需要已下載的音訊作為樣本）
+AUTO_TUNE_ON_STARTUP = os.environ.get('AUTO_TUNE_ON_STARTUP', 'false').lower() in ('1', 'true', 'yes')
+# 調校使用的音訊檔（留空則取已下載的第一首歌）與擷取長度（秒）
+TUNING_SAMPLE = os.environ.get('TUNING_SAMPLE', '')
+TUNING_SAMPLE_SECONDS = float(os.environ.get('TUNING_SAMPLE_SECONDS', '30'))
+# 調校比較的模型（逗號分隔），最後一個作為準確度的參考
+TUNING_MODELS = _env_list('TUNING_MODELS', 'small,medium')
+# 與參考轉錄的最低字元相似度（0~1），低於此值的設定不採用
+TUNING_MIN_ACCURACY = float(os.environ.get('TUNING_MIN_ACCURACY', '0.9'))
+
+# 合併排隊中的轉錄工作，以 faster-whisper 的批次推論一起轉錄
+BATCHED_TRANSCRIBE = os.environ.get('BATCHED_TRANSCRIBE', 'true').lower() in ('1', 'true', 'yes')
+# 每次合併的歌曲數上限，以及批次推論一次送入模型的語音區段數
+TRANSCRIBE_BATCH_SONGS = int(os.environ.get('TRANSCRIBE_BATCH_SONGS', '4'))
+TRANSCRIBE_BATCH_SIZE = int(os.environ.get('TRANSCRIBE_BATCH_SIZE', '8'))
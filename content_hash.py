@@ -0,0 +1,38 @@
+"""
+內容雜湊工具：以檔案內容（而非檔名）識別音訊與歌詞
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, Tuple
+
+_CHUNK_SIZE = 1024 * 1024
+
+# (路徑, 大小, 修改時間) -> 雜湊值，避免重複讀取未變更的檔案
+_file_digests: Dict[Tuple[str, int, int], str] = {}
+_file_digests_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> str:
+    """計算檔案內容的 SHA-256，檔案未變更時直接使用記憶的結果"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_digests_lock:
+        digest = _file_digests.get(memo_key)
+    if digest is not None:
+        return digest
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+
+    with _file_digests_lock:
+        _file_digests[memo_key] = digest
+    return digest
+
+
+def text_sha256(text: str) -> str:
+    """計算文字內容的 SHA-256"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
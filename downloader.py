@@ -0,0 +1,149 @@
+"""
+音訊下載：在下載執行緒中執行 yt-dlp，並在音訊旁寫入資訊檔 ({video_id}.info.json)
+已下載的歌曲直接讀取資訊檔取得標題等資料，不需要再連網
+可選擇保留原始音訊串流 (opus/m4a)，省去轉成 mp3 的 ffmpeg 編碼
+"""
+import glob
+import json
+import os
+from typing import Any, Dict, Optional
+
+from yt_dlp import YoutubeDL
+
+import config
+from job_executor import JobContext
+
+AUDIO_DIR = './downloads/audio'
+
+# 瀏覽器播放用的 Content-Type
+AUDIO_MEDIA_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.mp4': 'audio/mp4',
+    '.webm': 'audio/webm',
+    '.opus': 'audio/ogg',
+    '.ogg': 'audio/ogg',
+}
+
+# 下載途中或非音訊的檔案
+_NON_AUDIO_SUFFIXES = ('.info.json', '.part', '.ytdl', '.tmp')
+
+
+def info_path(video_id: str) -> str:
+    return os.path.join(AUDIO_DIR, f'{video_id}.info.json')
+
+
+def read_info(video_id: str) -> Optional[Dict[str, Any]]:
+    """讀取資訊檔，不存在時回傳 None"""
+    path = info_path(video_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"讀取資訊檔錯誤 ({video_id}): {e}")
+        return None
+
+
+def write_info(video_id: str, info: Dict[str, Any]):
+    path = info_path(video_id)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def find_audio_path(video_id: str) -> Optional[str]:
+    """找出已下載的音訊檔，尚未下載時回傳 None"""
+    info = read_info(video_id)
+    if info and info.get('filename'):
+        path = os.path.join(AUDIO_DIR, info['filename'])
+        if os.path.exists(path):
+            return path
+
+    legacy_path = os.path.join(AUDIO_DIR, f'{video_id}.mp3')
+    if os.path.exists(legacy_path):
+        return legacy_path
+
+    for path in sorted(glob.glob(os.path.join(AUDIO_DIR, glob.escape(video_id) + '.*'))):
+        if not path.endswith(_NON_AUDIO_SUFFIXES):
+            return path
+    return None
+
+
+def audio_media_type(path: str) -> Optional[str]:
+    return AUDIO_MEDIA_TYPES.get(os.path.splitext(path)[1].lower())
+
+
+def _build_info(video_id: str, info: Dict[str, Any], audio_file: Optional[str]) -> Dict[str, Any]:
+    """從 yt-dlp 的資訊中取出需要保存的欄位"""
+    codec = info.get('acodec')
+    if audio_file and audio_file.endswith('.mp3'):
+        # 轉檔後的編碼與 yt-dlp 回報的原始串流不同
+        codec = 'mp3'
+    return {
+        "id": video_id,
+        "title": info.get('title', video_id),
+        "artist": info.get('artist') or info.get('creator') or info.get('uploader'),
+        "track": info.get('track'),
+        "duration": info.get('duration'),
+        "codec": codec,
+        "filename": os.path.basename(audio_file) if audio_file else None,
+        "webpage_url": info.get('webpage_url'),
+    }
+
+
+def download_audio(ctx: JobContext, url: str, video_id: str) -> Dict[str, Any]:
+    """在下載執行緒中下載音頻並寫入資訊檔，回傳資訊"""
+    def progress_hook(d: Dict[str, Any]):
+        if d.get('status') == 'downloading':
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            ctx.report('download', d.get('downloaded_bytes', 0) / total if total else None)
+
+    ydl_opts: Dict[str, Any] = {
+        'format': 'bestaudio/best',
+        'outtmpl': os.path.join(AUDIO_DIR, f'{video_id}.%(ext)s'),
+        'progress_hooks': [progress_hook],
+    }
+    if not config.DOWNLOAD_KEEP_NATIVE:
+        ydl_opts['postprocessors'] = [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '192',
+        }]
+
+    with YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        if (info is None):
+            raise Exception(
+                "Failed to extract video info")
+
+    downloads = info.get('requested_downloads') or [{}]
+    audio_file = downloads[0].get('filepath') or find_audio_path(video_id)
+    result = _build_info(video_id, info, audio_file)
+    write_info(video_id, result)
+    return result
+
+
+def fetch_video_info(ctx: JobContext, url: str, video_id: str) -> Dict[str, Any]:
+    """
+    取得已下載歌曲的資訊：優先讀取資訊檔
+    舊的下載沒有資訊檔時才連網取得一次，並補寫資訊檔
+    """
+    info = read_info(video_id)
+    if info is not None:
+        return info
+    try:
+        with YoutubeDL({'skip_download': True}) as ydl:
+            raw_info = ydl.extract_info(
+                url, download=False)
+            if (raw_info is None):
+                raise Exception(
+                    "Failed to extract video info")
+    except Exception:
+        # 如果無法獲取名稱，使用ID代替
+        return {"id": video_id, "title": video_id}
+    info = _build_info(video_id, raw_info, find_audio_path(video_id))
+    write_info(video_id, info)
+    return info
@@ -0,0 +1,287 @@
+"""
+主機自動調校：在本機以一段短音訊比較 faster-whisper 的設定，保存最快且準確度足夠的設定
+- 候選：模型、計算精度、每個 worker 的 CPU 執行緒數、beam size
+- 以最大模型、最高精度、beam 5 的轉錄作為參考，其他設定以字元相似度衡量準確度
+- 依序調整模型與精度、執行緒數、beam size，每一步保留達到 TUNING_MIN_ACCURACY 且最快的設定
+- 結果依主機硬體 (config.host_fingerprint) 保存於 HOST_TUNING_FILE，config 載入時套用於轉錄與對齊
+  （環境變數明確指定的設定優先），不同型號的主機各自調校
+
+用法: python host_tuning.py calibrate [--sample 音訊檔] [--models small,medium]
+      python host_tuning.py show
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, replace
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, List, Optional
+
+import ctranslate2
+import numpy as np
+import stable_whisper
+
+import config
+from downloader import AUDIO_DIR, find_audio_path
+from pcm_cache import SAMPLE_RATE, pcm_cache
+
+# 各裝置的候選計算精度，第一個為精度最高者（作為參考）
+COMPUTE_TYPES = {
+    'cpu': ['float32', 'int8_float32', 'int8'],
+    'cuda': ['float16', 'int8_float16', 'int8'],
+}
+BEAM_SIZES = (5, 1)
+# 暖機使用的音訊長度（秒），不列入計時
+WARMUP_SECONDS = 2.0
+
+_ENV_SETTINGS = {
+    'model': 'WHISPER_MODEL',
+    'compute_type': 'WHISPER_COMPUTE_TYPE',
+    'cpu_threads': 'WHISPER_CPU_THREADS',
+    'beam_size': 'WHISPER_BEAM_SIZE',
+}
+
+
+@dataclass(frozen=True)
+class Candidate:
+    model: str
+    compute_type: str
+    cpu_threads: int
+    beam_size: int
+
+
+@dataclass
+class Measurement:
+    candidate: Candidate
+    seconds: float
+    # 處理秒數 / 音訊秒數
+    rtf: float
+    accuracy: float
+    text: str
+
+
+def resolve_device() -> str:
+    if config.WHISPER_DEVICE != 'auto':
+        return config.WHISPER_DEVICE
+    return 'cuda' if ctranslate2.get_cuda_device_count() > 0 else 'cpu'
+
+
+def thread_candidates() -> List[int]:
+    """每個 worker 的 CPU 執行緒數：平分所有核心，或只用一半（留給人聲分離與解碼）"""
+    workers = config.WHISPER_NUM_WORKERS or config.INFERENCE_WORKERS
+    per_worker = max(1, (os.cpu_count() or 1) // workers)
+    return sorted({per_worker, max(1, per_worker // 2)}, reverse=True)
+
+
+def load_sample(path: Optional[str] = None, seconds: float = config.TUNING_SAMPLE_SECONDS) -> np.ndarray:
+    """讀取調校用的音訊，取中段（通常有人聲）的 seconds 秒"""
+    path = path or config.TUNING_SAMPLE
+    if not path:
+        # 已下載的第一首歌
+        for info_file in sorted(glob.glob(os.path.join(AUDIO_DIR, '*.info.json'))):
+            path = find_audio_path(os.path.basename(info_file).removesuffix('.info.json'))
+            if path is not None:
+                break
+        else:
+            raise FileNotFoundError("沒有可用的調校音訊，請以 TUNING_SAMPLE 或 --sample 指定")
+    audio = np.asarray(pcm_cache.get_pcm(path), dtype=np.float32)
+    length = int(seconds * SAMPLE_RATE)
+    start = max(0, (len(audio) - length) // 2)
+    return np.ascontiguousarray(audio[start:start + length])
+
+
+def similarity(reference: str, text: str) -> float:
+    """忽略空白的字元相似度（0~1）"""
+    reference = ''.join(reference.split())
+    text = ''.join(text.split())
+    if not reference:
+        return 1.0 if not text else 0.0
+    return SequenceMatcher(None, reference, text, autojunk=False).ratio()
+
+
+class _Benchmark:
+    """依序量測候選設定，相同的模型設定只載入一次"""
+
+    def __init__(self, audio: np.ndarray, device: str, log: Callable[[str], None]):
+        self.audio = audio
+        self.device = device
+        self.log = log
+        self.language: Optional[str] = None
+        self.reference: Optional[str] = None
+        self.results: Dict[Candidate, Measurement] = {}
+        self._model_key: Any = None
+        self._model: Any = None
+
+    def _get_model(self, candidate: Candidate) -> Any:
+        key = (candidate.model, candidate.compute_type, candidate.cpu_threads)
+        if key != self._model_key:
+            self._model = None
+            self._model = stable_whisper.load_faster_whisper(
+                candidate.model, device=self.device, compute_type=candidate.compute_type,
+                cpu_threads=candidate.cpu_threads)
+            self._model_key = key
+            # 暖機，第一次推論的初始化不列入計時
+            self._transcribe(candidate, self.audio[:int(WARMUP_SECONDS * SAMPLE_RATE)])
+        return self._model
+
+    def _transcribe(self, candidate: Candidate, audio: np.ndarray) -> str:
+        segments, info = self._model.transcribe_original(
+            audio, beam_size=candidate.beam_size, language=self.language)
+        text = ''.join(segment.text for segment in segments)
+        # 參考轉錄偵測到的語言固定用於之後的候選，避免語言偵測影響比較
+        if self.language is None and len(audio) == len(self.audio):
+            self.language = info.language
+        return text
+
+    def measure(self, candidate: Candidate) -> Optional[Measurement]:
+        if candidate in self.results:
+            return self.results[candidate]
+        try:
+            self._get_model(candidate)
+            started = time.perf_counter()
+            text = self._transcribe(candidate, self.audio)
+            seconds = time.perf_counter() - started
+        except Exception as e:
+            self.log(f"{candidate}: 失敗 ({e})")
+            return None
+        if self.reference is None:
+            self.reference = text
+        measurement = Measurement(candidate, seconds, seconds / (len(self.audio) / SAMPLE_RATE),
+                                  similarity(self.reference, text), text)
+        self.results[candidate] = measurement
+        self.log(f"{candidate.model} {candidate.compute_type} threads={candidate.cpu_threads} "
+                 f"beam={candidate.beam_size}: {seconds:.2f}s RTF {measurement.rtf:.3f} "
+                 f"準確度 {measurement.accuracy:.3f}")
+        return measurement
+
+    def fastest(self, candidates: List[Candidate], min_accuracy: float) -> Optional[Measurement]:
+        measured = [self.measure(candidate) for candidate in candidates]
+        passing = [m for m in measured if m is not None and m.accuracy >= min_accuracy]
+        return min(passing, key=lambda m: m.seconds) if passing else None
+
+
+def calibrate(sample_path: Optional[str] = None, models: Optional[List[str]] = None,
+              min_accuracy: float = config.TUNING_MIN_ACCURACY,
+              seconds: float = config.TUNING_SAMPLE_SECONDS,
+              log: Callable[[str], None] = print) -> Dict[str, Any]:
+    """量測候選設定並回傳最快且準確度足夠的設定（尚未保存）"""
+    models = models or config.TUNING_MODELS
+    device = resolve_device()
+    supported = ctranslate2.get_supported_compute_types(device)
+    compute_types = [ct for ct in COMPUTE_TYPES.get(device, COMPUTE_TYPES['cpu']) if ct in supported]
+    threads = thread_candidates()
+    benchmark = _Benchmark(load_sample(sample_path, seconds), device, log)
+    log(f"調校 {config.host_fingerprint()}，裝置 {device}，樣本 {seconds:.0f} 秒")
+
+    # 參考：最後一個（最大的）模型、最高精度、所有執行緒、beam 5
+    reference = benchmark.measure(Candidate(models[-1], compute_types[0], threads[0], BEAM_SIZES[0]))
+    if reference is None:
+        raise RuntimeError("參考設定無法執行")
+
+    # 1. 模型與計算精度
+    best = benchmark.fastest(
+        [Candidate(model, compute_type, threads[0], BEAM_SIZES[0])
+         for model in models for compute_type in compute_types], min_accuracy) or reference
+    # 2. 執行緒數
+    best = benchmark.fastest(
+        [replace(best.candidate, cpu_threads=count) for count in threads], min_accuracy) or best
+    # 3. beam size
+    best = benchmark.fastest(
+        [replace(best.candidate, beam_size=beam_size) for beam_size in BEAM_SIZES], min_accuracy) or best
+
+    return {
+        **asdict(best.candidate),
+        "device": device,
+        "rtf": round(best.rtf, 4),
+        "accuracy": round(best.accuracy, 4),
+        "language": benchmark.language,
+        "sample_seconds": seconds,
+        "calibrated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def _read_file() -> Dict[str, Any]:
+    try:
+        with open(config.HOST_TUNING_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save(profile: Dict[str, Any]):
+    """保存本主機的調校結果（其他主機的結果保留）"""
+    data = _read_file()
+    data.setdefault('hosts', {})[config.host_fingerprint()] = profile
+    os.makedirs(os.path.dirname(config.HOST_TUNING_FILE) or '.', exist_ok=True)
+    temp_path = f'{config.HOST_TUNING_FILE}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, config.HOST_TUNING_FILE)
+
+
+def apply(profile: Dict[str, Any]):
+    """
+    在目前的程序套用調校結果（config 載入後才調校時使用）
+    環境變數明確指定的設定不變；之後啟動的程序由 config 直接讀取保存的結果
+    """
+    applied = {name: profile[name] for name, env in _ENV_SETTINGS.items() if name in profile and env not in os.environ}
+    if 'model' in applied:
+        if 'WHISPER_PRELOAD_MODELS' not in os.environ:
+            config.WHISPER_PRELOAD_MODELS = [applied['model']]
+        config.WHISPER_MODEL = applied['model']
+    if 'compute_type' in applied:
+        config.WHISPER_COMPUTE_TYPE = applied['compute_type']
+    if 'cpu_threads' in applied:
+        config.WHISPER_CPU_THREADS = int(applied['cpu_threads'])
+    if 'beam_size' in applied:
+        config.WHISPER_BEAM_SIZE = int(applied['beam_size'])
+    config.HOST_TUNING = profile
+
+
+def ensure_tuned():
+    """AUTO_TUNE_ON_STARTUP 啟用且本主機尚未調校時執行調校，失敗時沿用目前設定"""
+    if not config.AUTO_TUNE_ON_STARTUP or config.HOST_TUNING:
+        return
+    try:
+        profile = calibrate()
+    except FileNotFoundError as e:
+        # 第一次啟動時還沒有下載任何歌曲
+        print(f"警告: AUTO_TUNE_ON_STARTUP 已啟用，但沒有可用的調校音訊 ({e})，略過主機調校並沿用目前設定；"
+              f"下載歌曲或設定 TUNING_SAMPLE 後重新啟動即會調校")
+        return
+    except Exception as e:
+        print(f"主機調校失敗，沿用目前設定: {e}")
+        return
+    save(profile)
+    apply(profile)
+    print(f"主機調校結果: {profile}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="faster-whisper 主機自動調校")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    calibrate_parser = subparsers.add_parser('calibrate', help="量測並保存本主機最快的設定")
+    calibrate_parser.add_argument('--sample', help="調校用的音訊檔（預設為 TUNING_SAMPLE 或已下載的第一首歌）")
+    calibrate_parser.add_argument('--seconds', type=float, default=config.TUNING_SAMPLE_SECONDS)
+    calibrate_parser.add_argument('--models', help="比較的模型（逗號分隔，最後一個作為參考）")
+    calibrate_parser.add_argument('--min-accuracy', type=float, default=config.TUNING_MIN_ACCURACY)
+    calibrate_parser.add_argument('--dry-run', action='store_true', help="只顯示結果，不保存")
+    subparsers.add_parser('show', help="顯示本主機目前的調校結果")
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        print(config.host_fingerprint())
+        print(json.dumps(config.HOST_TUNING or None, ensure_ascii=False, indent=2))
+        return
+
+    models = [model.strip() for model in args.models.split(',') if model.strip()] if args.models else None
+    profile = calibrate(args.sample, models, args.min_accuracy, args.seconds)
+    print(json.dumps(profile, ensure_ascii=False, indent=2))
+    if not args.dry_run:
+        save(profile)
+        print(f"已保存至 {config.HOST_TUNING_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+爬蟲共用的 HTML 擷取層
+- 所有正規表達式在模組載入時預先編譯
+- 以預先編譯的樣式直接定位目標元素的開始標籤，只解析該元素，元素結束即停止
+  不必為了一個 div 建立整頁的 BeautifulSoup 樹
+擷取失敗時回傳 None，由爬蟲改用原本的 BeautifulSoup 解析
+"""
+import re
+from html.parser import HTMLParser
+from typing import List, Optional, Pattern, Tuple
+
+# 沒有結束標籤的元素
+VOID_TAGS = frozenset({
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+})
+# 內容不算文字的元素（與 BeautifulSoup get_text 相同）
+_SKIP_TEXT_TAGS = frozenset({'script', 'style', 'template'})
+
+_FEED_CHUNK = 8192
+
+
+def tag_with_attr(tag: str, attr: str, value: str) -> Pattern[str]:
+    """開始標籤中屬性等於 value"""
+    return re.compile(
+        rf'<{tag}\b[^>]*?\s{attr}\s*=\s*["\']{re.escape(value)}["\']', re.IGNORECASE)
+
+
+def tag_with_class(tag: str, class_name: str) -> Pattern[str]:
+    """開始標籤的 class 中含有 class_name 這個類別"""
+    return re.compile(
+        rf'<{tag}\b[^>]*?\sclass\s*=\s*["\'](?:[^"\']*\s)?{re.escape(class_name)}(?:\s[^"\']*)?["\']',
+        re.IGNORECASE)
+
+
+def tag_with_class_containing(tag: str, fragment: str) -> Pattern[str]:
+    """開始標籤的 class 屬性中含有 fragment 字串（對應 CSS 的 [class*=...]）"""
+    return re.compile(
+        rf'<{tag}\b[^>]*?\sclass\s*=\s*["\'][^"\']*{re.escape(fragment)}', re.IGNORECASE)
+
+
+# 魔鏡歌詞網
+MOJIM_SEARCH_RESULT = tag_with_class('div', 'mxsh_ll1')
+MOJIM_TITLE = tag_with_class('div', 'fsZx3')
+MOJIM_LYRICS = tag_with_attr('div', 'id', 'fsZx2')
+
+# Genius
+GENIUS_TITLE = tag_with_class_containing('h1', 'SongHeader__Title')
+GENIUS_LYRICS = tag_with_attr('div', 'data-lyrics-container', 'true')
+
+# AZLyrics：歌詞在授權聲明註解與廣告註解之間
+AZLYRICS_LYRICS = re.compile(
+    r'<!-- Usage of azlyrics.com content by any third-party lyrics provider is prohibited by our licensing agreement. Sorry about that. -->(.*?)<!-- MxM banner -->', re.DOTALL)
+AZLYRICS_TITLE = re.compile(r'<title>(.*?) Lyrics \| AZLyrics.com</title>')
+AZLYRICS_URL_CLEANER = re.compile(r'[^\w]')
+
+# 歌詞タイム
+KASITIME_SONG_LINK = re.compile(r'<a href="(item-\d+\.html)"')
+KASITIME_LYRICS = re.compile(r'<div class="lyrics">(.*?)</div>', re.DOTALL)
+KASITIME_TITLE = re.compile(r'<h1 class="title">(.*?)</h1>')
+KASITIME_ARTIST = re.compile(r'<p class="artist">(.*?)</p>')
+
+# LyricsTranslate
+LYRICSTRANSLATE_SONG_LINK = re.compile(r'<a href="(/en/[^"]+?)"[^>]*?class="search-result__title')
+LYRICSTRANSLATE_LYRICS = re.compile(r'<div class="ltf">.*?<div>(.*?)</div>', re.DOTALL)
+LYRICSTRANSLATE_TITLE = re.compile(r'<h2 class="title-h2">(.*?)</h2>')
+LYRICSTRANSLATE_ARTIST = re.compile(r'<a[^>]*?class="author[^>]*?>(.*?)</a>')
+
+# 歌詞文字清理
+BR_TAG = re.compile(r'<br\s*/?>')
+ANY_TAG = re.compile(r'<.*?>')
+BLANK_LINES = re.compile(r'\n\s*\n')
+BRACKET_NOTE = re.compile(r'\[.*?\]')
+
+
+def html_to_text(fragment: str, br_newline: bool = True) -> str:
+    """將 HTML 片段轉為純文字：<br> 換行、移除其餘標籤"""
+    if br_newline:
+        fragment = BR_TAG.sub('\n', fragment)
+    return ANY_TAG.sub('', fragment)
+
+
+class _Done(Exception):
+    """目標元素已解析完畢，中止解析"""
+
+
+class _ElementParser(HTMLParser):
+    """從目標元素的開始標籤開始解析，元素結束時停止"""
+
+    def __init__(self, br_text: Optional[str] = None, child_tag: Optional[str] = None):
+        super().__init__(convert_charrefs=True)
+        self.br_text = br_text
+        self.child_tag = child_tag
+        self.child_attrs: Optional[dict] = None
+        self.strings: List[str] = []
+        self.stack: List[str] = []
+        self.skip = 0
+        # 上一個事件是否為文字：分段餵入時同一個文字節點會分成多次 handle_data，需要接回同一個字串
+        self.in_text = False
+
+    def handle_starttag(self, tag, attrs):
+        self.in_text = False
+        if self.stack and tag == self.child_tag:
+            self.child_attrs = dict(attrs)
+            raise _Done
+        if tag == 'br' and self.br_text is not None and self.stack:
+            self.strings.append(self.br_text)
+        if tag in VOID_TAGS:
+            return
+        self.stack.append(tag)
+        if tag in _SKIP_TEXT_TAGS:
+            self.skip += 1
+
+    def handle_endtag(self, tag):
+        self.in_text = False
+        if tag not in self.stack:
+            # 沒有對應開始標籤的結束標籤，忽略
+            return
+        # 未關閉的子元素隨上層元素一起關閉
+        while self.stack:
+            closed = self.stack.pop()
+            if closed in _SKIP_TEXT_TAGS:
+                self.skip -= 1
+            if closed == tag:
+                break
+        if not self.stack:
+            raise _Done
+
+    def handle_data(self, data):
+        if self.stack and not self.skip:
+            if self.in_text:
+                self.strings[-1] += data
+            else:
+                self.strings.append(data)
+                self.in_text = True
+
+    def handle_comment(self, data):
+        # 註解與 BeautifulSoup 相同，將前後的文字分為不同的字串
+        self.in_text = False
+
+
+def _parse_from(html: str, start: int, parser: _ElementParser) -> bool:
+    """由 start 開始分段餵給解析器，回傳是否在元素結束時停止"""
+    try:
+        for offset in range(start, len(html), _FEED_CHUNK):
+            parser.feed(html[offset:offset + _FEED_CHUNK])
+        parser.close()
+    except _Done:
+        return True
+    return False
+
+
+def element_text(html: str, start_tag: Pattern[str], separator: str = '',
+                 br_text: Optional[str] = None) -> Optional[str]:
+    """
+    取得第一個符合 start_tag 的元素的文字（等同 BeautifulSoup 的 get_text(separator)）
+    br_text 不為 None 時，元素內的 <br> 視為該字串
+    找不到元素時回傳 None
+    """
+    match = start_tag.search(html)
+    if match is None:
+        return None
+    parser = _ElementParser(br_text=br_text)
+    _parse_from(html, match.start(), parser)
+    return separator.join(parser.strings)
+
+
+def first_descendant_attr(html: str, start_tag: Pattern[str], child_tag: str, attr: str) -> Optional[str]:
+    """取得第一個符合 start_tag 的元素中，第一個 child_tag 子孫元素的屬性值"""
+    match = start_tag.search(html)
+    if match is None:
+        return None
+    parser = _ElementParser(child_tag=child_tag)
+    _parse_from(html, match.start(), parser)
+    if parser.child_attrs is None:
+        return None
+    return parser.child_attrs.get(attr)
+
+
+def mojim_search_link(html: str) -> Optional[str]:
+    """魔鏡搜尋結果的第一個歌詞連結（相對路徑）"""
+    return first_descendant_attr(html, MOJIM_SEARCH_RESULT, 'a', 'href')
+
+
+def mojim_lyrics(html: str) -> Optional[Tuple[Optional[str], str]]:
+    """魔鏡歌詞頁的 (歌名, 原始歌詞)，找不到歌詞時回傳 None"""
+    raw_lyrics = element_text(html, MOJIM_LYRICS, separator='\n')
+    if raw_lyrics is None:
+        return None
+    title = element_text(html, MOJIM_TITLE)
+    return (title.strip() if title is not None else None), raw_lyrics.strip()
+
+
+def genius_lyrics(html: str) -> Optional[Tuple[Optional[str], str]]:
+    """Genius 歌詞頁的 (歌名, 原始歌詞)，找不到歌詞時回傳 None"""
+    raw_lyrics = element_text(html, GENIUS_LYRICS, separator='\n', br_text='\n')
+    if raw_lyrics is None:
+        return None
+    title = element_text(html, GENIUS_TITLE)
+    return (title.strip() if title is not None else None), raw_lyrics.strip()
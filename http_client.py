@@ -0,0 +1,114 @@
+"""
+共用的非同步 HTTP 客戶端：整個應用程式共用一個連線池
+- keep-alive 連線重複使用，省去每次請求的 TLS 交握
+- DNS 快取、每個主機的連線數上限
+- 自動解壓 gzip / deflate（有安裝 Brotli 時也支援 br）
+- 連線錯誤、逾時、429 及 5xx 時以指數退避重試
+"""
+import asyncio
+import random
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+import config
+
+try:
+    import brotli  # noqa: F401  # aiohttp 偵測到時自動解壓 br
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+# 這些狀態碼視為暫時性錯誤，可以重試
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# 呼叫端設定時，記錄目前任務中重試後仍失敗的請求網址
+# （request 失敗時同樣回傳 None，呼叫端藉此區分「網站沒有結果」與「網站無法連線」）
+request_failures: ContextVar[Optional[List[str]]] = ContextVar('request_failures', default=None)
+
+
+class HttpClient:
+    """具連線池與重試機制的 HTTP 客戶端"""
+
+    def __init__(self, limit: int = config.HTTP_POOL_LIMIT,
+                 limit_per_host: int = config.HTTP_POOL_LIMIT_PER_HOST,
+                 dns_ttl: int = config.HTTP_DNS_TTL,
+                 timeout: float = config.HTTP_TIMEOUT,
+                 retries: int = config.HTTP_RETRIES,
+                 backoff: float = 0.5):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """取得連線池；在不同的事件迴圈中使用時（例如命令列測試）重新建立"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=self.dns_ttl)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=DEFAULT_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._loop = loop
+        return self._session
+
+    async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                      json_body: bool = False, **kwargs) -> Optional[Any]:
+        """
+        發送請求並回傳內容（文字或 JSON），非 200 回應或重試後仍失敗時回傳 None
+        """
+        session = self._get_session()
+        for attempt in range(self.retries + 1):
+            retry_after: Optional[float] = None
+            try:
+                async with session.request(method, url, headers=headers, **kwargs) as response:
+                    if response.status == 200:
+                        if json_body:
+                            return await response.json(content_type=None)
+                        return await response.text()
+                    if response.status not in RETRY_STATUSES:
+                        return None
+                    header = response.headers.get("Retry-After", "")
+                    retry_after = float(header) if header.isdigit() else None
+                    error: Any = f"HTTP {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt == self.retries:
+                print(f"請求錯誤 ({url}): {error}")
+                failures = request_failures.get()
+                if failures is not None:
+                    failures.append(url)
+                return None
+            delay = retry_after if retry_after is not None else \
+                self.backoff * (2 ** attempt) * (1 + random.random())
+            await asyncio.sleep(delay)
+        return None
+
+    async def get_text(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> Optional[str]:
+        return await self.request("GET", url, headers=headers, **kwargs)
+
+    async def get_json(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> Optional[Any]:
+        return await self.request("GET", url, headers=headers, json_body=True, **kwargs)
+
+    async def close(self):
+        """關閉連線池，用於應用程式結束時"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+http_client = HttpClient()
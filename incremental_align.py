@@ -0,0 +1,154 @@
+"""
+增量對齊：歌詞文字修改後只重新對齊變更的部分
+- 比對舊對齊結果的段落文字與新的歌詞文字（忽略空白，逐字比對，適用於中日韓歌詞）
+- 文字完全未變更的段落保留原本的時間戳，作為前後的錨點
+- 變更的文字只在前後錨點之間的音訊範圍重新對齊，再把時間戳平移回整首歌的時間
+"""
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from difflib import Match, SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+@dataclass
+class Realignment:
+    """需要重新對齊的一段歌詞：text 在 [start, end) 秒的音訊中對齊"""
+    text: str
+    start: float
+    end: float
+    # 插入在第幾個保留段落之前
+    position: int
+
+
+@dataclass
+class AlignmentPlan:
+    """保留的舊段落與需要重新對齊的範圍"""
+    kept: List[Dict[str, Any]]
+    regions: List[Realignment]
+    # 需要重新對齊的文字佔全部文字的比例
+    changed_ratio: float
+
+
+def _compact(text: str) -> Tuple[str, List[int]]:
+    """移除空白的文字，以及每個字元在原文中的位置"""
+    chars, positions = [], []
+    for i, char in enumerate(text):
+        if not char.isspace():
+            chars.append(char)
+            positions.append(i)
+    return ''.join(chars), positions
+
+
+def _has_times(segment: Dict[str, Any]) -> bool:
+    return isinstance(segment.get('start'), (int, float)) and isinstance(segment.get('end'), (int, float))
+
+
+def _map_char(blocks: List[Match], block_starts: List[int], index: int) -> Optional[int]:
+    """舊文字第 index 個字元在新文字中的位置，不在相同區塊內時回傳 None"""
+    i = bisect_right(block_starts, index) - 1
+    if i < 0:
+        return None
+    a, b, size = blocks[i]
+    return index - a + b if index < a + size else None
+
+
+def plan_realignment(segments: List[Dict[str, Any]], text: str, duration: float) -> Optional[AlignmentPlan]:
+    """
+    比對舊的對齊段落與新的歌詞文字
+    舊段落沒有時間戳，或變更處沒有可用的音訊範圍時回傳 None（需要整首重新對齊）
+    """
+    if not segments or not all(_has_times(segment) for segment in segments):
+        return None
+    new_chars, new_positions = _compact(text)
+    if not new_chars:
+        return None
+
+    # 舊段落在去除空白後的文字中的範圍
+    old_parts, spans, offset = [], [], 0
+    for segment in segments:
+        compact = _WHITESPACE.sub('', segment.get('text') or '')
+        old_parts.append(compact)
+        spans.append((offset, offset + len(compact)))
+        offset += len(compact)
+    old_chars = ''.join(old_parts)
+    if old_chars == new_chars:
+        # 只有空白或換行不同，全部沿用
+        return AlignmentPlan(list(segments), [], 0.0)
+
+    matcher = SequenceMatcher(None, old_chars, new_chars, autojunk=False)
+    blocks = matcher.get_matching_blocks()
+    block_starts = [block.a for block in blocks]
+
+    # 段落的第一個或最後一個字元落在相同區塊內，且換算後的位置上文字相同時保留原本的時間戳
+    # （段落邊界的字元可能被相鄰的區塊吸收，不能要求整段在同一個區塊內）
+    kept: List[Tuple[Dict[str, Any], int, int]] = []
+    kept_end = 0
+    for segment, part, (start, end) in zip(segments, old_parts, spans):
+        if start == end:
+            continue
+        first, last = _map_char(blocks, block_starts, start), _map_char(blocks, block_starts, end - 1)
+        for new_start in (first, None if last is None else last - (end - 1 - start)):
+            if new_start is None:
+                continue
+            new_end = new_start + len(part)
+            if kept_end <= new_start and new_chars[new_start:new_end] == part:
+                kept.append((segment, new_start, new_end))
+                kept_end = new_end
+                break
+
+    # 保留段落之間若有新的文字，就在兩個錨點之間的音訊重新對齊
+    regions: List[Realignment] = []
+    changed = 0
+    previous_end_char, previous_end_time = 0, 0.0
+    for position, (segment, start_char, end_char) in enumerate(kept + [(None, len(new_chars), len(new_chars))]):
+        if start_char > previous_end_char:
+            end_time = segment['start'] if segment is not None else duration
+            region_text = text[new_positions[previous_end_char]:new_positions[start_char - 1] + 1].strip()
+            if end_time <= previous_end_time:
+                # 沒有可用的音訊範圍（例如在兩個緊鄰的段落之間插入歌詞），改為整首重新對齊
+                return None
+            regions.append(Realignment(region_text, previous_end_time, end_time, position))
+            changed += start_char - previous_end_char
+        if segment is not None:
+            previous_end_char, previous_end_time = end_char, segment['end']
+
+    return AlignmentPlan([segment for segment, _, _ in kept], regions, changed / len(new_chars))
+
+
+def offset_segments(segments: List[Dict[str, Any]], seconds: float) -> List[Dict[str, Any]]:
+    """將在部分音訊上對齊的段落時間戳平移回整首歌的時間"""
+    shifted = []
+    for segment in segments:
+        segment = dict(segment)
+        for key in ('start', 'end'):
+            if isinstance(segment.get(key), (int, float)):
+                segment[key] = round(segment[key] + seconds, 3)
+        if segment.get('words'):
+            segment['words'] = [
+                {**word, **{key: round(word[key] + seconds, 3) for key in ('start', 'end')
+                            if isinstance(word.get(key), (int, float))}}
+                for word in segment['words']
+            ]
+        shifted.append(segment)
+    return shifted
+
+
+def merge_alignment(previous: Dict[str, Any], plan: AlignmentPlan, text: str,
+                    realigned: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    合併保留的段落與重新對齊的段落（realigned 與 plan.regions 一一對應，時間已平移）
+    回傳與完整對齊相同格式的結果
+    """
+    inserted: Dict[int, List[Dict[str, Any]]] = {}
+    for region, segments in zip(plan.regions, realigned):
+        inserted.setdefault(region.position, []).extend(segments)
+    merged: List[Dict[str, Any]] = []
+    for position in range(len(plan.kept) + 1):
+        merged.extend(inserted.get(position, []))
+        if position < len(plan.kept):
+            merged.append(plan.kept[position])
+    merged = [{**segment, 'id': i} if 'id' in segment else segment for i, segment in enumerate(merged)]
+    return {**previous, 'text': text, 'segments': merged}
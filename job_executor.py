@@ -0,0 +1,306 @@
+"""
+工作執行器：在獨立的執行緒池中執行下載、轉錄、對齊等阻塞工作
+- 限制同時執行的工作數量
+- 依優先度排程（數字越大越優先）
+- 進度透過回呼送回事件迴圈
+- 呼叫端取消（例如 websocket 斷線）時，排隊中的工作直接略過，執行中的工作在下次回報進度時中止
+- 可合併的工作（相同 batch_key）開始執行時，一併取出佇列中相同鍵的工作，以 batch_fn 一次處理
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import config
+from job_profiler import ProfileRequest, profile_job, profile_request
+from metrics import (EXECUTOR_QUEUE_DEPTH, EXECUTOR_RUNNING, JOB_QUEUE_SECONDS, JOB_RUN_SECONDS,
+                     REALTIME_FACTOR, STAGE_SECONDS, log_event)
+
+# (階段名稱, 進度 0~1 或 None)；階段為 "segments_partial" 時第二個參數為新解出的段落列表
+ProgressCallback = Callable[[str, Any], None]
+# 合併執行的函式：傳入 [(JobContext, args), ...]，依序回傳各工作的結果或例外
+BatchFunction = Callable[[List[Tuple["JobContext", tuple]]], List[Any]]
+
+
+class JobCancelled(Exception):
+    """工作已被取消"""
+
+
+class JobContext:
+    """傳入工作函式，用於回報進度及檢查是否已取消"""
+
+    # 進度變化小於此值時不回報，避免大量訊息塞滿 websocket
+    MIN_PROGRESS_STEP = 0.01
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, on_progress: Optional[ProgressCallback]):
+        self._loop = loop
+        self._on_progress = on_progress
+        self._cancel_event = threading.Event()
+        self._last_report: Tuple[Optional[str], float] = (None, -1.0)
+        # 各階段的耗時（秒），以 report 的階段切換計算
+        self.stage_seconds: Dict[str, float] = {}
+        self._stage: Optional[str] = None
+        self._stage_started = 0.0
+        # 工作附帶的資訊（模型、音訊秒數），用於計算即時率及記錄
+        self.annotations: Dict[str, Any] = {}
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        """已取消時拋出 JobCancelled，供工作在適當位置中止"""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def _enter_stage(self, stage: Optional[str]):
+        now = time.perf_counter()
+        if self._stage is not None:
+            self.stage_seconds[self._stage] = self.stage_seconds.get(self._stage, 0.0) + now - self._stage_started
+        self._stage, self._stage_started = stage, now
+
+    def finish(self):
+        """工作結束，結算最後一個階段的耗時"""
+        self._enter_stage(None)
+
+    def annotate(self, **fields: Any):
+        """附加工作資訊：model 與 audio_seconds 用於計算即時率"""
+        self.annotations.update(fields)
+
+    def report(self, stage: str, progress: Optional[float] = None):
+        """回報進度，同時作為取消檢查點"""
+        self.check_cancelled()
+        if stage != self._stage:
+            self._enter_stage(stage)
+        if self._on_progress is None:
+            return
+        last_stage, last_progress = self._last_report
+        if stage == last_stage and progress is not None and progress < 1 \
+                and progress - last_progress < self.MIN_PROGRESS_STEP:
+            return
+        self._last_report = (stage, progress if progress is not None else -1.0)
+        self.publish(stage, progress)
+
+    def publish(self, event: str, value: Any):
+        """不經節流，直接將事件送回事件迴圈"""
+        if self._on_progress is not None:
+            self._loop.call_soon_threadsafe(self._on_progress, event, value)
+
+    def progress_callback(self, stage: str) -> Callable[[float, float], None]:
+        """轉為 stable-ts 的 progress_callback(已處理秒數, 總秒數) 形式"""
+        def callback(seek: float, total: float):
+            self.report(stage, min(seek / total, 1.0) if total else None)
+        return callback
+
+
+class _Job:
+    def __init__(self, fn: Callable[..., Any], args: tuple, kwargs: dict,
+                 context: JobContext, future: "asyncio.Future[Any]",
+                 batch_key: Optional[Hashable] = None, batch_fn: Optional[BatchFunction] = None,
+                 max_batch: int = 1):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.context = context
+        self.future = future
+        # 可合併執行的工作：相同鍵的工作以 batch_fn 一次處理（只傳入位置參數）
+        self.batch_key = batch_key
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.submitted = time.perf_counter()
+        # 提交時所在請求的分析設定（沒有時為 None）
+        self.profile: Optional[ProfileRequest] = profile_request.get()
+
+
+def _job_name(job: _Job) -> str:
+    return getattr(job.fn, '__name__', 'job').lstrip('_')
+
+
+class JobExecutor:
+    """具優先度與取消功能的有界執行緒池"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._queue: List[Tuple[int, int, _Job]] = []
+        self._condition = threading.Condition()
+        self._counter = itertools.count()
+        self._workers: List[threading.Thread] = []
+        self._running = 0
+
+    def _update_gauges(self):
+        """更新佇列長度與執行中的工作數（需持有 _condition）"""
+        EXECUTOR_QUEUE_DEPTH.set(len(self._queue), executor=self.name)
+        EXECUTOR_RUNNING.set(self._running, executor=self.name)
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        for i in range(self.max_workers):
+            worker = threading.Thread(
+                target=self._worker, name=f'{self.name}-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    async def submit(self, fn: Callable[..., Any], *args, priority: int = 0,
+                     on_progress: Optional[ProgressCallback] = None,
+                     batch_key: Optional[Hashable] = None, batch_fn: Optional[BatchFunction] = None,
+                     max_batch: int = 1, **kwargs) -> Any:
+        """
+        提交工作並等待結果，fn 的第一個參數為 JobContext
+        等待中的協程被取消時，工作也會一併取消
+        指定 batch_key 與 batch_fn 時，開始執行時最多與 max_batch - 1 個排隊中相同鍵的工作合併執行
+        """
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[Any]" = loop.create_future()
+        context = JobContext(loop, on_progress)
+        job = _Job(fn, args, kwargs, context, future,
+                   batch_key if batch_fn is not None and max_batch > 1 else None, batch_fn, max_batch)
+
+        with self._condition:
+            self._ensure_workers()
+            heapq.heappush(
+                self._queue, (-priority, next(self._counter), job))
+            self._update_gauges()
+            self._condition.notify()
+
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            context.cancel()
+            with self._condition:
+                # 尚未開始的工作直接移出佇列
+                remaining = [item for item in self._queue if item[2] is not job]
+                if len(remaining) != len(self._queue):
+                    self._queue = remaining
+                    heapq.heapify(self._queue)
+                    self._update_gauges()
+            raise
+
+    def _take_batch(self, job: _Job) -> List[_Job]:
+        """取出佇列中可與 job 合併的工作（依優先度），需持有 _condition"""
+        if job.batch_key is None:
+            return [job]
+        batch = [job]
+        for item in sorted(self._queue):
+            if len(batch) >= job.max_batch:
+                break
+            other = item[2]
+            if other.batch_key == job.batch_key and not other.context.cancelled:
+                batch.append(other)
+        if len(batch) > 1:
+            taken = {id(other) for other in batch}
+            self._queue = [item for item in self._queue if id(item[2]) not in taken]
+            heapq.heapify(self._queue)
+        return batch
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                _, _, job = heapq.heappop(self._queue)
+                if job.context.cancelled:
+                    self._update_gauges()
+                    continue
+                batch = self._take_batch(job)
+                self._running += len(batch)
+                self._update_gauges()
+
+            if len(batch) > 1:
+                self._run_batch(batch)
+                continue
+
+            started = time.perf_counter()
+            status = 'ok'
+            result: Any = None
+            exception: Optional[BaseException] = None
+            try:
+                with profile_job(job.profile, _job_name(job)):
+                    result = job.fn(job.context, *job.args, **job.kwargs)
+            except BaseException as e:
+                status = 'cancelled' if isinstance(e, JobCancelled) else 'error'
+                exception = e
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    self._update_gauges()
+            # 先記錄再送回結果，呼叫端取得結果時指標已更新
+            self._record(job, started, status)
+            self._resolve(job, result=result, exception=exception)
+
+    def _run_batch(self, batch: List[_Job]):
+        """以 batch_fn 一次執行多個工作，再分別送回結果"""
+        started = time.perf_counter()
+        leader = batch[0]
+        try:
+            with profile_job(leader.profile, f'{_job_name(leader)}_batch'):
+                results = list(leader.batch_fn([(job.context, job.args) for job in batch]))  # type: ignore
+            if len(results) < len(batch):
+                # 少回傳的工作視為失敗，不讓呼叫端一直等待
+                missing = RuntimeError(f'batch_fn 只回傳 {len(results)} 個結果，預期 {len(batch)} 個')
+                results += [missing] * (len(batch) - len(results))
+        except BaseException as e:
+            results = [e] * len(batch)
+        finally:
+            with self._condition:
+                self._running -= len(batch)
+                self._update_gauges()
+        for job, result in zip(batch, results):
+            if isinstance(result, BaseException):
+                status = 'cancelled' if isinstance(result, JobCancelled) else 'error'
+                self._record(job, started, status)
+                self._resolve(job, exception=result)
+            else:
+                self._record(job, started, 'ok')
+                self._resolve(job, result=result)
+
+    def _record(self, job: _Job, started: float, status: str):
+        """記錄排隊與執行時間、各階段耗時及即時率"""
+        run_seconds = time.perf_counter() - started
+        queue_seconds = started - job.submitted
+        context = job.context
+        context.finish()
+        name = _job_name(job)
+        JOB_QUEUE_SECONDS.observe(queue_seconds, executor=self.name)
+        JOB_RUN_SECONDS.observe(run_seconds, executor=self.name, job=name, status=status)
+        for stage, seconds in context.stage_seconds.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        model = context.annotations.get('model')
+        audio_seconds = context.annotations.get('audio_seconds')
+        if status == 'ok' and model and audio_seconds:
+            for stage in ('transcribe', 'align'):
+                if stage in context.stage_seconds:
+                    REALTIME_FACTOR.observe(context.stage_seconds[stage] / audio_seconds, model=model, stage=stage)
+        log_event('job', executor=self.name, job=name, status=status,
+                  queue_seconds=round(queue_seconds, 3), run_seconds=round(run_seconds, 3),
+                  stages={stage: round(seconds, 3) for stage, seconds in context.stage_seconds.items()},
+                  **context.annotations)
+
+    def _resolve(self, job: _Job, result: Any = None, exception: Optional[BaseException] = None):
+        def set_result():
+            if job.future.done():
+                return
+            if job.context.cancelled:
+                # 呼叫端已離開，不再保留結果
+                job.future.cancel()
+            elif exception is not None:
+                job.future.set_exception(exception)
+            else:
+                job.future.set_result(result)
+        try:
+            job.future.get_loop().call_soon_threadsafe(set_result)
+        except RuntimeError:
+            # 事件迴圈已關閉，沒有人在等待結果
+            pass
+
+
+# 下載以網路 I/O 為主，可以同時進行較多
+download_executor = JobExecutor('download', config.DOWNLOAD_WORKERS)
+# 轉錄與對齊佔滿 CPU，預設一次只跑少量工作
+inference_executor = JobExecutor('inference', config.INFERENCE_WORKERS)
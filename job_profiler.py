@@ -0,0 +1,267 @@
+"""
+單一工作的效能分析（需要時才啟用，平常沒有額外負擔）
+- 由 websocket 的 profile 參數或 /admin/profile 端點啟用，只分析該次請求提交的工作
+- sample 模式：另一個執行緒定期取樣工作執行緒的呼叫堆疊，輸出 flame graph 使用的 collapsed 格式
+  （每行「函式;函式;函式 次數」，可直接交給 flamegraph.pl、speedscope 或 inferno）
+- cprofile 模式：以 cProfile 記錄呼叫，輸出 .pstats（snakeviz、flameprof 可讀取）
+  Python 3.12 起 cProfile 為整個程序共用，結果也包含其他執行緒的呼叫；同時只進行一個 cprofile 分析，
+  其他工作（或已有其他分析工具啟用時）改用 sample 模式
+- 同時以 tracemalloc 記錄 Python 配置的記憶體峰值與配置最多的位置
+  （tracemalloc 為整個程序共用，同時有其他工作時數值也包含其他執行緒的配置，
+  峰值為第一個仍在分析的工作開始後的峰值）
+- 分析無法啟動時只記錄錯誤，工作照常執行
+"""
+import cProfile
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, ContextManager, Dict, Iterator, List, Optional
+
+import config
+
+PROFILE_DIR = os.path.join(config.CACHE_DIR, 'profiles')
+MODES = ('sample', 'cprofile')
+
+# 記錄配置最多的位置數量
+TOP_ALLOCATIONS = 15
+# tracemalloc 保存的堆疊深度
+TRACEMALLOC_FRAMES = 1
+
+
+@dataclass
+class ProfileRequest:
+    """一次分析：同一請求的所有工作寫入同一個目錄"""
+    mode: str
+    label: str
+    profile_id: str = field(default_factory=lambda: time.strftime('%Y%m%d-%H%M%S-') + secrets.token_hex(3))
+    jobs: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(PROFILE_DIR, self.profile_id)
+
+    @property
+    def url(self) -> str:
+        return f'/profiles/{self.profile_id}'
+
+    def write_summary(self):
+        with open(os.path.join(self.directory, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump({**asdict(self), "files": self.files()}, f, ensure_ascii=False, indent=2)
+
+    def files(self) -> List[str]:
+        return [job["file"] for job in self.jobs]
+
+
+# 目前請求的分析設定；提交工作時由執行器讀取（asyncio 任務會複製此值）
+profile_request: ContextVar[Optional[ProfileRequest]] = ContextVar('profile_request', default=None)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class _StackSampler(threading.Thread):
+    """定期取樣指定執行緒的呼叫堆疊"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+class _Tracemalloc:
+    """多個工作同時分析時共用 tracemalloc，最後一個結束時才停止"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = 0
+
+    def start(self):
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            if self._users == 0:
+                # 只在沒有其他分析中的工作時重設，避免清除其他工作的峰值
+                tracemalloc.reset_peak()
+            self._users += 1
+
+    def stop(self) -> Dict[str, Any]:
+        """回傳記憶體峰值與配置最多的位置"""
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            self._users -= 1
+            if self._users == 0:
+                tracemalloc.stop()
+        top = snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+        return {
+            "peak_memory_mb": round(peak / 1024 ** 2, 2),
+            "current_memory_mb": round(current / 1024 ** 2, 2),
+            "top_allocations": [
+                {"location": str(stat.traceback), "size_mb": round(stat.size / 1024 ** 2, 3), "count": stat.count}
+                for stat in top
+            ],
+        }
+
+
+_tracemalloc = _Tracemalloc()
+
+
+# Python 3.12 起 cProfile 為整個程序共用，同時啟用第二個會拋出 ValueError
+_cprofile_lock = threading.Lock()
+
+
+class _Session:
+    """單一工作的分析：啟動失敗時不影響工作"""
+
+    def __init__(self, request: ProfileRequest, job_name: str):
+        self.request = request
+        self.job_name = job_name
+        self.mode = 'sample'
+        self.profiler: Optional[cProfile.Profile] = None
+        self.sampler: Optional[_StackSampler] = None
+        self.started = 0.0
+
+    def _start_cprofile(self) -> bool:
+        if not _cprofile_lock.acquire(blocking=False):
+            return False
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # 其他分析工具（除錯器、coverage）已啟用
+            _cprofile_lock.release()
+            print(f"cProfile 無法啟用，改用 sample 模式 ({self.job_name}): {e}")
+            return False
+        self.profiler = profiler
+        self.mode = 'cprofile'
+        return True
+
+    def start(self):
+        os.makedirs(self.request.directory, exist_ok=True)
+        if self.request.mode != 'cprofile' or not self._start_cprofile():
+            self.sampler = _StackSampler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL)
+            self.sampler.start()
+        try:
+            _tracemalloc.start()
+        except Exception:
+            self._stop_profilers()
+            raise
+        self.started = time.perf_counter()
+
+    def _stop_profilers(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            _cprofile_lock.release()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def stop(self):
+        seconds = time.perf_counter() - self.started
+        self._stop_profilers()
+        index = len(self.request.jobs)
+        job: Dict[str, Any] = {"job": self.job_name, "mode": self.mode, "seconds": round(seconds, 3)}
+        if self.profiler is not None:
+            job["file"] = f'{index}-{self.job_name}.pstats'
+            self.profiler.dump_stats(os.path.join(self.request.directory, job["file"]))
+        if self.sampler is not None:
+            stacks = self.sampler.stacks
+            job["file"] = f'{index}-{self.job_name}.collapsed'
+            job["samples"] = sum(stacks.values())
+            with open(os.path.join(self.request.directory, job["file"]), 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+        job.update(_tracemalloc.stop())
+        self.request.jobs.append(job)
+        self.request.write_summary()
+
+
+@contextmanager
+def _profile(request: ProfileRequest, job_name: str) -> Iterator[None]:
+    session: Optional[_Session] = _Session(request, job_name)
+    try:
+        session.start()  # type: ignore
+    except Exception as e:
+        print(f"效能分析無法啟動，工作照常執行 ({job_name}): {e}")
+        session = None
+    try:
+        yield
+    finally:
+        if session is not None:
+            try:
+                session.stop()
+            except Exception as e:
+                print(f"效能分析結果保存失敗 ({job_name}): {e}")
+
+
+def profile_job(request: Optional[ProfileRequest], job_name: str) -> ContextManager[None]:
+    """在工作執行緒中包住工作函式；沒有分析設定時不做任何事"""
+    if request is None:
+        return nullcontext()
+    return _profile(request, job_name)
+
+
+class ProfileRegistry:
+    """由管理端點預先設定：指定歌曲下一次處理時啟用分析"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._armed: Dict[str, ProfileRequest] = {}
+
+    def arm(self, video_id: str, mode: str) -> ProfileRequest:
+        request = ProfileRequest(mode, video_id)
+        with self._lock:
+            self._armed[video_id] = request
+        return request
+
+    def take(self, video_id: str) -> Optional[ProfileRequest]:
+        with self._lock:
+            return self._armed.pop(video_id, None)
+
+    def summary(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(PROFILE_DIR, profile_id, 'summary.json')
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def list(self) -> List[str]:
+        if not os.path.isdir(PROFILE_DIR):
+            return []
+        return sorted(os.listdir(PROFILE_DIR), reverse=True)
+
+    def file_path(self, profile_id: str, name: str) -> Optional[str]:
+        """分析結果檔案的路徑，只允許 summary.json 列出的檔案"""
+        summary = self.summary(profile_id) if os.path.basename(profile_id) == profile_id else None
+        if summary is None or name not in summary.get("files", []):
+            return None
+        return os.path.join(PROFILE_DIR, profile_id, name)
+
+
+profile_registry = ProfileRegistry()
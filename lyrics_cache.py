@@ -0,0 +1,146 @@
+"""
+歌詞搜尋快取：以正規化後的 (歌手, 歌名) 為鍵，將爬蟲結果保存在 SQLite
+- 找到歌詞時保存結果，有效期 LYRICS_CACHE_TTL
+- 所有網站都找不到時保存「查無歌詞」，有效期較短 (LYRICS_CACHE_NEGATIVE_TTL)，期間直接改用轉錄
+- 記錄每個網站的命中／未命中次數
+"""
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+import config
+from http_client import request_failures
+from lyrics_fanout import SiteUnavailable, is_acceptable
+from metrics import CRAWLER_SECONDS, record_cache
+
+# 影片標題中與歌曲無關的常見字詞
+_NOISE_PATTERN = re.compile(
+    r'official\s*(music\s*)?(video|audio|mv|lyric\s*video)?|music\s*video|lyric\s*video|lyrics?|'
+    r'\bm/?v\b|\bhd\b|\b4k\b|歌詞付き|字幕|動態歌詞|高音質|完整版|官方|中文|日本語',
+    re.IGNORECASE)
+_BRACKET_PATTERN = re.compile(r'[\(\[【（「『〔《][^\)\]】）」』〕》]*[\)\]】）」』〕》]')
+_NON_WORD_PATTERN = re.compile(r'[\W_]+')
+
+
+def _strip_bracket(match: re.Match) -> str:
+    """括號內只有標註字詞（例如「(Official MV)」）時整段移除，否則保留括號內的文字"""
+    inner = match.group(0)[1:-1]
+    if _NON_WORD_PATTERN.sub('', _NOISE_PATTERN.sub('', inner)):
+        return f' {inner} '
+    return ' '
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """正規化歌手或歌名：全半形統一、忽略大小寫、移除標點與常見的影片標註"""
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = _BRACKET_PATTERN.sub(_strip_bracket, text)
+    text = _NOISE_PATTERN.sub(' ', text)
+    return _NON_WORD_PATTERN.sub(' ', text).strip()
+
+
+def normalize_key(artist: Optional[str], title: str) -> Tuple[str, str]:
+    return normalize_text(artist), normalize_text(title)
+
+
+class LyricsSearchCache:
+    """爬蟲結果的 SQLite 快取"""
+
+    def __init__(self, db_path: str = os.path.join(config.CACHE_DIR, 'lyrics_search.sqlite3'),
+                 ttl: float = config.LYRICS_CACHE_TTL,
+                 negative_ttl: float = config.LYRICS_CACHE_NEGATIVE_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        # 查詢都很短，所有執行緒共用一個連線並以鎖保護
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS lyrics_search (
+                    artist TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    result TEXT,
+                    source TEXT,
+                    created REAL NOT NULL,
+                    expires REAL NOT NULL,
+                    PRIMARY KEY (artist, title)
+                )''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS site_stats (
+                    site TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0
+                )''')
+            self._conn.execute('DELETE FROM lyrics_search WHERE expires < ?', (time.time(),))
+
+    def get(self, artist: Optional[str], title: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        查詢快取，回傳 (是否命中, 結果)
+        命中「查無歌詞」時回傳 (True, None)
+        """
+        key = normalize_key(artist, title)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT result, expires FROM lyrics_search WHERE artist = ? AND title = ?', key).fetchone()
+        if row is None or row[1] < time.time():
+            record_cache('lyrics_search', False)
+            return False, None
+        record_cache('lyrics_search', True)
+        return True, json.loads(row[0]) if row[0] is not None else None
+
+    def put(self, artist: Optional[str], title: str, result: Optional[Dict[str, Any]]):
+        """保存搜尋結果，result 為 None 時保存為「查無歌詞」"""
+        now = time.time()
+        ttl = self.ttl if result is not None else self.negative_ttl
+        value = json.dumps(result, ensure_ascii=False) if result is not None else None
+        source = result.get('source') if result is not None else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO lyrics_search VALUES (?, ?, ?, ?, ?, ?)',
+                (*normalize_key(artist, title), value, source, now, now + ttl))
+
+    def record_site(self, site: str, hit: bool):
+        """記錄單一網站的搜尋結果"""
+        column = 'hits' if hit else 'misses'
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR IGNORE INTO site_stats (site) VALUES (?)', (site,))
+            self._conn.execute(f'UPDATE site_stats SET {column} = {column} + 1 WHERE site = ?', (site,))
+
+    async def track_site(self, site: str, attempt: Awaitable[Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        執行單一網站的搜尋並記錄結果
+        請求重試後仍失敗而沒有結果時拋出 SiteUnavailable，不當作查無歌詞
+        被取消的搜尋（其他網站已先找到）不計入統計
+        """
+        started = time.perf_counter()
+        failures: List[str] = []
+        token = request_failures.set(failures)
+        try:
+            result = await attempt
+        except Exception:
+            CRAWLER_SECONDS.observe(time.perf_counter() - started, site=site, result='error')
+            await asyncio.to_thread(self.record_site, site, False)
+            raise
+        finally:
+            request_failures.reset(token)
+        hit = is_acceptable(result)
+        if not hit and failures:
+            CRAWLER_SECONDS.observe(time.perf_counter() - started, site=site, result='error')
+            await asyncio.to_thread(self.record_site, site, False)
+            raise SiteUnavailable(f"{site} 無法連線: {failures[-1]}")
+        CRAWLER_SECONDS.observe(time.perf_counter() - started, site=site, result='hit' if hit else 'miss')
+        await asyncio.to_thread(self.record_site, site, hit)
+        return result
+
+
+lyrics_search_cache = LyricsSearchCache()
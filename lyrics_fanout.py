@@ -0,0 +1,74 @@
+"""
+歌詞搜尋扇出：同時向所有網站、所有查詢組合發出請求
+回傳第一個可用的結果並取消其餘請求，整體有時間上限
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import config
+
+LyricsResult = Dict[str, Any]
+
+# 少於此行數的結果視為解析失敗（例如只抓到標題或錯誤訊息）
+MIN_LYRICS_LINES = 4
+
+
+class SiteUnavailable(Exception):
+    """網站無法連線或重試後仍失敗（與「網站上查無歌詞」區分）"""
+
+
+def is_acceptable(result: Optional[LyricsResult]) -> bool:
+    """判斷爬取結果是否可用"""
+    if not result:
+        return False
+    return len(result.get("lines", [])) >= MIN_LYRICS_LINES
+
+
+async def fan_out(attempts: List[Awaitable[Optional[LyricsResult]]],
+                  timeout: float = config.LYRICS_SEARCH_TIMEOUT,
+                  accept: Callable[[Optional[LyricsResult]], bool] = is_acceptable
+                  ) -> Tuple[Optional[LyricsResult], bool]:
+    """
+    同時執行所有嘗試，回傳 (第一個通過 accept 的結果, 是否所有嘗試都已回應)
+    同時完成多個時以列表中較前面的為準
+    沒有結果時，只有所有嘗試都在 timeout 秒內完成且沒有錯誤，才是確定的「查無歌詞」
+    """
+    tasks = [asyncio.ensure_future(attempt) for attempt in attempts]
+    order = {task: index for index, task in enumerate(tasks)}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pending = set(tasks)
+    answered = True
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                print(f"歌詞搜尋逾時 ({timeout} 秒)")
+                return None, False
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=order.__getitem__):
+                if task.cancelled():
+                    answered = False
+                    continue
+                if task.exception() is not None:
+                    print(f"歌詞搜尋錯誤: {task.exception()}")
+                    answered = False
+                    continue
+                if accept(task.result()):
+                    return task.result(), True
+        return None, answered
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def first_success(attempts: List[Awaitable[Optional[LyricsResult]]],
+                        timeout: float = config.LYRICS_SEARCH_TIMEOUT,
+                        accept: Callable[[Optional[LyricsResult]], bool] = is_acceptable) -> Optional[LyricsResult]:
+    """
+    同時執行所有嘗試，回傳第一個通過 accept 的結果
+    同時完成多個時以列表中較前面的為準；超過 timeout 秒或全部失敗時回傳 None
+    """
+    result, _ = await fan_out(attempts, timeout, accept)
+    return result
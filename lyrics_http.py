@@ -0,0 +1,196 @@
+"""
+歌詞的 HTTP 回應 (/lyrics/{video_id})
+- 處理完成的歌詞預先壓縮為 gzip / brotli 保存，請求時依 Accept-Encoding 直接回傳，不必即時壓縮
+- 以內容雜湊作為版本與強 ETag，支援 If-None-Match 回應 304
+- 帶有版本參數的網址 (?v=版本) 內容不會改變，瀏覽器與 CDN 可長期快取
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import Response
+
+import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+VIDEO_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{11}')
+
+# 預先壓縮的內容編碼與副檔名（依偏好順序）
+ENCODINGS: Dict[str, str] = {'br': '.br', 'gzip': '.gz'} if brotli is not None else {'gzip': '.gz'}
+
+# 帶版本參數的網址內容固定，可快取一年
+VERSIONED_MAX_AGE = 365 * 86400
+
+_CURRENT = 'current'
+
+
+@dataclass(frozen=True)
+class PublishedLyrics:
+    video_id: str
+    version: str
+
+    @property
+    def url(self) -> str:
+        return f'/lyrics/{self.video_id}?v={self.version}'
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        """每種內容編碼各自的強 ETag"""
+        return f'"{self.version}-{encoding}"' if encoding else f'"{self.version}"'
+
+    def message(self) -> Dict[str, Any]:
+        """get_json 訊息的回應內容"""
+        return {"video_id": self.video_id, "url": self.url, "etag": self.etag()}
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """依 Accept-Encoding 選擇預先壓縮的編碼，都不接受時回傳 None（不壓縮）"""
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        name, _, value = params.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _etag_matches(header_value: str, etag: str) -> bool:
+    """If-None-Match 使用弱比較"""
+    if header_value.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header_value.split(','))
+
+
+def _write_file(path: str, data: bytes):
+    """先寫入暫存檔再取代，避免讀到寫到一半的檔案"""
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class LyricsResponseStore:
+    """
+    每首歌一個目錄，保存目前版本的原始與壓縮內容，current 檔記錄目前的版本
+    批次處理等其他程序發佈的新版本，會依 current 檔的修改時間重新讀取
+    """
+
+    def __init__(self, cache_dir: str = os.path.join(config.CACHE_DIR, 'lyrics_http')):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # video_id -> ((current 檔的 inode, 修改時間), 目前版本)
+        self._current: Dict[str, Tuple[Tuple[int, int], PublishedLyrics]] = {}
+
+    def _path(self, video_id: str, name: str) -> str:
+        return os.path.join(self.cache_dir, video_id, name)
+
+    def _body_path(self, published: PublishedLyrics, encoding: Optional[str] = None) -> str:
+        suffix = ENCODINGS[encoding] if encoding else ''
+        return self._path(published.video_id, f'{published.version}.json{suffix}')
+
+    def current(self, video_id: str) -> Optional[PublishedLyrics]:
+        """目前發佈的版本，尚未發佈時回傳 None"""
+        if not VIDEO_ID_PATTERN.fullmatch(video_id):
+            return None
+        pointer = self._path(video_id, _CURRENT)
+        try:
+            stat_result = os.stat(pointer)
+            signature = (stat_result.st_ino, stat_result.st_mtime_ns)
+            cached = self._current.get(video_id)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            with open(pointer, 'r', encoding='utf-8') as f:
+                published = PublishedLyrics(video_id, f.read().strip())
+        except OSError:
+            return None
+        self._current[video_id] = (signature, published)
+        return published
+
+    def publish(self, video_id: str, lyrics_json: Dict[str, Any]) -> PublishedLyrics:
+        """發佈處理完成的歌詞：內容未變更時沿用目前版本，否則寫入新版本並移除舊版本"""
+        body = json.dumps(lyrics_json, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        published = PublishedLyrics(video_id, hashlib.sha256(body).hexdigest()[:20])
+        with self._lock:
+            if self.current(video_id) == published:
+                return published
+            os.makedirs(self._path(video_id, ''), exist_ok=True)
+            _write_file(self._body_path(published), body)
+            _write_file(self._body_path(published, 'gzip'), gzip.compress(body, 9, mtime=0))
+            if brotli is not None:
+                _write_file(self._body_path(published, 'br'),
+                            brotli.compress(body, mode=brotli.MODE_TEXT, quality=11))
+            # 所有內容寫入後才切換版本
+            _write_file(self._path(video_id, _CURRENT), published.version.encode('utf-8'))
+            for name in os.listdir(self._path(video_id, '')):
+                if name != _CURRENT and not name.startswith(published.version):
+                    try:
+                        os.remove(self._path(video_id, name))
+                    except OSError:
+                        pass
+        return published
+
+    def load(self, published: PublishedLyrics) -> Optional[Dict[str, Any]]:
+        """讀取已發佈的歌詞內容，該版本已被取代時回傳 None"""
+        try:
+            with open(self._body_path(published), 'rb') as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def _read_body(self, published: PublishedLyrics, encoding: Optional[str]) -> Optional[bytes]:
+        """讀取已發佈的內容，該版本已被取代時回傳 None"""
+        try:
+            with open(self._body_path(published, encoding), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def response(self, request: Request, video_id: str) -> Optional[Response]:
+        """依請求標頭回傳 200 / 304 的歌詞回應，尚未發佈時回傳 None（檔案讀取在執行緒中執行）"""
+        encoding = choose_encoding(request.headers.get('accept-encoding', ''))
+        # 讀取途中發佈了新版本（舊檔已移除）時，改用新版本再試一次
+        for _ in range(2):
+            published = await anyio.to_thread.run_sync(self.current, video_id)
+            if published is None:
+                return None
+            versioned = request.query_params.get('v') == published.version
+            headers = {
+                'ETag': published.etag(encoding),
+                'Vary': 'Accept-Encoding',
+                # 未帶版本的網址每次以 ETag 確認是否更新
+                'Cache-Control': f'public, max-age={VERSIONED_MAX_AGE}, immutable' if versioned
+                else 'public, no-cache',
+            }
+            if_none_match = request.headers.get('if-none-match')
+            if if_none_match is not None and _etag_matches(if_none_match, headers['ETag']):
+                return Response(status_code=304, headers=headers)
+            body = await anyio.to_thread.run_sync(self._read_body, published, encoding)
+            if body is None:
+                self._current.pop(video_id, None)
+                continue
+            if encoding:
+                headers['Content-Encoding'] = encoding
+            return Response(content=body, media_type='application/json', headers=headers)
+        return None
+
+
+lyrics_responses = LyricsResponseStore()
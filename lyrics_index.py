@@ -0,0 +1,190 @@
+"""
+已下載歌詞的模糊索引：以三字元組 (trigram) 比對正規化後的歌名與歌手
+同一首歌的不同上傳（標題帶有 Official MV、歌詞付き、歌手順序不同等）可直接沿用已有的歌詞，
+不必再爬取或轉錄
+"""
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional, Set
+
+import config
+from downloader import read_info
+from lyrics_cache import normalize_text
+from lyrics_store import COLUMNAR_SUFFIX, JSON_SUFFIX, LYRICS_DIR, lyrics_file, open_document
+from simple_scrawl import extract_artist_from_title
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """正規化文字的三字元組，每個詞前後補空白，短詞也能比對"""
+    grams: Set[str] = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Dice 係數"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+@dataclass
+class IndexEntry:
+    video_id: str
+    title: str
+    artist: str
+    mtime_ns: int
+    grams: Dict[str, FrozenSet[str]] = field(default_factory=dict)
+
+
+@dataclass
+class IndexMatch:
+    video_id: str
+    score: float
+    entry: IndexEntry
+
+
+class LyricsIndex:
+    """
+    ./downloads/lyrics 的記憶體索引
+    第一次查詢時掃描目錄，之後依檔案修改時間只重新讀取變更的歌詞
+    """
+
+    def __init__(self, lyrics_dir: str = LYRICS_DIR, min_score: float = config.LYRICS_INDEX_MIN_SCORE):
+        self.lyrics_dir = lyrics_dir
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._entries: Dict[str, IndexEntry] = {}
+        # 歌名的三字元組 -> video_id
+        self._postings: Dict[str, Set[str]] = {}
+        self._scanned_mtime_ns: Optional[int] = None
+
+    def _load_entry(self, video_id: str, path: str, mtime_ns: int) -> Optional[IndexEntry]:
+        try:
+            document = open_document(path)
+        except (OSError, ValueError) as e:
+            print(f"讀取歌詞索引錯誤 ({video_id}): {e}")
+            return None
+        info = read_info(video_id) or {}
+        # 爬取的歌詞帶有網站上的歌名；whisper 轉錄的歌詞只能使用影片資訊
+        if document.get("title"):
+            title, artist = document.get("title"), document.get("artist") or info.get("artist") or ""
+        else:
+            artist, title = extract_artist_from_title(info.get("title", ""))
+            artist = info.get("artist") or artist
+        entry = IndexEntry(video_id, title, artist or "", mtime_ns)
+        # 只有歌名建立反向索引，歌手的三字元組只用於計算分數
+        entry.grams = {
+            'title': trigrams(normalize_text(title)),
+            'artist': trigrams(normalize_text(entry.artist)),
+        }
+        return entry
+
+    def _remove_locked(self, video_id: str):
+        entry = self._entries.pop(video_id, None)
+        if entry is None:
+            return
+        for gram in entry.grams['title']:
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(video_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def _add_locked(self, entry: IndexEntry):
+        self._remove_locked(entry.video_id)
+        self._entries[entry.video_id] = entry
+        for gram in entry.grams['title']:
+            self._postings.setdefault(gram, set()).add(entry.video_id)
+
+    def update(self, video_id: str):
+        """重新索引單一歌曲（寫入歌詞檔後呼叫）"""
+        path = lyrics_file(video_id, self.lyrics_dir)
+        if path is None:
+            with self._lock:
+                self._remove_locked(video_id)
+            return
+        entry = self._load_entry(video_id, path, os.stat(path).st_mtime_ns)
+        if entry is not None:
+            with self._lock:
+                self._add_locked(entry)
+
+    def refresh(self):
+        """目錄有變更時同步索引：新增或修改的檔案重新讀取，刪除的檔案移出索引"""
+        if not os.path.isdir(self.lyrics_dir):
+            return
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        dir_mtime_ns = os.stat(self.lyrics_dir).st_mtime_ns
+        if dir_mtime_ns == self._scanned_mtime_ns:
+            return
+        # 同一首歌同時有兩種格式時（轉換中）使用欄式格式
+        files: Dict[str, os.DirEntry] = {}
+        with os.scandir(self.lyrics_dir) as it:
+            for item in it:
+                for suffix in (COLUMNAR_SUFFIX, JSON_SUFFIX):
+                    if item.name.endswith(suffix) and item.is_file():
+                        video_id = item.name[:-len(suffix)]
+                        if suffix == COLUMNAR_SUFFIX or video_id not in files:
+                            files[video_id] = item
+        for video_id, item in files.items():
+            mtime_ns = item.stat().st_mtime_ns
+            current = self._entries.get(video_id)
+            if current is not None and current.mtime_ns == mtime_ns:
+                continue
+            entry = self._load_entry(video_id, item.path, mtime_ns)
+            if entry is not None:
+                with self._lock:
+                    self._add_locked(entry)
+        with self._lock:
+            for video_id in set(self._entries) - set(files):
+                self._remove_locked(video_id)
+        self._scanned_mtime_ns = dir_mtime_ns
+
+    def _candidates(self, grams: FrozenSet[str]) -> Set[str]:
+        """歌名至少有一個相同三字元組的歌曲"""
+        candidates: Set[str] = set()
+        for gram in grams:
+            candidates.update(self._postings.get(gram, ()))
+        return candidates
+
+    def lookup(self, video_title: str, exclude: Optional[str] = None) -> Optional[IndexMatch]:
+        """
+        以影片標題找出可能是同一首歌的已下載歌詞
+        不依賴歌手與歌名的順序，分數為兩邊的 Dice 係數（只看單邊的覆蓋率時，
+        同歌手的短歌名會被較長的歌名包含，例如「Us」與「The Story of Us」）
+        - 歌手也出現在標題中時，去除歌手後的標題與歌名的相似度需達到 min_score
+        - 無法確認歌手時較保守，標題與歌名整體的相似度需達到 min_score
+        """
+        query = trigrams(normalize_text(video_title))
+        if not query:
+            return None
+
+        best: Optional[IndexMatch] = None
+        with self._lock:
+            for video_id in self._candidates(query):
+                if video_id == exclude:
+                    continue
+                entry = self._entries[video_id]
+                title_grams, artist_grams = entry.grams['title'], entry.grams['artist']
+                score = similarity(query, title_grams)
+                if artist_grams and len(artist_grams & query) / len(artist_grams) >= self.min_score:
+                    rest, title_rest = query - artist_grams, title_grams - artist_grams
+                    if rest and title_rest:
+                        score = similarity(rest, title_rest)
+                if score >= self.min_score and (best is None or score > best.score):
+                    best = IndexMatch(video_id, score, entry)
+        return best
+
+    def find(self, video_title: str, exclude: Optional[str] = None) -> Optional[IndexMatch]:
+        """同步目錄後查詢"""
+        self.refresh()
+        return self.lookup(video_title, exclude)
+
+
+lyrics_index = LyricsIndex()
@@ -0,0 +1,34 @@
+"""
+整合所有歌詞爬蟲：simple_scrawl 與 scrawl 的網站同時查詢，返回最先成功的結果
+搜尋結果保存在歌詞搜尋快取，相同歌曲不再重複爬取
+所有網站都回應沒有歌詞時才保存「查無歌詞」，逾時或網站無法連線時不保存
+"""
+import asyncio
+from typing import Any, Dict, Optional
+
+import scrawl
+import simple_scrawl
+from http_client import HttpClient
+from lyrics_cache import lyrics_search_cache
+from lyrics_fanout import fan_out
+
+
+async def search_lyrics(video_title: str, client: Optional[HttpClient] = None,
+                        use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """以影片標題搜尋歌詞，所有網站與查詢組合同時進行，共用同一個連線池"""
+    artist, song_name = simple_scrawl.extract_artist_from_title(video_title)
+    if use_cache:
+        hit, cached = await asyncio.to_thread(lyrics_search_cache.get, artist, song_name)
+        if hit:
+            if cached is None:
+                print(f"歌詞搜尋快取：查無歌詞 ({video_title})")
+            return cached
+
+    attempts = simple_scrawl.lyrics_attempts(video_title, client) + scrawl.lyrics_attempts(video_title, client)
+    result, answered = await fan_out(attempts)
+    if result is not None or answered:
+        await asyncio.to_thread(lyrics_search_cache.put, artist, song_name, result)
+    else:
+        # 逾時或有網站無法連線，不能確定查無歌詞，下次仍重新搜尋
+        print(f"歌詞搜尋未完成，不保存查無歌詞 ({video_title})")
+    return result
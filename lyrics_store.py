@@ -0,0 +1,578 @@
+"""
+歌詞／對齊結果的精簡欄式儲存格式 (.lyr)
+- 物件列表（segments、lines、words）改以欄位保存：時間戳與機率為 float32 陣列、文字為 UTF-8 連續區塊
+  巢狀的 words 以子表格保存，tokens 等整數列表攤平成整數陣列
+- 讀取時只解析檔頭，欄位在用到時才解碼；需要時再轉回原本的 JSON 格式
+- 原有的 .json 歌詞仍可讀取，可用 migrate 指令轉換
+
+檔案結構：MAGIC | 版本 | 檔頭長度 | 檔頭 JSON（欄位描述）| 資料區（各欄位以 8 位元組對齊）
+
+使用方式:
+    python lyrics_store.py migrate                        # 轉換 ./downloads/lyrics
+    python lyrics_store.py migrate ./downloads/cache/align --keep-json
+"""
+import argparse
+import json
+import math
+import os
+import struct
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import config
+
+MAGIC = b'LYRC'
+VERSION = 1
+_PREFIX = struct.Struct('<4sBxxxI')
+_ALIGN = 8
+
+COLUMNAR_SUFFIX = '.lyr'
+JSON_SUFFIX = '.json'
+LYRICS_DIR = './downloads/lyrics'
+
+# 較短的頂層欄位（標題、語言等）直接放在檔頭
+_INLINE_LIMIT = 256
+
+# 遮罩：欄位不存在／有值／值為 None
+_ABSENT, _PRESENT, _NONE = 0, 1, 2
+
+
+class _Missing:
+    """記錄中沒有此欄位"""
+
+
+_MISSING = _Missing()
+
+Ref = List[int]
+
+
+def _json_bytes(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _int_dtype(values: Iterable[int]) -> Optional[str]:
+    """整數需要的型別，超出 int64 時回傳 None"""
+    low, high = 0, 0
+    for value in values:
+        low, high = min(low, value), max(high, value)
+    if -2 ** 31 <= low and high < 2 ** 31:
+        return '<i4'
+    if -2 ** 63 <= low and high < 2 ** 63:
+        return '<i8'
+    return None
+
+
+def _column_type(values: List[Any]) -> str:
+    """依欄位的值決定保存方式"""
+    if not values:
+        return 'json'
+    if all(isinstance(v, bool) for v in values):
+        return 'bool'
+    if all(_is_int(v) for v in values):
+        return 'int' if _int_dtype(values) else 'json'
+    if all(_is_int(v) or isinstance(v, float) for v in values):
+        return 'f32' if all(math.isfinite(v) for v in values) else 'json'
+    if all(isinstance(v, str) for v in values):
+        return 'str'
+    if all(isinstance(v, list) for v in values):
+        if all(isinstance(x, dict) for v in values for x in v):
+            return 'table'
+        if all(_is_int(x) for v in values for x in v) and _int_dtype(x for v in values for x in v):
+            return 'ilist'
+    return 'json'
+
+
+def _decimals(values: List[float], array: np.ndarray) -> Optional[int]:
+    """
+    值的小數位數（例如 stable-ts 的時間戳為 3 位）
+    解碼時以四捨五入還原，比逐一轉字串快；float32 無法準確還原時回傳 None
+    """
+    for decimals in range(7):
+        if np.array_equal(np.round(array.astype(np.float64), decimals), values):
+            return decimals
+    return None
+
+
+class _Writer:
+    """資料區：每個區塊以 8 位元組對齊，回傳 [位移, 長度]"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def add(self, data: bytes) -> Ref:
+        pad = -self.size % _ALIGN
+        if pad:
+            self.chunks.append(b'\0' * pad)
+            self.size += pad
+        ref = [self.size, len(data)]
+        self.chunks.append(data)
+        self.size += len(data)
+        return ref
+
+    def add_array(self, array: np.ndarray) -> Ref:
+        return self.add(np.ascontiguousarray(array).tobytes())
+
+    def add_offsets(self, lengths: List[int]) -> Ref:
+        offsets = np.zeros(len(lengths) + 1, dtype='<u8')
+        np.cumsum(lengths, out=offsets[1:])
+        return self.add_array(offsets)
+
+    def add_blobs(self, blobs: List[bytes]) -> Tuple[Ref, Ref]:
+        return self.add(b''.join(blobs)), self.add_offsets([len(b) for b in blobs])
+
+
+def _encode_table(records: List[Dict[str, Any]], writer: _Writer) -> Dict[str, Any]:
+    keys: Dict[str, None] = {}
+    for record in records:
+        keys.update(dict.fromkeys(record))
+
+    columns = []
+    for key in keys:
+        raw = [record.get(key, _MISSING) for record in records]
+        codes = [_ABSENT if v is _MISSING else _NONE if v is None else _PRESENT for v in raw]
+        values = [v for v, code in zip(raw, codes) if code == _PRESENT]
+        kind = _column_type(values)
+        column: Dict[str, Any] = {"name": key, "type": kind}
+        if any(code != _PRESENT for code in codes):
+            column["mask"] = writer.add_array(np.asarray(codes, dtype=np.uint8))
+
+        if kind == 'f32':
+            array = np.asarray(values, dtype='<f4')
+            column["data"] = writer.add_array(array)
+            decimals = _decimals(values, array)
+            if decimals is not None:
+                column["decimals"] = decimals
+        elif kind == 'int':
+            column["dtype"] = _int_dtype(values)
+            column["data"] = writer.add_array(np.asarray(values, dtype=column["dtype"]))
+        elif kind == 'bool':
+            column["data"] = writer.add_array(np.asarray(values, dtype=np.uint8))
+        elif kind == 'str':
+            column["data"], column["offsets"] = writer.add_blobs([v.encode('utf-8') for v in values])
+        elif kind == 'ilist':
+            flat = [x for v in values for x in v]
+            column["dtype"] = _int_dtype(flat)
+            column["data"] = writer.add_array(np.asarray(flat, dtype=column["dtype"]))
+            column["offsets"] = writer.add_offsets([len(v) for v in values])
+        elif kind == 'table':
+            column["table"] = _encode_table([x for v in values for x in v], writer)
+            column["offsets"] = writer.add_offsets([len(v) for v in values])
+        else:
+            column["data"], column["offsets"] = writer.add_blobs([_json_bytes(v) for v in values])
+        columns.append(column)
+    return {"count": len(records), "columns": columns}
+
+
+def encode(document: Dict[str, Any]) -> bytes:
+    """將歌詞 JSON 轉為欄式格式"""
+    writer = _Writer()
+    fields = []
+    for key, value in document.items():
+        if isinstance(value, list) and value and all(isinstance(x, dict) for x in value):
+            fields.append({"name": key, "table": _encode_table(value, writer)})
+            continue
+        raw = _json_bytes(value)
+        if len(raw) <= _INLINE_LIMIT:
+            fields.append({"name": key, "value": value})
+        else:
+            fields.append({"name": key, "json": writer.add(raw)})
+
+    header = _json_bytes({"fields": fields})
+    prefix = _PREFIX.pack(MAGIC, VERSION, len(header))
+    pad = -(len(prefix) + len(header)) % _ALIGN
+    return b''.join([prefix, header, b'\0' * pad, *writer.chunks])
+
+
+class _Column:
+    """單一欄位，第一次存取時才解碼"""
+
+    def __init__(self, desc: Dict[str, Any], data: memoryview):
+        self.desc = desc
+        self.name: str = desc["name"]
+        self.kind: str = desc["type"]
+        self._data = data
+        self._index: Optional[np.ndarray] = None
+        self._values: Optional[List[Any]] = None
+        self._array: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._child: Optional["RecordTable"] = None
+
+    def _slice(self, ref: Ref) -> memoryview:
+        return self._data[ref[0]:ref[0] + ref[1]]
+
+    def _raw_array(self) -> np.ndarray:
+        if self._array is None:
+            dtype = {'f32': '<f4', 'bool': np.uint8}.get(self.kind) or self.desc.get("dtype")
+            self._array = np.frombuffer(self._slice(self.desc["data"]), dtype=dtype)
+        return self._array
+
+    def _raw_offsets(self) -> np.ndarray:
+        if self._offsets is None:
+            self._offsets = np.frombuffer(self._slice(self.desc["offsets"]), dtype='<u8')
+        return self._offsets
+
+    def child(self) -> "RecordTable":
+        if self._child is None:
+            self._child = RecordTable(self.desc["table"], self._data)
+        return self._child
+
+    def codes(self, count: int) -> np.ndarray:
+        if "mask" not in self.desc:
+            return np.full(count, _PRESENT, dtype=np.uint8)
+        return np.frombuffer(self._slice(self.desc["mask"]), dtype=np.uint8)
+
+    def has_absent(self, count: int) -> bool:
+        return "mask" in self.desc and bool((self.codes(count) == _ABSENT).any())
+
+    def value_index(self, count: int) -> np.ndarray:
+        """記錄序號 -> 值的序號（沒有值時為 -1）"""
+        if self._index is None:
+            present = self.codes(count) == _PRESENT
+            index = np.cumsum(present, dtype=np.int64) - 1
+            index[~present] = -1
+            self._index = index
+        return self._index
+
+    def _decode(self, position: int) -> Any:
+        """解碼第 position 個值"""
+        if self.kind == 'f32':
+            value = self._raw_array()[position]
+            decimals = self.desc.get("decimals")
+            return round(float(value), decimals) if decimals is not None else float(str(value))
+        if self.kind == 'int':
+            return int(self._raw_array()[position])
+        if self.kind == 'bool':
+            return bool(self._raw_array()[position])
+        offsets = self._raw_offsets()
+        start, end = int(offsets[position]), int(offsets[position + 1])
+        if self.kind == 'ilist':
+            return self._raw_array()[start:end].tolist()
+        if self.kind == 'table':
+            return self.child().records(start, end)
+        blob = bytes(self._slice(self.desc["data"])[start:end])
+        return blob.decode('utf-8') if self.kind == 'str' else json.loads(blob)
+
+    def values(self) -> List[Any]:
+        """一次解碼所有值（比逐筆解碼快）"""
+        if self._values is not None:
+            return self._values
+        if self.kind == 'f32':
+            decimals = self.desc.get("decimals")
+            if decimals is not None:
+                values = np.round(self._raw_array().astype(np.float64), decimals).tolist()
+            else:
+                values = [float(s) for s in self._raw_array().astype(str)]
+        elif self.kind in ('int', 'bool'):
+            values = self._raw_array().tolist()
+            if self.kind == 'bool':
+                values = [bool(v) for v in values]
+        elif self.kind == 'ilist':
+            flat = self._raw_array().tolist()
+            offsets = self._raw_offsets().tolist()
+            values = [flat[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        elif self.kind == 'table':
+            children = self.child().records()
+            offsets = self._raw_offsets().tolist()
+            values = [children[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        else:
+            blob = bytes(self._slice(self.desc["data"]))
+            offsets = self._raw_offsets().tolist()
+            texts = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+            values = texts if self.kind == 'str' else [json.loads(t) for t in texts]
+        self._values = values
+        return values
+
+    def get(self, i: int, count: int) -> Any:
+        codes = self.codes(count)
+        if codes[i] == _ABSENT:
+            return _MISSING
+        if codes[i] == _NONE:
+            return None
+        position = int(self.value_index(count)[i])
+        if self._values is not None:
+            return self._values[position]
+        return self._decode(position)
+
+    def all(self, count: int) -> List[Any]:
+        values = self.values()
+        if "mask" not in self.desc:
+            return values
+        result: List[Any] = []
+        it = iter(values)
+        for code in self.codes(count).tolist():
+            result.append(next(it) if code == _PRESENT else None if code == _NONE else _MISSING)
+        return result
+
+
+class RecordTable:
+    """物件列表的欄式表格"""
+
+    def __init__(self, desc: Dict[str, Any], data: memoryview):
+        self.count: int = desc["count"]
+        self._columns = {column["name"]: _Column(column, data) for column in desc["columns"]}
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self._columns)
+
+    def value(self, name: str, i: int, default: Any = None) -> Any:
+        """第 i 筆記錄的單一欄位"""
+        column = self._columns.get(name)
+        if column is None:
+            return default
+        value = column.get(i, self.count)
+        return default if value is _MISSING else value
+
+    def record(self, i: int) -> Dict[str, Any]:
+        record = {}
+        for name, column in self._columns.items():
+            value = column.get(i, self.count)
+            if value is not _MISSING:
+                record[name] = value
+        return record
+
+    def records(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        stop = self.count if stop is None else min(stop, self.count)
+        if stop - start < 8:
+            return [self.record(i) for i in range(start, stop)]
+        columns = [(name, column.all(self.count)) for name, column in self._columns.items()]
+        if not any(column.has_absent(self.count) for column in self._columns.values()):
+            names = [name for name, _ in columns]
+            rows = zip(*(values[start:stop] for _, values in columns))
+            return [dict(zip(names, row)) for row in rows]
+        result = []
+        for i in range(start, stop):
+            record = {}
+            for name, values in columns:
+                value = values[i]
+                if value is not _MISSING:
+                    record[name] = value
+            result.append(record)
+        return result
+
+    def column(self, name: str) -> List[Any]:
+        """單一欄位的所有值（沒有此欄位的記錄為 None）"""
+        column = self._columns.get(name)
+        if column is None:
+            return [None] * self.count
+        return [None if value is _MISSING else value for value in column.all(self.count)]
+
+    def numbers(self, name: str) -> np.ndarray:
+        """數值欄位轉為 float64 陣列（無值為 NaN），可直接用於搜尋與計算"""
+        result = np.full(self.count, np.nan)
+        column = self._columns.get(name)
+        if column is None or column.kind not in ('f32', 'int', 'bool'):
+            return result
+        index = column.value_index(self.count)
+        present = index >= 0
+        result[present] = column._raw_array()[index[present]]
+        return result
+
+    def child(self, name: str) -> Optional[Tuple["RecordTable", np.ndarray]]:
+        """
+        巢狀表格欄位（例如 words），回傳 (子表格, 位移)
+        第 i 筆記錄的子記錄為子表格中 [位移[i], 位移[i+1]) 的範圍
+        """
+        column = self._columns.get(name)
+        if column is None or column.kind != 'table':
+            return None
+        # 子記錄依序連續保存，沒有值的記錄視為沒有子記錄
+        index = column.value_index(self.count)
+        lengths = np.zeros(self.count, dtype=np.int64)
+        present = index >= 0
+        lengths[present] = np.diff(column._raw_offsets().astype(np.int64))
+        offsets = np.zeros(self.count + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return column.child(), offsets
+
+
+class LyricsDocument:
+    """
+    欄式歌詞文件：建立時只解析檔頭，欄位在存取時才解碼
+    """
+
+    def __init__(self, buffer: bytes):
+        magic, version, header_length = _PREFIX.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("不是支援的歌詞格式")
+        header_end = _PREFIX.size + header_length
+        header = json.loads(bytes(buffer[_PREFIX.size:header_end]))
+        self._data = memoryview(buffer)[header_end + (-header_end % _ALIGN):]
+        self._fields: Dict[str, Dict[str, Any]] = {field["name"]: field for field in header["fields"]}
+        self._tables: Dict[str, RecordTable] = {}
+
+    @classmethod
+    def open(cls, path: str) -> "LyricsDocument":
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    @classmethod
+    def from_json(cls, document: Dict[str, Any]) -> "LyricsDocument":
+        return cls(encode(document))
+
+    def keys(self) -> List[str]:
+        return list(self._fields)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._fields
+
+    def table(self, key: str) -> Optional[RecordTable]:
+        """物件列表欄位（segments、lines）的表格"""
+        field = self._fields.get(key)
+        if field is None or "table" not in field:
+            return None
+        if key not in self._tables:
+            self._tables[key] = RecordTable(field["table"], self._data)
+        return self._tables[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """取得頂層欄位，物件列表會完整轉回 JSON 格式"""
+        field = self._fields.get(key)
+        if field is None:
+            return default
+        if "value" in field:
+            return field["value"]
+        if "json" in field:
+            offset, length = field["json"]
+            return json.loads(bytes(self._data[offset:offset + length]))
+        table = self.table(key)
+        return table.records() if table is not None else default
+
+    def to_json(self) -> Dict[str, Any]:
+        return {key: self.get(key) for key in self._fields}
+
+
+def decode(buffer: bytes) -> Dict[str, Any]:
+    return LyricsDocument(buffer).to_json()
+
+
+def is_columnar(path: str) -> bool:
+    return path.endswith(COLUMNAR_SUFFIX)
+
+
+def write_document(path: str, document: Dict[str, Any]):
+    """依副檔名寫入欄式或 JSON 格式（先寫入暫存檔再取代）"""
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    if is_columnar(path):
+        with open(temp_path, 'wb') as f:
+            f.write(encode(document))
+    else:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def read_document(path: str) -> Dict[str, Any]:
+    if is_columnar(path):
+        return LyricsDocument.open(path).to_json()
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def open_document(path: str) -> LyricsDocument:
+    if is_columnar(path):
+        return LyricsDocument.open(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return LyricsDocument.from_json(json.load(f))
+
+
+def lyrics_file(video_id: str, lyrics_dir: str = LYRICS_DIR) -> Optional[str]:
+    """已保存的歌詞檔路徑（優先使用欄式格式），沒有時回傳 None"""
+    for suffix in (COLUMNAR_SUFFIX, JSON_SUFFIX):
+        path = os.path.join(lyrics_dir, video_id + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def lyrics_exists(video_id: str) -> bool:
+    return lyrics_file(video_id) is not None
+
+
+def load_lyrics(video_id: str) -> Optional[Dict[str, Any]]:
+    """讀取完整的歌詞 JSON"""
+    path = lyrics_file(video_id)
+    return read_document(path) if path else None
+
+
+def save_lyrics(video_id: str, document: Dict[str, Any]):
+    """以設定的格式保存歌詞，並移除另一種格式的舊檔"""
+    os.makedirs(LYRICS_DIR, exist_ok=True)
+    columnar = config.LYRICS_STORAGE_FORMAT == 'columnar'
+    suffix, stale_suffix = (COLUMNAR_SUFFIX, JSON_SUFFIX) if columnar else (JSON_SUFFIX, COLUMNAR_SUFFIX)
+    write_document(os.path.join(LYRICS_DIR, video_id + suffix), document)
+    stale = os.path.join(LYRICS_DIR, video_id + stale_suffix)
+    if os.path.exists(stale):
+        os.remove(stale)
+
+
+def equivalent(a: Any, b: Any) -> bool:
+    """比較兩份 JSON，浮點數容許 float32 的誤差"""
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(equivalent(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(equivalent(x, y) for x, y in zip(a, b))
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) \
+            and not isinstance(a, bool) and not isinstance(b, bool):
+        return math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-6)
+    return a == b
+
+
+def migrate(directory: str, keep_json: bool = False,
+            log: Callable[[str], None] = print) -> Tuple[int, int, int]:
+    """
+    將目錄中的 .json 轉為 .lyr，轉換後確認內容一致才移除原檔
+    回傳 (轉換數量, 原始大小, 轉換後大小)
+    """
+    converted, before, after = 0, 0, 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(JSON_SUFFIX):
+            continue
+        json_path = os.path.join(directory, name)
+        target = json_path[:-len(JSON_SUFFIX)] + COLUMNAR_SUFFIX
+        try:
+            document = read_document(json_path)
+            if not isinstance(document, dict):
+                continue
+            write_document(target, document)
+            if not equivalent(document, read_document(target)):
+                os.remove(target)
+                log(f"轉換後內容不一致，保留原檔: {name}")
+                continue
+        except (OSError, ValueError) as e:
+            log(f"轉換錯誤 ({name}): {e}")
+            continue
+        converted += 1
+        before += os.path.getsize(json_path)
+        after += os.path.getsize(target)
+        if not keep_json:
+            os.remove(json_path)
+    return converted, before, after
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="歌詞欄式儲存格式工具")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="將 .json 歌詞轉為 .lyr")
+    migrate_parser.add_argument('directories', nargs='*', default=[LYRICS_DIR])
+    migrate_parser.add_argument('--keep-json', action='store_true', help="保留原本的 .json 檔")
+    args = parser.parse_args(argv)
+
+    for directory in args.directories:
+        converted, before, after = migrate(directory, args.keep_json)
+        ratio = f"，大小 {before / 1024:.0f} KB -> {after / 1024:.0f} KB" if before else ""
+        print(f"{directory}: 轉換 {converted} 個檔案{ratio}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+歌詞時間軸索引：查詢時間點 t 正在唱的段落與單字
+- 段落與單字各自依開始時間排序，並保存前綴最大結束時間
+- 以 bisect 找出開始時間 <= t 的最後一個區間，再往前找仍未結束的區間（支援重疊的段落）
+- 索引可隨歌詞一起送出 (to_index)，前端以相同的二分搜尋查詢，不必每次掃描所有字幕
+"""
+import math
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from lyrics_http import lyrics_responses
+from metrics import record_cache
+
+# 快取的時間軸數量
+TIMELINE_CACHE_ENTRIES = 128
+
+
+def _valid(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value)
+
+
+class Intervals:
+    """依開始時間排序的區間，可重疊"""
+
+    def __init__(self, starts: Sequence[Any], ends: Sequence[Any]):
+        # 缺少時間戳的區間不列入索引
+        valid = [i for i in range(len(starts)) if _valid(starts[i]) and _valid(ends[i])]
+        self.order: List[int] = sorted(valid, key=lambda i: (starts[i], ends[i]))
+        self.starts: List[float] = [starts[i] for i in self.order]
+        self.ends: List[float] = [ends[i] for i in self.order]
+        # 前綴最大結束時間：往前找到小於 t 時，更早的區間都已結束
+        self.max_ends: List[float] = list(accumulate(self.ends, max))
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def covering(self, t: float) -> List[int]:
+        """包含 t 的所有區間（原始序號，依開始時間排序）"""
+        result = []
+        i = bisect_right(self.starts, t) - 1
+        while i >= 0 and self.max_ends[i] >= t:
+            if self.ends[i] >= t:
+                result.append(self.order[i])
+            i -= 1
+        result.reverse()
+        return result
+
+    def latest(self, t: float) -> Optional[int]:
+        """包含 t 的區間中最晚開始的一個"""
+        i = bisect_right(self.starts, t) - 1
+        while i >= 0 and self.max_ends[i] >= t:
+            if self.ends[i] >= t:
+                return self.order[i]
+            i -= 1
+        return None
+
+    def next_after(self, t: float) -> Optional[int]:
+        """t 之後第一個開始的區間"""
+        i = bisect_right(self.starts, t)
+        return self.order[i] if i < len(self.order) else None
+
+    def to_index(self) -> Dict[str, List[Any]]:
+        # 取到毫秒：開始時間無條件捨去、結束時間無條件進位，查詢時不會漏掉區間
+        return {
+            "order": self.order,
+            "starts": [math.floor(value * 1000) / 1000 for value in self.starts],
+            "max_ends": [math.ceil(value * 1000) / 1000 for value in self.max_ends],
+        }
+
+
+class LyricsTimeline:
+    """
+    段落與單字的時間軸
+    單字以攤平的序號保存，word_offsets[i]:word_offsets[i + 1] 為第 i 個段落的單字
+    """
+
+    def __init__(self, segment_starts: Sequence[Any], segment_ends: Sequence[Any], segment_texts: Sequence[Any],
+                 word_offsets: Sequence[int], word_starts: Sequence[Any], word_ends: Sequence[Any],
+                 word_texts: Sequence[Any]):
+        self.segment_starts = list(segment_starts)
+        self.segment_ends = list(segment_ends)
+        self.segment_texts = [text or '' for text in segment_texts]
+        self.word_offsets = list(word_offsets)
+        self.word_starts = list(word_starts)
+        self.word_ends = list(word_ends)
+        self.word_texts = [text or '' for text in word_texts]
+        self.segments = Intervals(self.segment_starts, self.segment_ends)
+        self.words = Intervals(self.word_starts, self.word_ends)
+
+    @classmethod
+    def from_json(cls, lyrics_json: Dict[str, Any]) -> "LyricsTimeline":
+        """由 whisper 格式的歌詞建立（爬取而未對齊的歌詞沒有時間戳，時間軸為空）"""
+        segments = lyrics_json.get('segments') or []
+        word_offsets = [0]
+        words: List[Dict[str, Any]] = []
+        for segment in segments:
+            words += segment.get('words') or []
+            word_offsets.append(len(words))
+        return cls(
+            [segment.get('start') for segment in segments],
+            [segment.get('end') for segment in segments],
+            [segment.get('text') for segment in segments],
+            word_offsets,
+            [word.get('start') for word in words],
+            [word.get('end') for word in words],
+            [word.get('word') for word in words],
+        )
+
+    def _segment_of_word(self, word: int) -> int:
+        return bisect_right(self.word_offsets, word) - 1
+
+    def segment_at(self, t: float) -> Optional[int]:
+        """t 時正在唱的段落（重疊時取最晚開始的段落）"""
+        return self.segments.latest(t)
+
+    def word_at(self, t: float, segment: Optional[int] = None) -> Optional[int]:
+        """t 時正在唱的單字（攤平的序號），有指定段落時優先使用該段落的單字"""
+        if segment is not None:
+            for word in reversed(self.words.covering(t)):
+                if self.word_offsets[segment] <= word < self.word_offsets[segment + 1]:
+                    return word
+        return self.words.latest(t)
+
+    def at(self, t: float) -> Dict[str, Any]:
+        """t 時的段落、單字與下一個段落"""
+        segment = self.segment_at(t)
+        word = self.word_at(t, segment)
+        next_segment = self.segments.next_after(t)
+        return {
+            "t": t,
+            "segments": self.segments.covering(t),
+            "segment": None if segment is None else {
+                "index": segment,
+                "start": self.segment_starts[segment],
+                "end": self.segment_ends[segment],
+                "text": self.segment_texts[segment],
+            },
+            "word": None if word is None else {
+                "segment": self._segment_of_word(word),
+                "index": word - self.word_offsets[self._segment_of_word(word)],
+                "start": self.word_starts[word],
+                "end": self.word_ends[word],
+                "word": self.word_texts[word],
+            },
+            "next": None if next_segment is None else {
+                "index": next_segment,
+                "start": self.segment_starts[next_segment],
+            },
+        }
+
+    def to_index(self) -> Dict[str, Any]:
+        """隨歌詞送出的預先計算索引"""
+        return {
+            "segments": self.segments.to_index(),
+            "words": self.words.to_index(),
+            "word_offsets": self.word_offsets,
+        }
+
+
+class TimelineCache:
+    """已發佈歌詞的時間軸，每個歌詞版本只建立一次"""
+
+    def __init__(self, max_entries: int = TIMELINE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # video_id -> (歌詞版本, 時間軸)
+        self._entries: "OrderedDict[str, Tuple[str, LyricsTimeline]]" = OrderedDict()
+
+    def get(self, video_id: str) -> Optional[LyricsTimeline]:
+        """取得目前發佈版本的時間軸，尚未發佈時回傳 None"""
+        published = lyrics_responses.current(video_id)
+        if published is None:
+            return None
+        with self._lock:
+            cached = self._entries.get(video_id)
+            if cached is not None and cached[0] == published.version:
+                self._entries.move_to_end(video_id)
+                record_cache('timeline', True)
+                return cached[1]
+        record_cache('timeline', False)
+        lyrics_json = lyrics_responses.load(published)
+        if lyrics_json is None:
+            return None
+        timeline = LyricsTimeline.from_json(lyrics_json)
+        with self._lock:
+            self._entries[video_id] = (published.version, timeline)
+            self._entries.move_to_end(video_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return timeline
+
+
+timeline_cache = TimelineCache()
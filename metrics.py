@@ -0,0 +1,199 @@
+"""
+執行指標與結構化記錄
+- 計數器、量表與直方圖，以 Prometheus 文字格式由 /metrics 輸出
+- log_event 以一行 JSON 輸出事件（工作的各階段耗時、請求結果等），方便收集與查詢
+"""
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import config
+
+LabelValues = Tuple[str, ...]
+
+# 秒數直方圖的預設區間：涵蓋毫秒級的快取查詢到數分鐘的轉錄
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# 即時率（處理秒數 / 音訊秒數）的區間
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} 需要標籤 {self.label_names}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _labels(self, key: LabelValues, extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.label_names, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.type}', *self.samples()]
+
+
+class Counter(_Metric):
+    """只增不減的計數"""
+    type = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{self._labels(key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(_Metric):
+    """目前的數值（例如佇列長度）"""
+    type = 'gauge'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{self._labels(key)} {_format_value(value)}' for key, value in items]
+
+
+class Histogram(_Metric):
+    """數值分布：各區間的累計數量、總和與次數"""
+    type = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # 標籤 -> (各區間數量, 總和, 次數)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """記錄區塊的執行秒數（包含拋出例外的情況）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = self._labels(key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{self._labels(key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{self._labels(key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Prometheus 文字格式"""
+        with self._lock:
+            metrics = list(self._metrics)
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+
+def log_event(event: str, **fields: Any):
+    """以一行 JSON 輸出事件"""
+    if not config.STRUCTURED_LOGS:
+        return
+    record = {"ts": round(time.time(), 3), "event": event, **fields}
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+
+# 流程各階段（下載、爬蟲、人聲分離、轉錄、對齊、發佈等）的耗時
+STAGE_SECONDS = Histogram('lyrics_stage_seconds', 'Seconds spent in each pipeline stage', ['stage'])
+# 執行緒池：排隊等待、執行時間與佇列長度
+JOB_QUEUE_SECONDS = Histogram('lyrics_job_queue_seconds', 'Seconds a job waited in the executor queue', ['executor'])
+JOB_RUN_SECONDS = Histogram('lyrics_job_run_seconds', 'Seconds a job ran in the executor',
+                            ['executor', 'job', 'status'])
+EXECUTOR_QUEUE_DEPTH = Gauge('lyrics_executor_queue_depth', 'Jobs waiting in the executor queue', ['executor'])
+EXECUTOR_RUNNING = Gauge('lyrics_executor_running', 'Jobs running in the executor', ['executor'])
+# 各快取的命中與未命中
+CACHE_REQUESTS = Counter('lyrics_cache_requests_total', 'Cache lookups by result', ['cache', 'result'])
+# 轉錄與對齊的即時率（處理秒數 / 音訊秒數）
+REALTIME_FACTOR = Histogram('lyrics_realtime_factor', 'Processing seconds per second of audio',
+                            ['model', 'stage'], buckets=RTF_BUCKETS)
+# 合併轉錄時每批的歌曲數
+TRANSCRIBE_BATCH_SONGS = Histogram('lyrics_transcribe_batch_songs', 'Songs transcribed together in one batch',
+                                   buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+# 各歌詞網站的搜尋耗時，result 為 hit / miss / error
+CRAWLER_SECONDS = Histogram('lyrics_crawler_seconds', 'Seconds per lyrics site search', ['site', 'result'])
+# websocket 訊息與請求
+WS_MESSAGES = Counter('lyrics_ws_messages_total', 'Websocket messages received', ['type'])
+REQUEST_SECONDS = Histogram('lyrics_request_seconds', 'Seconds to answer a websocket request', ['type', 'status'])
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
@@ -0,0 +1,186 @@
+"""
+Whisper 模型註冊表：整個程序共用已載入的 faster-whisper 模型
+依 (模型名稱, 裝置, 計算精度) 快取，超過記憶體預算時淘汰最久未使用的模型
+"""
+import gc
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import stable_whisper
+
+import config
+
+ModelKey = Tuple[str, str, str]
+
+# 各模型的參數量（百萬），用來估算常駐記憶體
+MODEL_PARAMS_M = {
+    "tiny": 39,
+    "base": 74,
+    "small": 244,
+    "medium": 769,
+    "large": 1550,
+    "turbo": 809,
+}
+
+# 各計算精度每個參數佔用的位元組數
+COMPUTE_TYPE_BYTES = {
+    "float32": 4,
+    "default": 4,
+    "auto": 4,
+    "float16": 2,
+    "bfloat16": 2,
+    "int8_float32": 1,
+    "int8_float16": 1,
+    "int8_bfloat16": 1,
+    "int8": 1,
+    "int16": 2,
+}
+
+
+def estimate_model_memory_mb(model_name: str, compute_type: str) -> int:
+    """估算模型載入後佔用的記憶體（MB）"""
+    base_name = model_name.split('/')[-1].lower()
+    params = MODEL_PARAMS_M["medium"]
+    # 以最長的前綴比對，例如 large-v3、medium.en、distil-large-v3
+    for name in sorted(MODEL_PARAMS_M, key=len, reverse=True):
+        if name in base_name:
+            params = MODEL_PARAMS_M[name]
+            break
+    bytes_per_param = COMPUTE_TYPE_BYTES.get(compute_type, 4)
+    return params * bytes_per_param
+
+
+def default_init_options() -> Dict[str, Any]:
+    """依設定（或主機調校結果）決定的 faster-whisper 初始化參數"""
+    options: Dict[str, Any] = {"num_workers": config.WHISPER_NUM_WORKERS or config.INFERENCE_WORKERS}
+    if config.WHISPER_CPU_THREADS > 0:
+        options["cpu_threads"] = config.WHISPER_CPU_THREADS
+    return options
+
+
+class _ModelEntry:
+    """註冊表中的單一模型"""
+
+    def __init__(self, key: ModelKey, memory_mb: int, num_workers: int):
+        self.key = key
+        self.memory_mb = memory_mb
+        self.model: Any = None
+        self.error: Optional[BaseException] = None
+        self.loaded = threading.Event()
+        # 使用中的工作數量，大於 0 時不可淘汰
+        self.leases = 0
+        # faster-whisper 每個 worker 同時只能處理一個請求
+        self.slots = threading.Semaphore(max(1, num_workers))
+
+
+class ModelRegistry:
+    """程序內共用的 Whisper 模型註冊表"""
+
+    def __init__(self, memory_budget_mb: int = config.MODEL_MEMORY_BUDGET_MB):
+        self.memory_budget_mb = memory_budget_mb
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[ModelKey, _ModelEntry]" = OrderedDict()
+
+    def _make_key(self, model_name: str, device: Optional[str], compute_type: Optional[str]) -> ModelKey:
+        return (model_name, device or config.WHISPER_DEVICE, compute_type or config.WHISPER_COMPUTE_TYPE)
+
+    def _get_entry(self, key: ModelKey, init_options: Dict[str, Any]) -> _ModelEntry:
+        """取得模型，尚未載入時由第一個呼叫者負責載入，其餘呼叫者等待"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                owner = False
+            else:
+                model_name, _, compute_type = key
+                entry = _ModelEntry(key,
+                                    estimate_model_memory_mb(
+                                        model_name, compute_type),
+                                    init_options.get('num_workers', 1))
+                self._entries[key] = entry
+                owner = True
+            entry.leases += 1
+
+        if owner:
+            self._load(entry, init_options)
+        else:
+            entry.loaded.wait()
+
+        if entry.error is not None:
+            self._release(entry)
+            raise entry.error
+        return entry
+
+    def _load(self, entry: _ModelEntry, init_options: Dict[str, Any]):
+        model_name, device, compute_type = entry.key
+        try:
+            entry.model = stable_whisper.load_faster_whisper(
+                model_name, device=device, compute_type=compute_type, **init_options)
+        except BaseException as e:
+            print(f"模型載入錯誤 ({model_name}): {e}")
+            entry.error = e
+            with self._lock:
+                if self._entries.get(entry.key) is entry:
+                    del self._entries[entry.key]
+        finally:
+            entry.loaded.set()
+
+        if entry.error is None:
+            self._evict_if_needed()
+
+    def _release(self, entry: _ModelEntry):
+        with self._lock:
+            entry.leases -= 1
+        self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        """超過記憶體預算時，淘汰最久未使用且沒有工作在用的模型"""
+        evicted: List[_ModelEntry] = []
+        with self._lock:
+            total = sum(e.memory_mb for e in self._entries.values())
+            for key in list(self._entries):
+                if total <= self.memory_budget_mb:
+                    break
+                entry = self._entries[key]
+                if entry.leases > 0 or not entry.loaded.is_set():
+                    continue
+                del self._entries[key]
+                total -= entry.memory_mb
+                evicted.append(entry)
+
+        for entry in evicted:
+            print(f"淘汰模型: {entry.key}")
+            entry.model = None
+        if evicted:
+            gc.collect()
+
+    @contextmanager
+    def acquire(self, model_name: str = config.WHISPER_MODEL, device: Optional[str] = None,
+                compute_type: Optional[str] = None, **init_options) -> Iterator[Any]:
+        """
+        借出模型供單一工作使用，離開 with 區塊後歸還
+        借出期間模型不會被淘汰，同時使用的工作數不超過模型的 num_workers
+        """
+        entry = self._get_entry(self._make_key(
+            model_name, device, compute_type), {**default_init_options(), **init_options})
+        try:
+            with entry.slots:
+                yield entry.model
+        finally:
+            self._release(entry)
+
+    def preload(self, model_names: List[str], device: Optional[str] = None,
+                compute_type: Optional[str] = None, **init_options):
+        """預先載入模型，用於應用程式啟動時"""
+        for model_name in model_names:
+            try:
+                entry = self._get_entry(self._make_key(
+                    model_name, device, compute_type), {**default_init_options(), **init_options})
+            except Exception:
+                continue
+            self._release(entry)
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,64 @@
+"""
+解碼音訊快取：每首歌只解碼一次為 16kHz 單聲道 float32 PCM，以記憶體映射檔保存
+轉錄與對齊直接使用陣列，不再各自呼叫 ffmpeg 解碼；同一首歌的並行工作共用同一份分頁快取
+"""
+import os
+import threading
+from typing import Dict
+
+import numpy as np
+from faster_whisper.audio import decode_audio
+
+import config
+from content_hash import file_sha256
+from metrics import record_cache
+
+SAMPLE_RATE = 16000
+
+
+def save_array(path: str, array: np.ndarray):
+    """以 .npy 格式保存陣列（先寫入暫存檔再取代）"""
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array, dtype=np.float32))
+    os.replace(temp_path, path)
+
+
+def load_array(path: str) -> np.ndarray:
+    """
+    以記憶體映射讀取 .npy 陣列
+    使用寫入時複製 (copy-on-write)：各工作共用檔案分頁，若下游函式修改陣列也不會寫回檔案
+    """
+    return np.load(path, mmap_mode='c')
+
+
+class PcmCache:
+    """解碼後 PCM 的磁碟快取"""
+
+    def __init__(self, cache_dir: str = os.path.join(config.CACHE_DIR, 'pcm')):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # 每個音訊各自一把鎖，避免同一首歌同時被解碼兩次
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.f32.npy')
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get_pcm(self, audio_path: str) -> np.ndarray:
+        """取得 16kHz 單聲道 PCM，尚未解碼時解碼並保存"""
+        key = file_sha256(audio_path)
+        path = self._path(key)
+        with self._key_lock(key):
+            exists = os.path.exists(path)
+            record_cache('pcm', exists)
+            if not exists:
+                save_array(path, decode_audio(audio_path, sampling_rate=SAMPLE_RATE))
+        return load_array(path)
+
+
+pcm_cache = PcmCache()
@@ -3,11 +3,14 @@
 歌詞爬蟲模組：從多個免費歌詞網站爬取歌詞
 """
 from bs4 import BeautifulSoup, Tag
-import re
 import urllib.parse
 import asyncio
-import aiohttp
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Awaitable, Tuple
+
+import html_extract
+from http_client import HttpClient, http_client
+from lyrics_cache import lyrics_search_cache
+from lyrics_fanout import first_success
 
 # 支援的歌詞網站
 SUPPORTED_SITES = {
@@ -28,11 +31,13 @@ SUPPORTED_SITES = {
 class LyricsCrawler:
     """歌詞爬蟲基礎類別"""
 
-    def __init__(self, headers: Optional[Dict[str, str]] = None):
-        """初始化爬蟲"""
-        self.headers = headers or {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+    # 網站名稱，用於統計各網站的命中率
+    site_name = ""
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, client: Optional[HttpClient] = None):
+        """初始化爬蟲，預設使用應用程式共用的連線池"""
+        self.headers = headers
+        self.client = client or http_client
 
     async def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """搜尋歌詞（需在子類別中實現）"""
@@ -65,6 +70,8 @@ class LyricsCrawler:
 class MojimCrawler(LyricsCrawler):
     """魔鏡歌詞網爬蟲"""
 
+    site_name = "mojim"
+
     async def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """搜尋魔鏡歌詞網"""
         query = song_name
@@ -75,21 +82,17 @@ class MojimCrawler(LyricsCrawler):
             query=urllib.parse.quote(query))
 
         try:
-            async with aiohttp.ClientSession(headers=self.headers) as session:
-                async with session.get(search_url) as response:
-                    if response.status != 200:
-                        return None
-
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
+            html = await self.client.get_text(search_url, headers=self.headers)
+            if html is None:
+                return None
 
-                    # 找到第一個搜尋結果
-                    result = soup.select_one('div.mxsh_ll1 a')
-                    if not result:
-                        return None
+            # 找到第一個搜尋結果
+            href = html_extract.mojim_search_link(html) or self._soup_search_link(html)
+            if not href:
+                return None
 
-                    lyrics_url = f"{SUPPORTED_SITES['mojim']['url']}{result['href']}"
-                    return await self.get_lyrics_by_url(lyrics_url)
+            lyrics_url = f"{SUPPORTED_SITES['mojim']['url']}{href}"
+            return await self.get_lyrics_by_url(lyrics_url)
 
         except Exception as e:
             print(f"魔鏡搜尋錯誤: {e}")
@@ -98,46 +101,59 @@ class MojimCrawler(LyricsCrawler):
     async def get_lyrics_by_url(self, url: str) -> Optional[Dict[str, Any]]:
         """從魔鏡網頁取得歌詞"""
         try:
-            async with aiohttp.ClientSession(headers=self.headers) as session:
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        return None
+            html = await self.client.get_text(url, headers=self.headers)
+            if html is None:
+                return None
 
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
+            # 取得歌曲資訊與歌詞內容
+            parsed = html_extract.mojim_lyrics(html) or self._soup_lyrics(html)
+            if not parsed:
+                return None
+            title, raw_lyrics = parsed
 
-                    # 取得歌曲資訊
-                    title_element = soup.select_one('div.fsZx3')
-                    title = title_element.text.strip() if title_element else "未知歌曲"
+            # 移除歌詞備註和方括號註釋
+            raw_lyrics = html_extract.BRACKET_NOTE.sub('', raw_lyrics)
 
-                    # 取得歌詞內容
-                    lyrics_element = soup.select_one('div#fsZx2')
-                    if not lyrics_element:
-                        return None
+            # 格式化歌詞
+            lyrics_json = await self.format_lyrics(raw_lyrics)
 
-                    # 清理歌詞文本
-                    raw_lyrics = lyrics_element.get_text('\n').strip()
-                    # 移除歌詞備註和方括號註釋
-                    raw_lyrics = re.sub(r'\[.*?\]', '', raw_lyrics)
+            # 添加歌曲資訊
+            lyrics_json["title"] = title or "未知歌曲"
+            lyrics_json["source"] = "魔鏡歌詞網"
+            lyrics_json["url"] = url
 
-                    # 格式化歌詞
-                    lyrics_json = await self.format_lyrics(raw_lyrics)
-
-                    # 添加歌曲資訊
-                    lyrics_json["title"] = title
-                    lyrics_json["source"] = "魔鏡歌詞網"
-                    lyrics_json["url"] = url
-
-                    return lyrics_json
+            return lyrics_json
 
         except Exception as e:
             print(f"取得魔鏡歌詞錯誤: {e}")
             return None
 
+    def _soup_search_link(self, html: str) -> Optional[str]:
+        """以 BeautifulSoup 解析搜尋結果（快速擷取失敗時使用）"""
+        soup = BeautifulSoup(html, 'html.parser')
+        result = soup.select_one('div.mxsh_ll1 a')
+        if not result:
+            return None
+        return str(result['href'])
+
+    def _soup_lyrics(self, html: str) -> Optional[Tuple[Optional[str], str]]:
+        """以 BeautifulSoup 解析歌詞頁（快速擷取失敗時使用）"""
+        soup = BeautifulSoup(html, 'html.parser')
+
+        title_element = soup.select_one('div.fsZx3')
+        title = title_element.text.strip() if title_element else None
+
+        lyrics_element = soup.select_one('div#fsZx2')
+        if not lyrics_element:
+            return None
+        return title, lyrics_element.get_text('\n').strip()
+
 
 class GeniusCrawler(LyricsCrawler):
     """Genius 歌詞網站爬蟲"""
 
+    site_name = "genius"
+
     async def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """搜尋 Genius 網站歌詞"""
         query = song_name
@@ -148,24 +164,22 @@ class GeniusCrawler(LyricsCrawler):
             query=urllib.parse.quote(query))
 
         try:
-            async with aiohttp.ClientSession(headers=self.headers) as session:
-                async with session.get(search_url) as response:
-                    if response.status != 200:
-                        return None
+            data = await self.client.get_json(search_url, headers=self.headers)
+            if data is None:
+                return None
 
-                    data = await response.json()
-                    hits = data.get("response", {}).get(
-                        "sections", [])[0].get("hits", [])
+            hits = data.get("response", {}).get(
+                "sections", [])[0].get("hits", [])
 
-                    if not hits:
-                        return None
+            if not hits:
+                return None
 
-                    # 取得第一個搜尋結果的URL
-                    lyrics_url = hits[0].get("result", {}).get("url")
-                    if not lyrics_url:
-                        return None
+            # 取得第一個搜尋結果的URL
+            lyrics_url = hits[0].get("result", {}).get("url")
+            if not lyrics_url:
+                return None
 
-                    return await self.get_lyrics_by_url(lyrics_url)
+            return await self.get_lyrics_by_url(lyrics_url)
 
         except Exception as e:
             print(f"Genius 搜尋錯誤: {e}")
@@ -174,78 +188,89 @@ class GeniusCrawler(LyricsCrawler):
     async def get_lyrics_by_url(self, url: str) -> Optional[Dict[str, Any]]:
         """從 Genius 網頁取得歌詞"""
         try:
-            async with aiohttp.ClientSession(headers=self.headers) as session:
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        return None
-
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-
-                    # 取得歌曲標題
-                    title_element = soup.select_one(
-                        'h1[class*="SongHeader__Title"]')
-                    title = title_element.text.strip() if title_element else "未知歌曲"
-
-                    # 取得歌詞內容
-                    lyrics_div = soup.find(
-                        'div', {'data-lyrics-container': 'true'})
-                    if not lyrics_div:
-                        return None
-
-                    # 清理 HTML 標籤
-                    for br in lyrics_div.find_all('br'):  # type: ignore
-                        # 清理 HTML 標籤
-                        if isinstance(lyrics_div, Tag):
-                            # 將所有<br>標籤替換為換行符
-                            for br in lyrics_div.find_all('br'):
-                                br.replace_with(soup.new_string('\n'))
-
-                    raw_lyrics = lyrics_div.get_text('\n').strip()
-                    lyrics_json = await self.format_lyrics(raw_lyrics)
-
-                    # 添加歌曲資訊
-                    lyrics_json["title"] = title
-                    lyrics_json["source"] = "Genius"
-                    lyrics_json["url"] = url
-
-                    return lyrics_json
+            html = await self.client.get_text(url, headers=self.headers)
+            if html is None:
+                return None
+
+            # 取得歌曲標題與歌詞內容
+            parsed = html_extract.genius_lyrics(html) or self._soup_lyrics(html)
+            if not parsed:
+                return None
+            title, raw_lyrics = parsed
+
+            lyrics_json = await self.format_lyrics(raw_lyrics)
+
+            # 添加歌曲資訊
+            lyrics_json["title"] = title or "未知歌曲"
+            lyrics_json["source"] = "Genius"
+            lyrics_json["url"] = url
+
+            return lyrics_json
 
         except Exception as e:
             print(f"取得 Genius 歌詞錯誤: {e}")
             return None
 
+    def _soup_lyrics(self, html: str) -> Optional[Tuple[Optional[str], str]]:
+        """以 BeautifulSoup 解析歌詞頁（快速擷取失敗時使用）"""
+        soup = BeautifulSoup(html, 'html.parser')
 
-async def scrawl_lyrics_multi_sites(song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    """
-    從多個網站爬取歌詞，返回第一個成功的結果
-    """
+        title_element = soup.select_one(
+            'h1[class*="SongHeader__Title"]')
+        title = title_element.text.strip() if title_element else None
+
+        lyrics_div = soup.find(
+            'div', {'data-lyrics-container': 'true'})
+        if not isinstance(lyrics_div, Tag):
+            return None
+
+        # 將所有<br>標籤替換為換行符
+        for br in lyrics_div.find_all('br'):
+            br.replace_with(soup.new_string('\n'))
+
+        return title, lyrics_div.get_text('\n').strip()
+
+
+def _site_attempts(song_name: str, artist: Optional[str] = None,
+                   client: Optional[HttpClient] = None) -> List[Awaitable[Optional[Dict[str, Any]]]]:
+    """每個網站一個查詢，所有爬蟲共用同一個連線池"""
     crawlers = [
-        MojimCrawler(),
-        GeniusCrawler()
+        MojimCrawler(client=client),
+        GeniusCrawler(client=client)
     ]
+    return [lyrics_search_cache.track_site(crawler.site_name, crawler.search_lyrics(song_name, artist))
+            for crawler in crawlers]
 
-    for crawler in crawlers:
-        result = await crawler.search_lyrics(song_name, artist)
-        if result:
-            return result
 
-    return None
+async def scrawl_lyrics_multi_sites(song_name: str, artist: Optional[str] = None,
+                                    client: Optional[HttpClient] = None) -> Optional[Dict[str, Any]]:
+    """
+    同時從多個網站爬取歌詞，返回第一個成功的結果
+    """
+    return await first_success(_site_attempts(song_name, artist, client))
 
 
-async def scrawl_lyrics_http(song_name: str) -> Optional[Dict[str, Any]]:
+def lyrics_attempts(song_name: str, client: Optional[HttpClient] = None) -> List[Awaitable[Optional[Dict[str, Any]]]]:
     """
-    從網站爬取歌詞的公開接口，配合 web.py 使用
+    產生所有網站、所有查詢組合的搜尋
+    先用「歌手 - 歌名」拆出的組合，再用完整標題
     """
     # 嘗試從歌名中提取可能的歌手名
     parts = song_name.split(' - ', 1)
-    artist = None
 
+    attempts = []
     if len(parts) > 1:
-        artist = parts[0]
-        song_name = parts[1]
+        attempts += _site_attempts(parts[1], parts[0], client)
+    attempts += _site_attempts(song_name, client=client)
+    return attempts
 
-    return await scrawl_lyrics_multi_sites(song_name, artist)
+
+async def scrawl_lyrics_http(song_name: str, client: Optional[HttpClient] = None) -> Optional[Dict[str, Any]]:
+    """
+    從網站爬取歌詞的公開接口，配合 web.py 使用
+    所有網站與查詢組合同時進行，返回最先成功的結果
+    """
+    return await first_success(lyrics_attempts(song_name, client))
 
 # 測試功能
 
@@ -265,6 +290,7 @@ async def test_crawler():
             print(f"{i+1}. {line.get('text', '')}")
     else:
         print("未找到歌詞")
+    await http_client.close()
 
 if __name__ == "__main__":
     # 測試爬蟲功能
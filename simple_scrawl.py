@@ -1,40 +1,39 @@
 # filepath: c:\Users\User\Desktop\simple-lyrics-extraction-and-subtitle-website\simple_scrawl.py
 """
 簡易歌詞爬蟲模組：從免費歌詞網站爬取歌詞
-只使用基本 Python 套件，減少依賴性
+以預先編譯的正規表達式解析網頁（html_extract），HTTP 請求使用共用的連線池
 """
 import re
 import json
-import urllib.request
+import asyncio
 import urllib.parse
-import urllib.error
-from typing import Dict, Any, Optional, List, Union
+from typing import Dict, Any, Optional, List, Union, Awaitable
+
+import html_extract
+from http_client import HttpClient, http_client
+from lyrics_cache import lyrics_search_cache
+from lyrics_fanout import first_success
 
 
 class SimpleLyricsCrawler:
     """簡易歌詞爬蟲基礎類別"""
 
-    def __init__(self):
-        """初始化爬蟲"""
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+    # 網站名稱，用於統計各網站的命中率
+    site_name = ""
 
-    def _make_request(self, url: str) -> Optional[str]:
+    def __init__(self, client: Optional[HttpClient] = None):
+        """初始化爬蟲，預設使用應用程式共用的連線池"""
+        self.client = client or http_client
+
+    async def _make_request(self, url: str) -> Optional[str]:
         """發送 HTTP 請求並取得回應內容"""
-        try:
-            request = urllib.request.Request(url, headers=self.headers)
-            with urllib.request.urlopen(request, timeout=10) as response:
-                return response.text()
-        except Exception as e:
-            print(f"請求錯誤 ({url}): {e}")
-            return None
+        return await self.client.get_text(url)
 
-    def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    async def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """搜尋歌詞（需在子類別中實現）"""
         raise NotImplementedError("搜尋方法需在子類別中實現")
 
-    def get_lyrics_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+    async def get_lyrics_by_url(self, url: str) -> Optional[Dict[str, Any]]:
         """透過URL取得歌詞（需在子類別中實現）"""
         raise NotImplementedError("取得歌詞方法需在子類別中實現")
 
@@ -61,46 +60,44 @@ class SimpleLyricsCrawler:
 class AZLyricsCrawler(SimpleLyricsCrawler):
     """AZLyrics 英文歌詞網站爬蟲"""
 
-    def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    site_name = "azlyrics"
+
+    async def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """搜尋 AZLyrics 歌詞"""
         if not artist:
             print("AZLyrics 需要提供歌手名稱")
             return None
 
         # AZLyrics 的 URL 模式是 artist 名和歌曲名都轉小寫並移除特殊字元
-        artist_name = re.sub(r'[^\w]', '', artist.lower())
-        song_title = re.sub(r'[^\w]', '', song_name.lower())
+        artist_name = html_extract.AZLYRICS_URL_CLEANER.sub('', artist.lower())
+        song_title = html_extract.AZLYRICS_URL_CLEANER.sub('', song_name.lower())
 
         # 嘗試直接使用 URL 模式
         url = f"https://www.azlyrics.com/lyrics/{artist_name}/{song_title}.html"
 
-        return self.get_lyrics_by_url(url)
+        return await self.get_lyrics_by_url(url)
 
-    def get_lyrics_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+    async def get_lyrics_by_url(self, url: str) -> Optional[Dict[str, Any]]:
         """從 AZLyrics 網頁取得歌詞"""
-        html = self._make_request(url)
+        html = await self._make_request(url)
         if not html:
             return None
 
         try:
             # AZLyrics 的歌詞在 <!-- 和 --> 注釋中間
-            lyrics_pattern = re.compile(
-                r'<!-- Usage of azlyrics.com content by any third-party lyrics provider is prohibited by our licensing agreement. Sorry about that. -->(.*?)<!-- MxM banner -->', re.DOTALL)
-            match = lyrics_pattern.search(html)
+            match = html_extract.AZLYRICS_LYRICS.search(html)
 
             if not match:
                 return None
 
             raw_lyrics = match.group(1).strip()
             # 清理 HTML 標籤
-            raw_lyrics = re.sub(r'<.*?>', '', raw_lyrics)
+            raw_lyrics = html_extract.html_to_text(raw_lyrics, br_newline=False)
             # 清理多餘空白行
-            raw_lyrics = re.sub(r'\n\s*\n', '\n\n', raw_lyrics).strip()
+            raw_lyrics = html_extract.BLANK_LINES.sub('\n\n', raw_lyrics).strip()
 
             # 取得歌曲標題
-            title_pattern = re.compile(
-                r'<title>(.*?) Lyrics \| AZLyrics.com</title>')
-            title_match = title_pattern.search(html)
+            title_match = html_extract.AZLYRICS_TITLE.search(html)
             title = title_match.group(1) if title_match else "未知歌曲"
 
             # 格式化歌詞
@@ -121,59 +118,54 @@ class AZLyricsCrawler(SimpleLyricsCrawler):
 class KasitimeCrawler(SimpleLyricsCrawler):
     """歌詞タイム（Kasitime）日文歌詞網站爬蟲"""
 
-    def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    site_name = "kasitime"
+
+    async def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """搜尋歌詞タイム的歌詞"""
         query = song_name
         if artist:
             query = f"{artist} {song_name}"
 
         search_url = f"https://www.kasi-time.com/search.php?keyword={urllib.parse.quote(query)}"
-        html = self._make_request(search_url)
+        html = await self._make_request(search_url)
 
         if not html:
             return None
 
         try:
             # 從搜尋結果頁面找出第一個歌詞連結
-            song_link_pattern = re.compile(r'<a href="(item-\d+\.html)"')
-            match = song_link_pattern.search(html)
+            match = html_extract.KASITIME_SONG_LINK.search(html)
 
             if not match:
                 return None
 
             lyrics_url = f"https://www.kasi-time.com/{match.group(1)}"
-            return self.get_lyrics_by_url(lyrics_url)
+            return await self.get_lyrics_by_url(lyrics_url)
 
         except Exception as e:
             print(f"搜尋歌詞タイム錯誤: {e}")
             return None
 
-    def get_lyrics_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+    async def get_lyrics_by_url(self, url: str) -> Optional[Dict[str, Any]]:
         """從歌詞タイム網頁取得歌詞"""
-        html = self._make_request(url)
+        html = await self._make_request(url)
         if not html:
             return None
 
         try:
             # 取得歌詞內容
-            lyrics_pattern = re.compile(
-                r'<div class="lyrics">(.*?)</div>', re.DOTALL)
-            match = lyrics_pattern.search(html)
+            match = html_extract.KASITIME_LYRICS.search(html)
 
             if not match:
                 return None
 
             raw_lyrics = match.group(1).strip()
             # 清理 HTML 標籤
-            raw_lyrics = re.sub(r'<br\s*/?>', '\n', raw_lyrics)
-            raw_lyrics = re.sub(r'<.*?>', '', raw_lyrics)
+            raw_lyrics = html_extract.html_to_text(raw_lyrics)
 
             # 取得歌曲標題和歌手
-            title_pattern = re.compile(r'<h1 class="title">(.*?)</h1>')
-            artist_pattern = re.compile(r'<p class="artist">(.*?)</p>')
-
-            title_match = title_pattern.search(html)
-            artist_match = artist_pattern.search(html)
+            title_match = html_extract.KASITIME_TITLE.search(html)
+            artist_match = html_extract.KASITIME_ARTIST.search(html)
 
             title = title_match.group(1) if title_match else "未知歌曲"
             artist = artist_match.group(1) if artist_match else "未知歌手"
@@ -197,61 +189,54 @@ class KasitimeCrawler(SimpleLyricsCrawler):
 class LyricsTranslateCrawler(SimpleLyricsCrawler):
     """LyricsTranslate 多語言歌詞網站爬蟲"""
 
-    def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    site_name = "lyricstranslate"
+
+    async def search_lyrics(self, song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """搜尋 LyricsTranslate 歌詞"""
         query = song_name
         if artist:
             query = f"{artist} {song_name}"
 
         search_url = f"https://lyricstranslate.com/en/search/node/{urllib.parse.quote(query)}"
-        html = self._make_request(search_url)
+        html = await self._make_request(search_url)
 
         if not html:
             return None
 
         try:
             # 從搜尋結果頁面找出第一個歌詞連結
-            song_link_pattern = re.compile(
-                r'<a href="(/en/[^"]+?)"[^>]*?class="search-result__title')
-            match = song_link_pattern.search(html)
+            match = html_extract.LYRICSTRANSLATE_SONG_LINK.search(html)
 
             if not match:
                 return None
 
             lyrics_url = f"https://lyricstranslate.com{match.group(1)}"
-            return self.get_lyrics_by_url(lyrics_url)
+            return await self.get_lyrics_by_url(lyrics_url)
 
         except Exception as e:
             print(f"搜尋 LyricsTranslate 錯誤: {e}")
             return None
 
-    def get_lyrics_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+    async def get_lyrics_by_url(self, url: str) -> Optional[Dict[str, Any]]:
         """從 LyricsTranslate 網頁取得歌詞"""
-        html = self._make_request(url)
+        html = await self._make_request(url)
         if not html:
             return None
 
         try:
             # 取得歌詞內容
-            lyrics_pattern = re.compile(
-                r'<div class="ltf">.*?<div>(.*?)</div>', re.DOTALL)
-            match = lyrics_pattern.search(html)
+            match = html_extract.LYRICSTRANSLATE_LYRICS.search(html)
 
             if not match:
                 return None
 
             raw_lyrics = match.group(1).strip()
             # 清理 HTML 標籤
-            raw_lyrics = re.sub(r'<br\s*/?>', '\n', raw_lyrics)
-            raw_lyrics = re.sub(r'<.*?>', '', raw_lyrics)
+            raw_lyrics = html_extract.html_to_text(raw_lyrics)
 
             # 取得歌曲標題和歌手
-            title_pattern = re.compile(r'<h2 class="title-h2">(.*?)</h2>')
-            artist_pattern = re.compile(
-                r'<a[^>]*?class="author[^>]*?>(.*?)</a>')
-
-            title_match = title_pattern.search(html)
-            artist_match = artist_pattern.search(html)
+            title_match = html_extract.LYRICSTRANSLATE_TITLE.search(html)
+            artist_match = html_extract.LYRICSTRANSLATE_ARTIST.search(html)
 
             title = title_match.group(1) if title_match else "未知歌曲"
             artist = artist_match.group(1) if artist_match else "未知歌手"
@@ -272,22 +257,27 @@ class LyricsTranslateCrawler(SimpleLyricsCrawler):
             return None
 
 
-def scrawl_lyrics_multi_sites(song_name: str, artist: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    """
-    從多個網站爬取歌詞，返回第一個成功的結果
-    """
-    crawlers = [
-        KasitimeCrawler(),  # 日文歌詞
-        AZLyricsCrawler(),  # 英文歌詞
-        LyricsTranslateCrawler()  # 多語言歌詞
+def _crawlers(client: Optional[HttpClient] = None) -> List[SimpleLyricsCrawler]:
+    return [
+        KasitimeCrawler(client),  # 日文歌詞
+        AZLyricsCrawler(client),  # 英文歌詞
+        LyricsTranslateCrawler(client)  # 多語言歌詞
     ]
 
-    for crawler in crawlers:
-        result = crawler.search_lyrics(song_name, artist)
-        if result:
-            return result
 
-    return None
+def _site_attempts(song_name: str, artist: Optional[str] = None,
+                   client: Optional[HttpClient] = None) -> List[Awaitable[Optional[Dict[str, Any]]]]:
+    """每個網站一個查詢，所有爬蟲共用同一個連線池"""
+    return [lyrics_search_cache.track_site(crawler.site_name, crawler.search_lyrics(song_name, artist))
+            for crawler in _crawlers(client)]
+
+
+async def scrawl_lyrics_multi_sites(song_name: str, artist: Optional[str] = None,
+                                    client: Optional[HttpClient] = None) -> Optional[Dict[str, Any]]:
+    """
+    同時從多個網站爬取歌詞，返回第一個成功的結果
+    """
+    return await first_success(_site_attempts(song_name, artist, client))
 
 
 def extract_artist_from_title(video_title: str) -> tuple[str, str]:
@@ -315,21 +305,35 @@ def extract_artist_from_title(video_title: str) -> tuple[str, str]:
     return "", video_title
 
 
-def scrawl_lyrics_http(video_title: str) -> Optional[Dict[str, Any]]:
+def lyrics_attempts(video_title: str, client: Optional[HttpClient] = None) -> List[Awaitable[Optional[Dict[str, Any]]]]:
     """
-    從網站爬取歌詞的公開接口，配合 web.py 使用
+    產生所有網站、所有查詢組合的搜尋
+    先用提取出的歌手和歌曲名，再用完整標題
     """
     # 嘗試從影片標題中提取歌手和歌曲名
     artist, song_name = extract_artist_from_title(video_title)
 
-    # 如果有歌手資訊，優先使用
+    attempts = []
     if artist:
-        result = scrawl_lyrics_multi_sites(song_name, artist)
-        if result:
-            return result
+        attempts += _site_attempts(song_name, artist, client)
+    attempts += _site_attempts(video_title, client=client)
+    return attempts
+
+
+async def scrawl_lyrics_http(video_title: str, client: Optional[HttpClient] = None) -> Optional[Dict[str, Any]]:
+    """
+    從網站爬取歌詞的公開接口，配合 web.py 使用
+    所有網站與查詢組合同時進行，返回最先成功的結果
+    """
+    return await first_success(lyrics_attempts(video_title, client))
+
 
-    # 如果無法提取或搜尋失敗，使用完整標題搜尋
-    return scrawl_lyrics_multi_sites(video_title)
+async def _search_and_close(video_title: str) -> Optional[Dict[str, Any]]:
+    """命令列測試用：搜尋後關閉連線池"""
+    try:
+        return await scrawl_lyrics_http(video_title)
+    finally:
+        await http_client.close()
 
 
 # 測試功能
@@ -344,7 +348,7 @@ if __name__ == "__main__":
         if artist:
             print(f"提取到歌手: {artist}, 歌曲: {song}")
 
-        result = scrawl_lyrics_http(query)
+        result = asyncio.run(_search_and_close(query))
 
         if result:
             print(f"成功找到歌詞!")
@@ -0,0 +1,85 @@
+"""
+Single-flight：相同鍵值的並行請求只執行一次，其餘請求等待同一個結果
+例如多個客戶端同時送出同一首歌時，只下載及轉錄一次
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from job_executor import ProgressCallback
+
+# 這些事件會保留下來，後加入的請求也能收到先前的內容（例如已解出的字幕段落）
+REPLAY_EVENTS = {'segments_partial'}
+
+
+class _Call:
+    def __init__(self):
+        self.task: Optional["asyncio.Task[Any]"] = None
+        self.waiters = 0
+        self.listeners: List[ProgressCallback] = []
+        self.history: List[Tuple[str, Any]] = []
+        # 是否為強制重新執行的工作（不使用快取的結果）
+        self.forced = False
+
+    def broadcast(self, stage: str, progress: Any):
+        """將進度轉發給所有等待中的請求"""
+        if stage in REPLAY_EVENTS:
+            self.history.append((stage, progress))
+        for listener in list(self.listeners):
+            listener(stage, progress)
+
+
+class SingleFlight:
+    """依鍵值合併並行的非同步工作"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[ProgressCallback], Awaitable[Any]],
+                 on_progress: Optional[ProgressCallback] = None, force: bool = False) -> Any:
+        """
+        執行 fn 或加入已在執行的同鍵工作，回傳其結果
+        fn 會收到一個進度回呼，進度會轉發給所有加入的請求
+        所有請求都離開（例如客戶端全部斷線）時，工作才會被取消
+        force 為 True 時只加入同樣強制執行的工作；進行中的工作不是強制執行時，
+        先等待其結束（忽略結果與錯誤，期間同樣收到進度），再開始新的工作
+        """
+        call = self._calls.get(key)
+        while force and call is not None and not call.forced:
+            try:
+                await self._join(call, on_progress)
+            except Exception:
+                pass
+            call = self._calls.get(key)
+        if call is None:
+            call = _Call()
+            call.forced = force
+            call.task = asyncio.create_task(fn(call.broadcast))
+            self._calls[key] = call
+
+            def forget(_):
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.task.add_done_callback(forget)
+        return await self._join(call, on_progress)
+
+    @staticmethod
+    async def _join(call: _Call, on_progress: Optional[ProgressCallback]) -> Any:
+        call.waiters += 1
+        if on_progress is not None:
+            for stage, progress in call.history:
+                on_progress(stage, progress)
+            call.listeners.append(on_progress)
+        try:
+            return await asyncio.shield(call.task)  # type: ignore
+        finally:
+            call.waiters -= 1
+            if on_progress is not None:
+                call.listeners.remove(on_progress)
+            if call.waiters == 0 and not call.task.done():  # type: ignore
+                call.task.cancel()  # type: ignore
+
+
+job_flights = SingleFlight()
@@ -0,0 +1,49 @@
+"""
+人聲分離快取：Demucs 分離出的人聲（16kHz 單聲道 float32）依音訊內容雜湊保存
+轉錄、對齊及重新對齊共用同一份結果，每首歌最多只執行一次 Demucs
+"""
+import os
+import threading
+from typing import Dict
+
+import numpy as np
+from stable_whisper.audio import prep_audio
+
+import config
+from content_hash import file_sha256
+from metrics import record_cache
+from pcm_cache import load_array, save_array
+
+
+class StemCache:
+    """Demucs 人聲分離結果的磁碟快取"""
+
+    def __init__(self, cache_dir: str = os.path.join(config.CACHE_DIR, 'stems'), denoiser: str = 'demucs'):
+        self.cache_dir = cache_dir
+        self.denoiser = denoiser
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # 每個音訊各自一把鎖，避免同一首歌同時被分離兩次
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.{self.denoiser}.npy')
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get_vocal_stem(self, audio_path: str) -> np.ndarray:
+        """取得人聲音訊，尚未分離時執行 Demucs 並保存"""
+        key = file_sha256(audio_path)
+        path = self._path(key)
+        with self._key_lock(key):
+            exists = os.path.exists(path)
+            record_cache('vocal_stem', exists)
+            if not exists:
+                save_array(path, prep_audio(audio_path, denoiser=self.denoiser).numpy())
+        # 以記憶體映射讀取，同一首歌的並行工作共用分頁快取
+        return load_array(path)
+
+
+stem_cache = StemCache()
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# 模組位於專案根目錄
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 匯入時建立的快取（歌詞搜尋的 SQLite 等）放在暫存目錄，不寫入 ./downloads
+os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='tests-cache-'))
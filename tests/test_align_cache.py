@@ -0,0 +1,38 @@
+from align_cache import AlignmentCache
+from metrics import CACHE_REQUESTS
+
+
+def _counts(cache):
+    return (CACHE_REQUESTS.value(cache=cache, result='hit'), CACHE_REQUESTS.value(cache=cache, result='miss'))
+
+
+def test_get_records_hit_only_after_a_successful_read(tmp_path):
+    cache = AlignmentCache(str(tmp_path))
+    result = {"text": "a b", "segments": [{"start": 0.5, "end": 1.25, "text": "a b"}]}
+
+    hits, misses = _counts('align')
+    assert cache.get('missing') is None
+    assert _counts('align') == (hits, misses + 1)
+
+    cache.put('good', result)
+    assert cache.get('good') == result
+    assert _counts('align') == (hits + 1, misses + 1)
+
+    (tmp_path / 'broken.lyr').write_bytes(b'not a lyrics file')
+    assert cache.get('broken') is None
+    assert _counts('align') == (hits + 1, misses + 2)
+
+
+def test_get_reads_legacy_json(tmp_path):
+    (tmp_path / 'legacy.json').write_text('{"text": "x"}', encoding='utf-8')
+    assert AlignmentCache(str(tmp_path)).get('legacy') == {"text": "x"}
+
+
+def test_latest_follows_the_last_put_for_the_audio(tmp_path):
+    cache = AlignmentCache(str(tmp_path))
+    hits, misses = _counts('align_latest')
+    assert cache.latest('audio') is None
+    cache.put('first', {"text": "a"}, 'audio')
+    cache.put('second', {"text": "b"}, 'audio')
+    assert cache.latest('audio') == {"text": "b"}
+    assert _counts('align_latest') == (hits + 1, misses + 1)
@@ -0,0 +1,84 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from audio_stream import MAX_RANGES, RangeNotSatisfiable, file_response, parse_range_header
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('bytes=0-99', [(0, 100)]),
+    ('bytes=500-', [(500, 1000)]),
+    ('bytes=-200', [(800, 1000)]),
+    ('bytes=-5000', [(0, 1000)]),
+    ('bytes=900-5000', [(900, 1000)]),
+    ('BYTES = 0-0', [(0, 1)]),
+    # 排序並合併重疊或相鄰的範圍
+    ('bytes=200-299, 0-99, 100-149', [(0, 150), (200, 300)]),
+    ('bytes=0-499,400-', [(0, 1000)]),
+    # 無法滿足的範圍略過，只要還有其他範圍
+    ('bytes=0-9,2000-3000,-0', [(0, 10)]),
+])
+def test_parse_range_header(value, expected):
+    assert parse_range_header(value, SIZE) == expected
+
+
+@pytest.mark.parametrize('value', [
+    'items=0-1', 'bytes=', 'bytes=abc', 'bytes=5', 'bytes=-', 'bytes=10-5', 'bytes=1-x', 'bytes=+1-2',
+])
+def test_malformed_range_is_ignored(value):
+    assert parse_range_header(value, SIZE) is None
+
+
+@pytest.mark.parametrize('value', ['bytes=1000-', 'bytes=1000-2000', 'bytes=-0'])
+def test_unsatisfiable_range(value):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(value, SIZE)
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / 'song.opus'
+    path.write_bytes(bytes(range(256)) * 4)
+
+    async def audio(request):
+        return file_response(request, str(path), 'audio/ogg')
+
+    return TestClient(Starlette(routes=[Route('/audio', audio)]))
+
+
+def test_full_and_single_range_responses(client):
+    full = client.get('/audio')
+    assert full.status_code == 200 and len(full.content) == 1024
+    assert full.headers['accept-ranges'] == 'bytes'
+
+    partial = client.get('/audio', headers={'Range': 'bytes=10-19'})
+    assert partial.status_code == 206
+    assert partial.headers['content-range'] == 'bytes 10-19/1024'
+    assert partial.content == bytes(range(10, 20))
+
+
+def test_multiple_ranges_use_multipart(client):
+    response = client.get('/audio', headers={'Range': 'bytes=0-1,100-101'})
+    assert response.status_code == 206
+    assert response.headers['content-type'].startswith('multipart/byteranges; boundary=')
+    assert b'Content-Range: bytes 0-1/1024' in response.content
+    assert b'Content-Range: bytes 100-101/1024' in response.content
+
+
+def test_unsatisfiable_and_too_many_ranges(client):
+    response = client.get('/audio', headers={'Range': 'bytes=5000-'})
+    assert response.status_code == 416 and response.headers['content-range'] == 'bytes */1024'
+
+    many = ','.join(f'{i * 10}-{i * 10 + 1}' for i in range(MAX_RANGES + 1))
+    assert client.get('/audio', headers={'Range': f'bytes={many}'}).status_code == 200
+
+
+def test_conditional_requests(client):
+    etag = client.get('/audio').headers['etag']
+    assert client.get('/audio', headers={'If-None-Match': f'W/{etag}'}).status_code == 304
+    # If-Range 不符合時忽略 Range，回傳完整檔案
+    assert client.get('/audio', headers={'Range': 'bytes=0-9', 'If-Range': '"other"'}).status_code == 200
+    assert client.get('/audio', headers={'Range': 'bytes=0-9', 'If-Range': etag}).status_code == 206
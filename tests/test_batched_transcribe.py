@@ -0,0 +1,71 @@
+import importlib
+import sys
+import types
+
+import numpy as np
+import pytest
+
+SAMPLE_RATE = 16000
+
+
+class _Segment:
+    def __init__(self, clip):
+        start = clip["start"] / SAMPLE_RATE
+        # 與 faster-whisper 相同：seek 為區段起點秒數乘以每秒幀數後取整（浮點誤差可能少 1）
+        self.seek = int(start * 100)
+        self.start, self.end = start + 0.1, start + 0.5
+        self.text = f'clip {clip["start"]}'
+        self.words = []
+
+
+class _Pipeline:
+    def __init__(self, model):
+        pass
+
+    def transcribe(self, audio, clip_timestamps, **kwargs):
+        return [_Segment(clip) for clip in clip_timestamps], None
+
+
+@pytest.fixture
+def batched_transcribe(monkeypatch):
+    """以假的 faster_whisper 模組匯入 batched_transcribe（測試環境未安裝 faster-whisper）"""
+    stub = types.ModuleType('faster_whisper')
+    stub.BatchedInferencePipeline = _Pipeline
+    vad = types.ModuleType('faster_whisper.vad')
+    vad.VadOptions = vad.get_speech_timestamps = vad.merge_segments = None
+    audio = types.ModuleType('faster_whisper.audio')
+    audio.decode_audio = None
+    stub.vad, stub.audio = vad, audio
+    for name, module in (('faster_whisper', stub), ('faster_whisper.vad', vad), ('faster_whisper.audio', audio)):
+        monkeypatch.setitem(sys.modules, name, module)
+    # 匯入的模組引用假的 faster_whisper，測試結束後移除
+    for name in ('batched_transcribe', 'pcm_cache'):
+        monkeypatch.setitem(sys.modules, name, None)
+        monkeypatch.delitem(sys.modules, name)
+    return importlib.import_module('batched_transcribe')
+
+
+def test_segments_are_routed_to_their_song(batched_transcribe, monkeypatch):
+    # 18240 / 16000 * 100 以浮點計算為 113.99999...，取整後比歌曲起點的幀位置少 1
+    lengths = [18240, 32000, 16000]
+    clips = {18240: [{"start": 0, "end": 8000}, {"start": 17600, "end": 18240}],
+             32000: [{"start": 0, "end": 9000}, {"start": 20000, "end": 32000}],
+             16000: [{"start": 0, "end": 16000}]}
+    monkeypatch.setattr(batched_transcribe, 'speech_clips', lambda audio, chunk_length: clips[len(audio)])
+    model = types.SimpleNamespace(feature_extractor=types.SimpleNamespace(chunk_length=30))
+    routed = []
+
+    results = batched_transcribe.transcribe_batch(
+        model, [np.zeros(length, dtype=np.float32) for length in lengths], 'ja',
+        on_segment=lambda owner, segment: routed.append(owner))
+
+    assert routed == [0, 0, 1, 1, 2]
+    # 時間換回歌曲內的時間
+    assert [[segment["start"] for segment in song] for song in results] == [[0.1, 1.2], [0.1, 1.35], [0.1]]
+    assert results[1][0]["text"] == 'clip 18240'
+
+
+def test_no_speech_returns_empty_results(batched_transcribe, monkeypatch):
+    monkeypatch.setattr(batched_transcribe, 'speech_clips', lambda audio, chunk_length: [])
+    model = types.SimpleNamespace(feature_extractor=types.SimpleNamespace(chunk_length=30))
+    assert batched_transcribe.transcribe_batch(model, [np.zeros(10), np.zeros(10)], 'ja') == [[], []]
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+import html_extract
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+
+
+def _mojim_page(lines: int, padding: int) -> str:
+    # 歌詞開頭的長度不同，分段餵入的邊界會落在不同的歌詞行中間
+    body = '<br />'.join([f'Intro {"x" * padding}'] + [f'Lyric line number {i} goes here' for i in range(lines)])
+    return ('<html><body><div class="fsZx3">Song <b>Title</b></div>'
+            f'<div id="fsZx2">{body}<!-- ad -->tail &amp; end</div></body></html>')
+
+
+@pytest.mark.parametrize('padding', range(0, 40, 3))
+def test_long_lyrics_match_beautifulsoup(padding):
+    html = _mojim_page(400, padding)
+    assert len(html) > 8192
+    title, lyrics = html_extract.mojim_lyrics(html)
+    soup = BeautifulSoup(html, 'html.parser')
+    assert lyrics == soup.select_one('div#fsZx2').get_text('\n').strip()
+    assert title == 'Song Title'
+    lines = lyrics.split('\n')
+    assert lines[237] == 'Lyric line number 236 goes here'
+    assert all(line.startswith('Lyric line number') for line in lines[1:401])
+
+
+def test_script_and_comment_text():
+    html = '<div id="fsZx2">a<script>skip()</script>b<!-- c -->d<br>e</div>'
+    soup = BeautifulSoup(html, 'html.parser')
+    assert html_extract.element_text(html, html_extract.MOJIM_LYRICS, '\n') == \
+        soup.select_one('div#fsZx2').get_text('\n')
+
+
+def test_genius_br_text():
+    html = '<div data-lyrics-container="true">one<br/>two<i>three</i></div>'
+    soup = BeautifulSoup(html, 'html.parser')
+    lyrics_div = soup.select_one('div[data-lyrics-container="true"]')
+    for br in lyrics_div.find_all('br'):
+        br.replace_with(soup.new_string('\n'))
+    assert html_extract.genius_lyrics(html) == (None, lyrics_div.get_text('\n').strip())
+
+
+def test_missing_element():
+    assert html_extract.mojim_lyrics('<div>nothing</div>') is None
+
+
+@pytest.mark.parametrize('name, extract, selector', [
+    ('mojim_lyrics.html', html_extract.mojim_lyrics, 'div#fsZx2'),
+])
+def test_fixture_matches_beautifulsoup(name, extract, selector):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        html = f.read()
+    soup = BeautifulSoup(html, 'html.parser')
+    _, lyrics = extract(html)
+    assert lyrics == soup.select_one(selector).get_text('\n').strip()
+
+
+def test_mojim_search_link():
+    with open(os.path.join(FIXTURES, 'mojim_search.html'), encoding='utf-8') as f:
+        html = f.read()
+    soup = BeautifulSoup(html, 'html.parser')
+    assert html_extract.mojim_search_link(html) == soup.select_one('div.mxsh_ll1 a')['href']
@@ -0,0 +1,83 @@
+import pytest
+
+from incremental_align import merge_alignment, offset_segments, plan_realignment
+
+
+def _segments():
+    return [
+        {"id": 0, "start": 1.0, "end": 3.0, "text": "first line"},
+        {"id": 1, "start": 4.0, "end": 6.0, "text": "second line"},
+        {"id": 2, "start": 7.0, "end": 9.0, "text": "third line"},
+    ]
+
+
+def test_whitespace_only_change_keeps_everything():
+    plan = plan_realignment(_segments(), "first  line\nsecond line\n\nthird line", 10.0)
+    assert plan.kept == _segments() and plan.regions == [] and plan.changed_ratio == 0.0
+
+
+def test_changed_line_is_realigned_between_anchors():
+    text = "first line\nsecond verse\nthird line"
+    plan = plan_realignment(_segments(), text, 10.0)
+    assert [segment["id"] for segment in plan.kept] == [0, 2]
+    assert len(plan.regions) == 1
+    region = plan.regions[0]
+    # 「second」仍在相同的區塊中，但段落被拆開，整行重新對齊
+    assert region.text == "second verse"
+    assert (region.start, region.end, region.position) == (3.0, 7.0, 1)
+    assert plan.changed_ratio == pytest.approx(len("secondverse") / len("firstlinesecondversethirdline"))
+
+
+def test_insertions_at_start_and_end_use_free_audio():
+    text = "intro\nfirst line\nsecond line\nthird line\noutro"
+    plan = plan_realignment(_segments(), text, 12.0)
+    assert len(plan.kept) == 3
+    assert [(r.text, r.start, r.end, r.position) for r in plan.regions] == [
+        ("intro", 0.0, 1.0, 0), ("outro", 9.0, 12.0, 3)]
+
+
+def test_inserted_line_keeps_neighbouring_segments():
+    # 「line」的 e 與「bridge」的 e 會被比對為相同字元，前一段仍需保留
+    plan = plan_realignment(_segments(), "first line\nsecond line\nbridge\nthird line", 10.0)
+    assert [segment["id"] for segment in plan.kept] == [0, 1, 2]
+    assert [(r.text, r.start, r.end, r.position) for r in plan.regions] == [("bridge", 6.0, 7.0, 2)]
+
+
+def test_no_free_audio_needs_full_realignment():
+    segments = _segments()
+    segments[0]["start"] = 0.0
+    assert plan_realignment(segments, "intro\nfirst line\nsecond line\nthird line", 10.0) is None
+    # 緊鄰的段落之間插入歌詞
+    segments[1]["start"] = 3.0
+    assert plan_realignment(segments, "first line\nbridge\nsecond line\nthird line", 10.0) is None
+
+
+def test_missing_timestamps_or_text_need_full_realignment():
+    segments = _segments()
+    segments[1]["start"] = None
+    assert plan_realignment(segments, "first line\nsecond line\nthird line", 10.0) is None
+    assert plan_realignment([], "first line", 10.0) is None
+    assert plan_realignment(_segments(), "  \n ", 10.0) is None
+
+
+def test_offset_segments_shifts_words_without_mutating():
+    segments = [{"start": 0.5, "end": 1.0, "text": "a",
+                 "words": [{"word": "a", "start": 0.5, "end": 1.0}, {"word": "b"}]}]
+    shifted = offset_segments(segments, 3.0)
+    assert shifted == [{"start": 3.5, "end": 4.0, "text": "a",
+                        "words": [{"word": "a", "start": 3.5, "end": 4.0}, {"word": "b"}]}]
+    assert segments[0]["start"] == 0.5 and segments[0]["words"][0]["start"] == 0.5
+
+
+def test_merge_alignment_inserts_regions_and_renumbers():
+    text = "intro\nfirst line\nsecond verse\nthird line"
+    previous = {"text": "old", "language": "en", "segments": _segments()}
+    plan = plan_realignment(_segments(), text, 10.0)
+    realigned = [
+        offset_segments([{"id": 0, "start": 0.1, "end": 0.9, "text": "intro"}], 0.0),
+        offset_segments([{"id": 0, "start": 0.2, "end": 3.5, "text": "second verse"}], 3.0),
+    ]
+    merged = merge_alignment(previous, plan, text, realigned)
+    assert merged["text"] == text and merged["language"] == "en"
+    assert [(s["id"], s["text"], s["start"]) for s in merged["segments"]] == [
+        (0, "intro", 0.1), (1, "first line", 1.0), (2, "second verse", 3.2), (3, "third line", 7.0)]
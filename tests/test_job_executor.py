@@ -0,0 +1,126 @@
+import asyncio
+import heapq
+import itertools
+
+import pytest
+
+from job_executor import JobCancelled, JobContext, JobExecutor, _Job
+
+
+def _single(context, value):
+    return value
+
+
+def _batch_fn(items):
+    return [args[0] * 10 for _, args in items]
+
+
+def _queue(executor, *jobs):
+    """依 (優先度, 鍵, 值) 建立排隊中的工作"""
+    counter = itertools.count()
+    created = []
+    for priority, key, value in jobs:
+        job = _Job(_single, (value,), {}, JobContext(None, None), None, key, _batch_fn, 3)
+        heapq.heappush(executor._queue, (-priority, next(counter), job))
+        created.append(job)
+    return created
+
+
+def test_take_batch_merges_same_key_by_priority():
+    executor = JobExecutor('test', 1)
+    _queue(executor, (0, 'a', 1), (5, 'b', 2), (0, 'a', 3), (2, 'a', 4), (1, 'a', 5))
+    _, _, leader = heapq.heappop(executor._queue)
+    assert executor._take_batch(leader) == [leader]
+
+    _, _, leader = heapq.heappop(executor._queue)
+    batch = executor._take_batch(leader)
+    # 最多 max_batch 個，其餘依優先度取出，同優先度先提交者優先
+    assert [job.args[0] for job in batch] == [4, 5, 1]
+    assert [item[2].args[0] for item in executor._queue] == [3]
+
+
+def test_take_batch_skips_cancelled_jobs():
+    executor = JobExecutor('test', 1)
+    first, second, third = _queue(executor, (1, 'a', 1), (0, 'a', 2), (0, 'a', 3))
+    second.context.cancel()
+    heapq.heappop(executor._queue)
+    assert executor._take_batch(first) == [first, third]
+    # 已取消的工作留在佇列中，由 _worker 略過
+    assert [item[2] for item in executor._queue] == [second]
+
+
+def test_take_batch_without_key():
+    executor = JobExecutor('test', 1)
+    job, _ = _queue(executor, (0, None, 1), (0, None, 2))
+    heapq.heappop(executor._queue)
+    assert executor._take_batch(job) == [job] and len(executor._queue) == 1
+
+
+def _run_batch(batch_fn, size):
+    """以 batch_fn 執行 size 個工作，回傳各工作的結果或例外"""
+    async def main():
+        loop = asyncio.get_running_loop()
+        batch = [_Job(_single, (i,), {}, JobContext(loop, None), loop.create_future(), 'a', batch_fn, size)
+                 for i in range(size)]
+        JobExecutor('test', 1)._run_batch(batch)
+        return await asyncio.gather(*(job.future for job in batch), return_exceptions=True)
+    return asyncio.run(main())
+
+
+def test_run_batch_reports_errors_per_job():
+    error = ValueError('bad audio')
+    results = _run_batch(lambda items: [1, error, JobCancelled()], 3)
+    assert results[0] == 1 and results[1] is error and isinstance(results[2], JobCancelled)
+
+
+def test_run_batch_fails_jobs_without_results():
+    results = _run_batch(lambda items: [1], 3)
+    assert results[0] == 1
+    assert all(isinstance(result, RuntimeError) for result in results[1:])
+
+
+def test_run_batch_error_fails_every_job():
+    def batch_fn(items):
+        raise MemoryError()
+    assert all(isinstance(result, MemoryError) for result in _run_batch(batch_fn, 2))
+
+
+def test_submit_merges_queued_jobs():
+    calls = []
+
+    def batch_fn(items):
+        calls.append([args[0] for _, args in items])
+        return _batch_fn(items)
+
+    async def main():
+        executor = JobExecutor('test', 1)
+        gate = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        def block(context):
+            asyncio.run_coroutine_threadsafe(gate.wait(), loop).result()
+
+        blocker = asyncio.ensure_future(executor.submit(block, priority=10))
+        await asyncio.sleep(0.05)
+        jobs = [asyncio.ensure_future(executor.submit(_single, value, priority=priority, batch_key=key,
+                                                      batch_fn=batch_fn, max_batch=3))
+                for priority, key, value in [(0, 'a', 1), (0, 'b', 2), (1, 'a', 3), (0, 'a', 4), (0, 'a', 5)]]
+        await asyncio.sleep(0.05)
+        jobs[3].cancel()
+        await asyncio.sleep(0)
+        gate.set()
+        await blocker
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        assert isinstance(results[3], asyncio.CancelledError)
+        return results[:3] + results[4:]
+
+    assert asyncio.run(main()) == [10, 2, 30, 50]
+    assert calls == [[3, 1, 5]]
+
+
+@pytest.mark.parametrize('max_batch', [0, 1])
+def test_max_batch_of_one_runs_alone(max_batch):
+    async def main():
+        executor = JobExecutor('test', 1)
+        return await executor.submit(_single, 7, batch_key='a', batch_fn=_batch_fn, max_batch=max_batch)
+    assert asyncio.run(main()) == 7
@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+import tracemalloc
+
+import pytest
+
+import job_profiler
+from job_profiler import ProfileRequest, profile_job
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_profiler, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(job_profiler.config, 'PROFILE_SAMPLE_INTERVAL', 0.001)
+    yield tmp_path
+    assert not tracemalloc.is_tracing()
+
+
+def _summary(request):
+    with open(os.path.join(request.directory, 'summary.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_without_request_does_nothing():
+    with profile_job(None, 'job'):
+        pass
+
+
+def test_sample_mode_writes_collapsed_stacks():
+    request = ProfileRequest('sample', 'video')
+    with profile_job(request, 'transcribe'):
+        sum(i * i for i in range(200000))
+    job = _summary(request)["jobs"][0]
+    assert job["mode"] == 'sample' and job["file"] == '0-transcribe.collapsed'
+    assert os.path.isfile(os.path.join(request.directory, job["file"]))
+
+
+def test_concurrent_cprofile_falls_back_to_sample():
+    first, second = ProfileRequest('cprofile', 'a'), ProfileRequest('cprofile', 'b')
+    started, release = threading.Event(), threading.Event()
+
+    def run_first():
+        with profile_job(first, 'align'):
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=run_first)
+    thread.start()
+    started.wait(5)
+    try:
+        with profile_job(second, 'align'):
+            pass
+    finally:
+        release.set()
+        thread.join()
+    assert _summary(first)["jobs"][0]["mode"] == 'cprofile'
+    assert _summary(first)["jobs"][0]["file"].endswith('.pstats')
+    assert _summary(second)["jobs"][0]["mode"] == 'sample'
+
+
+def test_setup_error_does_not_fail_the_job(monkeypatch):
+    def broken_start():
+        raise RuntimeError('tracemalloc unavailable')
+
+    monkeypatch.setattr(job_profiler._tracemalloc, 'start', broken_start)
+    request = ProfileRequest('cprofile', 'video')
+    ran = []
+    with profile_job(request, 'job'):
+        ran.append(True)
+    assert ran == [True] and request.jobs == []
+    # cProfile 已釋放，之後的分析可以再使用
+    assert job_profiler._cprofile_lock.acquire(blocking=False)
+    job_profiler._cprofile_lock.release()
+
+
+def test_job_errors_propagate_and_are_still_recorded():
+    request = ProfileRequest('sample', 'video')
+    with pytest.raises(ValueError):
+        with profile_job(request, 'job'):
+            raise ValueError('job failed')
+    assert len(request.jobs) == 1
+
+
+def test_peak_is_not_reset_by_a_later_job():
+    first, second = ProfileRequest('sample', 'a'), ProfileRequest('sample', 'b')
+    with profile_job(first, 'outer'):
+        data = bytearray(8 * 1024 * 1024)
+        del data
+        with profile_job(second, 'inner'):
+            pass
+    assert first.jobs[0]["peak_memory_mb"] >= 8
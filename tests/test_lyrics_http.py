@@ -0,0 +1,123 @@
+import gzip
+import json
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import lyrics_http
+from lyrics_http import VERSIONED_MAX_AGE, LyricsResponseStore, _etag_matches, choose_encoding
+
+VIDEO_ID = 'abcdefghijk'
+LYRICS = {"text": "歌詞", "segments": [{"start": 0.5, "end": 1.0, "text": "歌詞"}]}
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate', 'gzip'),
+    ('GZIP;q=0.5', 'gzip'),
+    ('gzip;q=0', None),
+    ('gzip;q=abc', None),
+    ('identity', None),
+    ('', None),
+    ('*', 'gzip'),
+    ('*;q=0, deflate', None),
+])
+def test_choose_encoding(header, expected, monkeypatch):
+    monkeypatch.setattr(lyrics_http, 'ENCODINGS', {'gzip': '.gz'})
+    assert choose_encoding(header) == expected
+
+
+def test_choose_encoding_prefers_brotli(monkeypatch):
+    monkeypatch.setattr(lyrics_http, 'ENCODINGS', {'br': '.br', 'gzip': '.gz'})
+    assert choose_encoding('gzip, br') == 'br'
+    assert choose_encoding('gzip, br;q=0') == 'gzip'
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('"v1"', True),
+    ('W/"v1"', True),
+    ('"v0", "v1"', True),
+    ('*', True),
+    ('"v2"', False),
+    ('v1', False),
+])
+def test_etag_matches(header, expected):
+    assert _etag_matches(header, '"v1"') is expected
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LyricsResponseStore(str(tmp_path))
+
+
+def test_publish_reuses_version_for_unchanged_content(store):
+    first = store.publish(VIDEO_ID, LYRICS)
+    pointer = os.path.join(store.cache_dir, VIDEO_ID, 'current')
+    mtime_ns = os.stat(pointer).st_mtime_ns
+    assert store.publish(VIDEO_ID, dict(LYRICS)) == first
+    assert os.stat(pointer).st_mtime_ns == mtime_ns
+    assert store.current(VIDEO_ID) == first and store.load(first) == LYRICS
+
+
+def test_publish_new_version_replaces_old_files(store):
+    first = store.publish(VIDEO_ID, LYRICS)
+    second = store.publish(VIDEO_ID, {**LYRICS, "text": "new"})
+    assert second.version != first.version
+    assert store.current(VIDEO_ID) == second
+    assert store.load(first) is None
+    names = os.listdir(os.path.join(store.cache_dir, VIDEO_ID))
+    assert all(name == 'current' or name.startswith(second.version) for name in names)
+
+
+def test_current_rejects_invalid_ids_and_unpublished(store):
+    assert store.current('../etc') is None
+    assert store.current(VIDEO_ID) is None
+
+
+@pytest.fixture
+def client(store):
+    async def lyrics(request):
+        response = await store.response(request, VIDEO_ID)
+        return response if response is not None else Response(status_code=404)
+
+    return TestClient(Starlette(routes=[Route('/lyrics', lyrics)]))
+
+
+def test_response_encodings_and_cache_control(store, client):
+    assert client.get('/lyrics').status_code == 404
+    published = store.publish(VIDEO_ID, LYRICS)
+
+    plain = client.get('/lyrics', headers={'Accept-Encoding': 'identity'})
+    assert plain.status_code == 200 and plain.json() == LYRICS
+    assert 'content-encoding' not in plain.headers
+    assert plain.headers['etag'] == published.etag()
+    assert plain.headers['cache-control'] == 'public, no-cache'
+    assert plain.headers['vary'] == 'Accept-Encoding'
+
+    compressed = client.get('/lyrics', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['content-encoding'] == 'gzip'
+    assert compressed.headers['etag'] == published.etag('gzip')
+    assert compressed.json() == LYRICS
+
+    versioned = client.get(f'/lyrics?v={published.version}', headers={'Accept-Encoding': 'identity'})
+    assert versioned.headers['cache-control'] == f'public, max-age={VERSIONED_MAX_AGE}, immutable'
+    stale = client.get('/lyrics?v=old', headers={'Accept-Encoding': 'identity'})
+    assert stale.headers['cache-control'] == 'public, no-cache'
+
+
+def test_not_modified(store, client):
+    published = store.publish(VIDEO_ID, LYRICS)
+    response = client.get('/lyrics', headers={'Accept-Encoding': 'gzip', 'If-None-Match': published.etag('gzip')})
+    assert response.status_code == 304 and response.content == b''
+    # 不同編碼的 ETag 不同
+    response = client.get('/lyrics', headers={'Accept-Encoding': 'identity', 'If-None-Match': published.etag('gzip')})
+    assert response.status_code == 200
+
+
+def test_precompressed_body_matches(store):
+    published = store.publish(VIDEO_ID, LYRICS)
+    with open(store._body_path(published, 'gzip'), 'rb') as f:
+        assert json.loads(gzip.decompress(f.read())) == LYRICS
@@ -0,0 +1,63 @@
+import pytest
+
+from lyrics_cache import normalize_text
+from lyrics_index import IndexEntry, LyricsIndex, trigrams
+
+
+def _entry(video_id, artist, title):
+    entry = IndexEntry(video_id, title, artist, 0)
+    entry.grams = {
+        'title': trigrams(normalize_text(title)),
+        'artist': trigrams(normalize_text(artist)),
+    }
+    return entry
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LyricsIndex(str(tmp_path), min_score=0.8)
+    for entry in (
+        _entry('us', 'Taylor Swift', 'Us'),
+        _entry('mine', 'Taylor Swift', 'Mine'),
+        _entry('love-story', 'Taylor Swift', 'Love Story'),
+        _entry('hello', 'Adele', 'Hello'),
+        _entry('yoru', 'YOASOBI', '夜に駆ける'),
+    ):
+        index._add_locked(entry)
+    return index
+
+
+@pytest.mark.parametrize('video_title', [
+    'Taylor Swift - The Story of Us (Official Video)',
+    'Taylor Swift - Mine Eyes',
+    'Adele - Hello from the other side cover',
+])
+def test_short_title_of_same_artist_is_not_matched(index, video_title):
+    assert index.lookup(video_title) is None
+
+
+@pytest.mark.parametrize('video_title, video_id', [
+    ('Taylor Swift - Love Story (Official Music Video)', 'love-story'),
+    ('Love Story - Taylor Swift [Lyrics]', 'love-story'),
+    ('Taylor Swift - Mine', 'mine'),
+    ('Adele - Hello', 'hello'),
+    ('YOASOBI「夜に駆ける」Official Music Video', 'yoru'),
+])
+def test_same_song_is_matched(index, video_title, video_id):
+    match = index.lookup(video_title)
+    assert match is not None and match.video_id == video_id
+
+
+def test_longer_title_is_preferred_over_contained_title(index):
+    index._add_locked(_entry('story-of-us', 'Taylor Swift', 'The Story of Us'))
+    assert index.lookup('Taylor Swift - The Story of Us (Official Video)').video_id == 'story-of-us'
+
+
+def test_exclude_skips_the_same_upload(index):
+    assert index.lookup('Adele - Hello', exclude='hello') is None
+
+
+def test_replaced_entry_drops_old_postings(index):
+    index._add_locked(_entry('hello', 'Adele', 'Someone Like You'))
+    assert index.lookup('Adele - Hello') is None
+    assert index.lookup('Adele - Someone Like You').video_id == 'hello'
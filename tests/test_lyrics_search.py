@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+import lyrics_search
+from http_client import request_failures
+from lyrics_cache import LyricsSearchCache
+from lyrics_fanout import SiteUnavailable, fan_out
+
+LYRICS = {"lines": [{"text": f"line {i}"} for i in range(8)], "source": "test"}
+
+
+async def _result(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def _error():
+    raise RuntimeError("boom")
+
+
+async def _failed_request():
+    # 與 HttpClient 重試後仍失敗時相同：記錄失敗的網址並回傳 None
+    request_failures.get().append("https://example.com/lyrics")
+    return None
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = LyricsSearchCache(str(tmp_path / 'lyrics_search.sqlite3'))
+    monkeypatch.setattr(lyrics_search, 'lyrics_search_cache', cache)
+    return cache
+
+
+def test_fan_out_returns_first_acceptable_result():
+    result, answered = asyncio.run(fan_out([_result(None), _result(LYRICS, 0.01)]))
+    assert result == LYRICS and answered
+
+
+def test_fan_out_all_misses_is_answered():
+    assert asyncio.run(fan_out([_result(None), _result({"lines": []})])) == (None, True)
+
+
+def test_fan_out_error_or_timeout_is_not_answered():
+    assert asyncio.run(fan_out([_result(None), _error()])) == (None, False)
+    assert asyncio.run(fan_out([_result(None), _result(LYRICS, 1.0)], timeout=0.05)) == (None, False)
+
+
+def test_track_site_turns_failed_requests_into_errors(cache):
+    with pytest.raises(SiteUnavailable):
+        asyncio.run(cache.track_site('site', _failed_request()))
+    assert asyncio.run(cache.track_site('site', _result(None))) is None
+
+
+@pytest.mark.parametrize('attempts, cached', [
+    (lambda cache: [cache.track_site('a', _result(None)), cache.track_site('b', _result(None))], True),
+    (lambda cache: [cache.track_site('a', _result(None)), cache.track_site('b', _failed_request())], False),
+])
+def test_negative_entry_only_when_every_site_answered(cache, monkeypatch, attempts, cached):
+    monkeypatch.setattr(lyrics_search.simple_scrawl, 'lyrics_attempts', lambda title, client: attempts(cache))
+    monkeypatch.setattr(lyrics_search.scrawl, 'lyrics_attempts', lambda title, client: [])
+    assert asyncio.run(lyrics_search.search_lyrics('Artist - Song')) is None
+    assert cache.get('Artist', 'Song') == ((True, None) if cached else (False, None))
@@ -0,0 +1,101 @@
+import math
+
+import numpy as np
+import pytest
+
+from lyrics_store import (LyricsDocument, decode, encode, lyrics_file, open_document, read_document,
+                          write_document)
+
+
+def _whisper_document():
+    segments = []
+    for i in range(12):
+        start = round(i * 3.217, 3)
+        segments.append({
+            "id": i,
+            "seek": i * 3000,
+            "start": start,
+            "end": round(start + 2.5, 3),
+            "text": f" 第{i}行の歌詞 line {i}",
+            "tokens": [50364 + i, 2 ** 40 + i, i],
+            "avg_logprob": round(-0.1234 * i, 4),
+            "words": [
+                {"word": " 第", "start": start, "end": round(start + 0.4, 3), "probability": 0.9876},
+                {"word": f"{i}行", "start": round(start + 0.4, 3), "end": round(start + 1.1, 3),
+                 "probability": 0.5},
+            ],
+        })
+    # 缺少欄位、None、沒有單字的段落
+    segments[3].pop("words")
+    segments[4]["words"] = []
+    segments[5]["start"] = None
+    segments[6]["temperature"] = 0.0
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "language": "ja",
+        "segments": segments,
+        "ori_dict": {"text": "x" * 1000},
+    }
+
+
+@pytest.mark.parametrize('document', [
+    _whisper_document(),
+    {"title": "夜に駆ける", "artist": "YOASOBI", "lyrics": "a\nb",
+     "lines": [{"text": "a", "time": None}, {"text": "b", "time": 1.5}], "source": "test"},
+    {"segments": [{"flag": True, "big": 2 ** 70, "value": float('inf'), "mixed": [1, "a"]}], "empty": []},
+    {},
+])
+def test_round_trip(document):
+    assert decode(encode(document)) == document
+
+
+def test_round_trip_keeps_nan_as_json():
+    decoded = decode(encode({"segments": [{"start": float('nan')}, {"start": 1.0}]}))
+    assert math.isnan(decoded["segments"][0]["start"]) and decoded["segments"][1]["start"] == 1.0
+
+
+def test_long_floats_keep_float32_precision():
+    # 無法以固定小數位數還原的值保存為 float32
+    values = [0.987654321, -1.3580237, 1e-9]
+    decoded = decode(encode({"words": [{"probability": value} for value in values]}))
+    assert [word["probability"] for word in decoded["words"]] == pytest.approx(values, rel=1e-6)
+
+
+def test_lazy_table_access():
+    document = LyricsDocument(encode(_whisper_document()))
+    table = document.table("segments")
+    assert len(table) == 12
+    assert table.value("text", 2) == " 第2行の歌詞 line 2"
+    assert table.value("temperature", 0, "missing") == "missing"
+    assert table.record(3) == _whisper_document()["segments"][3]
+
+    starts = table.numbers("start")
+    assert np.isnan(starts[5]) and starts[1] == pytest.approx(3.217, abs=1e-6)
+
+    words, offsets = table.child("words")
+    # 沒有 words 的段落沒有子記錄
+    assert offsets.tolist() == [0, 2, 4, 6, 6, 6, 8, 10, 12, 14, 16, 18, 20]
+    assert words.column("word")[offsets[2]:offsets[3]] == [" 第", "2行"]
+    assert document.table("segments") is table
+
+
+def test_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        LyricsDocument(b'JSON\x01\x00\x00\x00\x00\x00\x00\x00')
+
+
+@pytest.mark.parametrize('suffix', ['.lyr', '.json'])
+def test_write_and_read_files(tmp_path, suffix):
+    document = _whisper_document()
+    path = str(tmp_path / f'abcdefghijk{suffix}')
+    write_document(path, document)
+    assert read_document(path) == document
+    assert open_document(path).to_json() == document
+    assert lyrics_file('abcdefghijk', str(tmp_path)) == path
+    assert [p.name for p in tmp_path.iterdir()] == [f'abcdefghijk{suffix}']
+
+
+def test_columnar_file_is_preferred(tmp_path):
+    write_document(str(tmp_path / 'abcdefghijk.json'), {"text": "old"})
+    write_document(str(tmp_path / 'abcdefghijk.lyr'), {"text": "new"})
+    assert read_document(lyrics_file('abcdefghijk', str(tmp_path))) == {"text": "new"}
@@ -0,0 +1,110 @@
+import pytest
+
+from lyrics_timeline import Intervals, LyricsTimeline
+
+
+@pytest.fixture
+def overlapping():
+    # 0: [0, 10] 長段落，1: [2, 4]，2: [3, 5]，3: [5, 6] 與 2 相接
+    return Intervals([0.0, 2.0, 3.0, 5.0], [10.0, 4.0, 5.0, 6.0])
+
+
+@pytest.mark.parametrize('t, covering, latest', [
+    (1.0, [0], 0),
+    (3.5, [0, 1, 2], 2),
+    (4.5, [0, 2], 2),
+    (5.0, [0, 2, 3], 3),
+    (7.0, [0], 0),
+    (10.0, [0], 0),
+    (10.5, [], None),
+    (-1.0, [], None),
+])
+def test_overlapping_intervals(overlapping, t, covering, latest):
+    assert overlapping.covering(t) == covering
+    assert overlapping.latest(t) == latest
+
+
+def test_touching_boundaries_include_both_ends():
+    intervals = Intervals([0.0, 2.0], [2.0, 4.0])
+    assert intervals.covering(2.0) == [0, 1] and intervals.latest(2.0) == 1
+    assert intervals.next_after(2.0) is None and intervals.next_after(1.9) == 1
+
+
+def test_unsorted_input_keeps_original_indices():
+    intervals = Intervals([5.0, 1.0, 3.0], [6.0, 2.0, 4.0])
+    assert intervals.order == [1, 2, 0]
+    assert intervals.latest(3.5) == 2 and intervals.next_after(0.0) == 1
+
+
+@pytest.mark.parametrize('starts, ends', [
+    ([0.0, None, 2.0], [1.0, 3.0, 3.0]),
+    ([0.0, 1.0, 2.0], [1.0, float('nan'), 3.0]),
+    ([0.0, True, 2.0], [1.0, 3.0, 3.0]),
+    ([0.0, '1', 2.0], [1.0, 3.0, 3.0]),
+])
+def test_missing_timestamps_are_skipped(starts, ends):
+    intervals = Intervals(starts, ends)
+    assert len(intervals) == 2
+    assert intervals.covering(1.5) == [] and intervals.covering(2.5) == [2]
+
+
+def test_to_index_rounds_outwards_to_milliseconds():
+    index = Intervals([1.2345, 0.1, 3.0], [2.0001, 5.0, 3.0009]).to_index()
+    assert index["order"] == [1, 0, 2]
+    assert index["starts"] == [0.1, 1.234, 3.0]
+    assert index["max_ends"] == [5.0, 5.0, 5.0]
+    index = Intervals([1.2345], [2.0001]).to_index()
+    assert index == {"order": [0], "starts": [1.234], "max_ends": [2.001]}
+
+
+def test_to_index_never_narrows_intervals():
+    # 時間戳為四捨五入到固定小數位數的值
+    starts = [round(i * 0.0007 + 1, 4) for i in range(500)]
+    ends = [round(start + 0.0004, 4) for start in starts]
+    index = Intervals(starts, ends).to_index()
+    assert all(rounded <= value for rounded, value in zip(index["starts"], starts))
+    assert all(rounded >= value for rounded, value in zip(index["max_ends"], ends))
+
+
+def _timeline():
+    return LyricsTimeline.from_json({"segments": [
+        {"start": 0.0, "end": 5.0, "text": "first",
+         "words": [{"word": "a", "start": 0.0, "end": 2.0}, {"word": "b", "start": 4.1, "end": 4.6}]},
+        {"start": 4.0, "end": 8.0, "text": "second",
+         "words": [{"word": "c", "start": 3.9, "end": 4.5}, {"word": "d", "start": 6.0, "end": 8.0}]},
+        {"start": None, "end": None, "text": "unaligned"},
+        {"start": 9.0, "end": 10.0, "text": None, "words": [{"word": "e", "start": float('nan'), "end": 10.0}]},
+    ]})
+
+
+def test_word_in_current_segment_is_preferred():
+    timeline = _timeline()
+    # 最晚開始的單字是第一段的 b，但目前段落為第二段
+    assert timeline.words.latest(4.2) == 1
+    result = timeline.at(4.2)
+    assert result["segments"] == [0, 1]
+    assert result["segment"] == {"index": 1, "start": 4.0, "end": 8.0, "text": "second"}
+    assert result["word"] == {"segment": 1, "index": 0, "start": 3.9, "end": 4.5, "word": "c"}
+    assert result["next"] == {"index": 3, "start": 9.0}
+
+
+def test_word_falls_back_outside_segment():
+    timeline = _timeline()
+    assert timeline.word_at(4.55, 1) == 1
+    assert timeline.word_at(1.0) == 0
+
+
+def test_at_between_and_after_segments():
+    timeline = _timeline()
+    gap = timeline.at(8.5)
+    assert gap["segment"] is None and gap["word"] is None and gap["segments"] == []
+    assert gap["next"] == {"index": 3, "start": 9.0}
+    end = timeline.at(9.5)
+    # 沒有文字的段落以空字串表示，缺少開始時間的單字不列入
+    assert end["segment"]["text"] == '' and end["word"] is None and end["next"] is None
+
+
+def test_unaligned_lyrics_have_empty_timeline():
+    timeline = LyricsTimeline.from_json({"text": "a\nb"})
+    assert timeline.at(1.0) == {"t": 1.0, "segments": [], "segment": None, "word": None, "next": None}
+    assert timeline.to_index()["word_offsets"] == [0]
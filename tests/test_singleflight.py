@@ -0,0 +1,88 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_do_joins_running_call():
+    flights = SingleFlight()
+    runs = []
+
+    async def work(progress):
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return len(runs)
+
+    async def main():
+        return await asyncio.gather(flights.do('key', work), flights.do('key', work))
+
+    assert asyncio.run(main()) == [1, 1]
+
+
+def _work(events, name, fail=False):
+    async def work(progress):
+        events.append(f'{name} start')
+        await asyncio.sleep(0.01)
+        events.append(f'{name} end')
+        if fail:
+            raise RuntimeError(name)
+        return name
+    return work
+
+
+def test_forced_call_waits_for_unforced_call():
+    flights = SingleFlight()
+    events = []
+
+    async def main():
+        first = asyncio.ensure_future(flights.do('key', _work(events, 'first', fail=True)))
+        await asyncio.sleep(0)
+        forced = asyncio.ensure_future(flights.do('key', _work(events, 'forced'), force=True))
+        joined = asyncio.ensure_future(flights.do('key', _work(events, 'joined')))
+
+        async def after_first():
+            await asyncio.gather(first, return_exceptions=True)
+            return await flights.do('key', _work(events, 'late'))
+
+        # 第一個工作結束後才加入的請求，不會搶先開始不強制的工作
+        late = asyncio.ensure_future(after_first())
+        results = await asyncio.gather(first, forced, joined, late, return_exceptions=True)
+        assert isinstance(results[0], RuntimeError) and isinstance(results[2], RuntimeError)
+        return results[1:2] + results[3:]
+
+    assert asyncio.run(main()) == ['forced', 'forced']
+    assert events == ['first start', 'first end', 'forced start', 'forced end']
+    assert not flights.in_flight('key')
+
+
+def test_forced_calls_join_each_other():
+    flights = SingleFlight()
+    events = []
+
+    async def main():
+        forced = asyncio.ensure_future(flights.do('key', _work(events, 'forced'), force=True))
+        await asyncio.sleep(0)
+        return await asyncio.gather(forced, flights.do('key', _work(events, 'again'), force=True),
+                                    flights.do('key', _work(events, 'plain')))
+
+    assert asyncio.run(main()) == ['forced', 'forced', 'forced']
+    assert events == ['forced start', 'forced end']
+
+
+def test_forced_call_receives_progress_while_waiting():
+    flights = SingleFlight()
+    received = []
+
+    async def first(progress):
+        await asyncio.sleep(0.01)
+        progress('segments_partial', [1])
+        return 'first'
+
+    async def main():
+        running = asyncio.ensure_future(flights.do('key', first))
+        await asyncio.sleep(0)
+        result = await flights.do('key', _work([], 'forced'), lambda stage, value: received.append(stage),
+                                  force=True)
+        return await running, result
+
+    assert asyncio.run(main()) == ('first', 'forced')
+    assert received == ['segments_partial']
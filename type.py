@@ -1,6 +1,30 @@
 from typing import TypedDict, Union, Literal, Optional, Any, Dict, List, Tuple
 from enum import Enum
 
+class LinkPayload(TypedDict, total=False):
+    url: str
+    force_realign: bool
+    priority: int
+    stream: bool
+    inline: bool
+    profile: Union[bool, str]
+
 class WebsocktMessageType(TypedDict):
     type: Literal["link","get_json","get_audio"]
-    payload: Union[str, Dict[str, Any], None]
\ No newline at end of file
+    payload: Union[str, LinkPayload, Dict[str, Any], None]
+
+class SegmentWord(TypedDict):
+    word: str
+    start: float
+    end: float
+    probability: float
+
+class Segment(TypedDict):
+    start: float
+    end: float
+    text: str
+    words: List[SegmentWord]
+
+class WebsocktServerMessageType(TypedDict):
+    type: Literal["audio","lyrics","json","progress","segments_partial","profile","error"]
+    payload: Union[str, List[Segment], Dict[str, Any], None]
\ No newline at end of file
@@ -1,25 +1,62 @@
+import math
 import re
 from fastapi import FastAPI, Request, Response, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse
 from type import WebsocktMessageType
-from yt_dlp import YoutubeDL
 from whisper_fn import transcribe_audio
-from simple_scrawl import scrawl_lyrics_http
+from lyrics_search import search_lyrics
+from http_client import http_client
 import os
-import json
 import requests
-from typing import Optional, Dict, Any
-import stable_whisper
+from typing import Optional, Dict, Any, Awaitable, Set, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import time
+import config
+from model_registry import model_registry
+from host_tuning import ensure_tuned
+from align_cache import alignment_cache
+from incremental_align import merge_alignment, offset_segments, plan_realignment
+from job_executor import JobContext, ProgressCallback, download_executor, inference_executor
+from singleflight import job_flights
+from chunked_transcribe import shutdown_pool
+from stem_cache import stem_cache
+from pcm_cache import SAMPLE_RATE, pcm_cache
+from audio_stream import file_response
+from lyrics_index import lyrics_index
+from lyrics_store import load_lyrics, lyrics_exists, save_lyrics
+from lyrics_http import VIDEO_ID_PATTERN, lyrics_responses
+from lyrics_timeline import LyricsTimeline, timeline_cache
+from job_profiler import MODES as PROFILE_MODES, ProfileRequest, profile_registry, profile_request
+from metrics import REQUEST_SECONDS, STAGE_SECONDS, WS_MESSAGES, log_event, record_cache, registry
+from downloader import audio_media_type, download_audio, fetch_video_info, find_audio_path, read_info
 
 YTMUSIC_LINK_MATCH = re.compile(
     r"^(https:\/\/)?(music\.)?youtube\.com\/watch\?v=([a-zA-Z0-9-_]{11}).*")
 
 YTMUSIC_ID_MATCH = re.compile(r"([a-zA-Z0-9-_]{11})")
 
+# 客戶端可指定的工作優先度範圍（批次工作為 -1）
+PRIORITY_RANGE = (-10, 10)
+
 if not os.path.exists('./downloads'):
     os.makedirs('./downloads/audio')
     os.makedirs('./downloads/lyrics')
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 本主機尚未調校時先調校（AUTO_TUNE_ON_STARTUP），再以調校後的設定載入模型
+    await asyncio.to_thread(ensure_tuned)
+    # 啟動時預先載入模型，避免第一個請求等待模型載入
+    await asyncio.to_thread(model_registry.preload, config.WHISPER_PRELOAD_MODELS)
+    yield
+    shutdown_pool()
+    # 關閉爬蟲共用的連線池
+    await http_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/")
@@ -29,183 +66,497 @@ def root():
     )
 
 
-async def reposition_lyrics_with_stable_ts(audio_path: str, lyrics_json: Dict[str, Any]) -> Dict[str, Any]:
+def _load_align_audio(ctx: JobContext, audio_path: str) -> Any:
+    """讀取對齊使用的音訊（人聲或原始音訊）"""
+    if config.ALIGN_USE_VOCAL_STEM:
+        # 使用快取的人聲分離結果，第一次才會執行 Demucs
+        ctx.report('denoise', None)
+        align_audio = stem_cache.get_vocal_stem(audio_path)
+    else:
+        # 使用快取的解碼結果，不必再次呼叫 ffmpeg
+        ctx.report('decode', None)
+        align_audio = pcm_cache.get_pcm(audio_path)
+    ctx.annotate(model=config.WHISPER_MODEL, audio_seconds=round(align_audio.shape[-1] / SAMPLE_RATE, 3))
+    return align_audio
+
+
+def _run_alignment(ctx: JobContext, align_audio: Any, text: str, align_options: Dict[str, Any]) -> Dict[str, Any]:
+    ctx.report('load_model', None)
+    with model_registry.acquire(config.WHISPER_MODEL) as model:
+        ctx.report('align', 0)
+        result = model.align(  # type: ignore
+            align_audio, text, progress_callback=ctx.progress_callback('align'), **align_options)
+    return result.to_dict()
+
+
+def _align_lyrics(ctx: JobContext, audio_path: str, text: str, align_options: Dict[str, Any]) -> Dict[str, Any]:
+    """在推論執行緒中執行對齊"""
+    return _run_alignment(ctx, _load_align_audio(ctx, audio_path), text, align_options)
+
+
+def _align_lyrics_incremental(ctx: JobContext, audio_path: str, previous: Dict[str, Any], text: str,
+                              align_options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    依同一段音訊上次的對齊結果增量對齊：未變更的段落沿用時間戳，只對齊變更處前後錨點之間的音訊
+    變更太多或無法增量時改為整首對齊
+    """
+    align_audio = _load_align_audio(ctx, audio_path)
+    plan = plan_realignment(previous.get('segments') or [], text, align_audio.shape[-1] / SAMPLE_RATE)
+    if plan is None or plan.changed_ratio > config.INCREMENTAL_ALIGN_MAX_CHANGE:
+        ctx.annotate(incremental=False)
+        return _run_alignment(ctx, align_audio, text, align_options)
+    ctx.annotate(incremental=True, realigned_regions=len(plan.regions),
+                 realigned_seconds=round(sum(region.end - region.start for region in plan.regions), 3))
+    realigned = []
+    if plan.regions:
+        ctx.report('load_model', None)
+        with model_registry.acquire(config.WHISPER_MODEL) as model:
+            for i, region in enumerate(plan.regions):
+                ctx.report('align', i / len(plan.regions))
+                window = align_audio[..., int(region.start * SAMPLE_RATE):int(region.end * SAMPLE_RATE)]
+                result = model.align(window, region.text, **align_options)  # type: ignore
+                realigned.append(offset_segments(result.to_dict()['segments'], region.start))
+        ctx.report('align', 1)
+    return merge_alignment(previous, plan, text, realigned)
+
+
+def _lookup_alignment(audio_path: str, text: str, cache_options: Dict[str, Any],
+                      force_realign: bool) -> Tuple[str, str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    計算對齊快取鍵並查詢快取（需要讀取整個音訊檔計算雜湊，在執行緒中執行）
+    回傳 (快取鍵, 音訊鍵, 快取的對齊結果, 同一段音訊上次的對齊結果)
+    """
+    cache_key = alignment_cache.make_key(audio_path, text, config.WHISPER_MODEL, cache_options)
+    audio_key = alignment_cache.make_audio_key(audio_path, config.WHISPER_MODEL, cache_options)
+    if force_realign:
+        return cache_key, audio_key, None, None
+    cached = alignment_cache.get(cache_key)
+    if cached is not None or not config.INCREMENTAL_ALIGN:
+        return cache_key, audio_key, cached, None
+    return cache_key, audio_key, None, alignment_cache.latest(audio_key)
+
+
+async def reposition_lyrics_with_stable_ts(audio_path: str, lyrics_json: Dict[str, Any],
+                                           force_realign: bool = False, priority: int = 0,
+                                           on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
     """
     使用stable-ts重新定位歌詞時間戳
+    相同的音訊與歌詞會直接使用對齊快取，force_realign 為 True 時強制重新對齊
+    同一段音訊已對齊過其他版本的歌詞時，只重新對齊修改的部分
     """
     try:
-        # 這裡需要根據stable-ts的API進行實際實現
-        # 假設stable-ts能接受音頻路徑和原始歌詞，然後返回調整後的歌詞
-        # 實際實現可能需要命令行調用或API調用
+        # whisper 產生的歌詞使用 text，爬取的歌詞使用 lyrics
+        text = lyrics_json.get('text') or lyrics_json.get('lyrics', '')
+        align_options = {"language": lyrics_json.get('language')}
+        cache_options = {**align_options, "vocal_stem": config.ALIGN_USE_VOCAL_STEM}
+        cache_key, audio_key, cached, previous = await asyncio.to_thread(
+            _lookup_alignment, audio_path, text, cache_options, force_realign)
+        if cached is not None:
+            return cached
 
-        # 示例實現：
-        # from stable_ts import process_audio
-        # return process_audio(audio_path, lyrics_json)
-
-        # 目前只是原樣返回
-        text = lyrics_json.get('text', '')
-        model = stable_whisper.load_faster_whisper("medium")
-        result = model.align(  # type: ignore
-            audio_path, text)
-        return result.to_json()
+        if previous is not None:
+            positioned_lyrics = await inference_executor.submit(
+                _align_lyrics_incremental, audio_path, previous, text, align_options,
+                priority=priority, on_progress=on_progress)
+        else:
+            positioned_lyrics = await inference_executor.submit(
+                _align_lyrics, audio_path, text, align_options, priority=priority, on_progress=on_progress)
+        await asyncio.to_thread(alignment_cache.put, cache_key, positioned_lyrics, audio_key)
+        return positioned_lyrics
     except Exception as e:
         print(f"Stable-TS repositioning error: {e}")
         return lyrics_json
 
 
-async def get_lyrics_by_video_name(video_name: str, video_id: str) -> Dict[str, Any]:
+async def get_lyrics_by_video_name(video_name: str, video_id: str, force_realign: bool = False, priority: int = 0,
+                                   on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
     """
     根據影片名稱獲取歌詞
     1. 先嘗試HTTP爬取
     2. 若無法獲取，使用whisper
-    3. 最後使用stable-ts重新定位歌詞時間戳
+    3. 最後使用stable-ts重新定位歌詞時間戳（有快取時直接使用，除非 force_realign）
+    同一首歌同時被多次請求時只處理一次；force_realign 時不沿用可能使用了對齊快取的處理，
+    先等待其結束再重新處理
+    """
+    return await job_flights.do(
+        ('lyrics', video_id),
+        lambda progress: _get_and_publish_lyrics(
+            video_name, video_id, force_realign, priority, progress),
+        on_progress, force=force_realign)
+
+
+async def _get_and_publish_lyrics(video_name: str, video_id: str, force_realign: bool, priority: int,
+                                  on_progress: Optional[ProgressCallback]) -> Dict[str, Any]:
+    lyrics_json = await _get_lyrics_by_video_name(video_name, video_id, force_realign, priority, on_progress)
+    # 附上預先計算的時間軸索引，前端以二分搜尋找出目前的段落與單字
+    with STAGE_SECONDS.time(stage='timeline'):
+        timeline = await asyncio.to_thread(LyricsTimeline.from_json, lyrics_json)
+    lyrics_json = {**lyrics_json, "timeline": timeline.to_index()}
+    # 預先壓縮處理完成的歌詞（JSON 序列化與壓縮），供 /lyrics/{video_id} 回應
+    with STAGE_SECONDS.time(stage='publish'):
+        await asyncio.to_thread(lyrics_responses.publish, video_id, lyrics_json)
+    return lyrics_json
+
+
+def _find_indexed_lyrics(video_name: str, video_id: str) -> Optional[Dict[str, Any]]:
     """
-    lyrics_path = f'./downloads/lyrics/{video_id}.json'
-    audio_path = f'./downloads/audio/{video_id}.mp3'
+    從已下載歌詞的索引找出同一首歌，回傳其歌詞文字（時間戳需對這次的音訊重新對齊）
+    """
+    match = lyrics_index.find(video_name, exclude=video_id)
+    record_cache('lyrics_index', match is not None)
+    if match is None:
+        return None
+    try:
+        matched = load_lyrics(match.video_id)
+    except (OSError, ValueError) as e:
+        print(f"讀取已下載歌詞錯誤 ({match.video_id}): {e}")
+        return None
+    if matched is None:
+        return None
+    text = matched.get('lyrics') or matched.get('text')
+    if not text:
+        return None
+    print(f"沿用已下載的歌詞: {match.video_id} (相似度 {match.score:.2f})")
+    lyrics_json = {k: matched[k] for k in ('title', 'artist', 'language', 'lines') if matched.get(k)}
+    lyrics_json.update({"lyrics": text, "source": matched.get('source', 'whisper'), "reused_from": match.video_id})
+    return lyrics_json
+
+
+def _save_and_index_lyrics(video_id: str, lyrics_json: Dict[str, Any]):
+    """保存歌詞並更新已下載歌詞的索引（編碼與寫檔，在執行緒中執行）"""
+    save_lyrics(video_id, lyrics_json)
+    lyrics_index.update(video_id)
+
+
+async def _get_lyrics_by_video_name(video_name: str, video_id: str, force_realign: bool, priority: int,
+                                    on_progress: Optional[ProgressCallback]) -> Dict[str, Any]:
+    audio_path = await asyncio.to_thread(find_audio_path, video_id)
+    if audio_path is None:
+        raise FileNotFoundError(f"Audio file not found: {video_id}")
 
     # 檢查是否已有歌詞文件
-    if os.path.exists(lyrics_path):
-        with open(lyrics_path, 'r', encoding='utf-8') as f:
-            lyrics_json = json.load(f)
+    with STAGE_SECONDS.time(stage='load_lyrics'):
+        lyrics_json = await asyncio.to_thread(load_lyrics, video_id)
+    if lyrics_json is not None:
         # 使用stable-ts重新定位
-        return await reposition_lyrics_with_stable_ts(audio_path, lyrics_json)
+        return await reposition_lyrics_with_stable_ts(
+            audio_path, lyrics_json, force_realign, priority, on_progress)
+
+    # 1. 已下載過同一首歌（不同上傳）時沿用其歌詞，不必爬取或轉錄
+    with STAGE_SECONDS.time(stage='lyrics_index'):
+        lyrics_json = await asyncio.to_thread(_find_indexed_lyrics, video_name, video_id)
 
-    # 1. 嘗試通過HTTP爬取歌詞
-    lyrics_json = scrawl_lyrics_http(video_name)
+    # 2. 嘗試通過HTTP爬取歌詞（所有網站同時查詢）
+    if not lyrics_json:
+        with STAGE_SECONDS.time(stage='lyrics_search'):
+            lyrics_json = await search_lyrics(video_name)
 
     if lyrics_json:
         # 保存爬取的歌詞
-        with open(lyrics_path, 'w', encoding='utf-8') as f:
-            json.dump(lyrics_json, f, ensure_ascii=False, indent=2)
+        await asyncio.to_thread(_save_and_index_lyrics, video_id, lyrics_json)
         # 使用stable-ts重新定位
-        positioned_lyrics = await reposition_lyrics_with_stable_ts(audio_path, lyrics_json)
+        positioned_lyrics = await reposition_lyrics_with_stable_ts(
+            audio_path, lyrics_json, force_realign, priority, on_progress)
         return positioned_lyrics
 
-    # 2. 若HTTP爬取失敗，使用whisper進行轉錄
-    await transcribe_audio(video_id, model_name='medium')
+    # 3. 若HTTP爬取失敗，使用whisper進行轉錄
+    await transcribe_audio(video_id, model_name=config.WHISPER_MODEL,
+                           priority=priority, on_progress=on_progress)
 
     # 讀取whisper生成的歌詞
-    with open(lyrics_path, 'r', encoding='utf-8') as f:
-        lyrics_json = json.load(f)
+    lyrics_json = await asyncio.to_thread(load_lyrics, video_id)
+    if lyrics_json is None:
+        raise FileNotFoundError(f"Lyrics file not found: {video_id}")
 
-    # 3. 使用stable-ts重新定位
-    positioned_lyrics = await reposition_lyrics_with_stable_ts(audio_path, lyrics_json)
+    # 4. 使用stable-ts重新定位
+    positioned_lyrics = await reposition_lyrics_with_stable_ts(
+        audio_path, lyrics_json, force_realign, priority, on_progress)
 
     # 保存處理後的歌詞
-    with open(lyrics_path, 'w', encoding='utf-8') as f:
-        json.dump(positioned_lyrics, f, ensure_ascii=False, indent=2)
+    await asyncio.to_thread(_save_and_index_lyrics, video_id, positioned_lyrics)
 
     return positioned_lyrics
 
 
-@app.get("/audio/{dir}")
+@app.api_route("/audio/{dir}", methods=["GET", "HEAD"])
 async def get_audio(request: Request, dir: str):
+    # 只允許 downloads/audio 底下的檔案
+    if os.path.basename(dir) != dir or dir.startswith('.'):
+        raise HTTPException(status_code=404, detail="File not found")
     file_path = f'./downloads/audio/{dir}'
-    if not os.path.exists(file_path):
+    if not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="File not found")
-    header_range = request.headers.get('Range')
-    if header_range:
-        start, end = header_range.replace('bytes=', '').split('-')
-        start = int(start)
-        end = int(end) if end else None
-        file_size = os.path.getsize(file_path)
-        if end is None or end > file_size - 1:
-            end = file_size - 1
-        headers = {
-            'Content-Range': f'bytes {start}-{end}/{file_size}',
-            'Accept-Ranges': 'bytes',
-            'Content-Length': str(end - start + 1),
-            'Content-Type': 'audio/mpeg',
-        }
-        with open(file_path, 'rb') as f:
-            f.seek(start)
-            return Response(content=f.read(end - start + 1), headers=headers, media_type="audio/mpeg", status_code=206)
+    return file_response(request, file_path, audio_media_type(file_path))
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus 格式的執行指標"""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _require_profiling():
+    if not config.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+
+
+@app.post("/admin/profile/{video_id}")
+def arm_profile(video_id: str, mode: str = 'sample'):
+    """指定歌曲下一次的 link 請求啟用分析"""
+    _require_profiling()
+    if not VIDEO_ID_PATTERN.fullmatch(video_id) or mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail="Invalid video id or mode")
+    request = profile_registry.arm(video_id, mode)
+    return {"profile_id": request.profile_id, "url": request.url}
+
+
+@app.get("/profiles")
+def list_profiles():
+    _require_profiling()
+    return profile_registry.list()
+
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """分析摘要：各工作的耗時、取樣數、記憶體峰值與結果檔案"""
+    _require_profiling()
+    summary = profile_registry.summary(profile_id) if os.path.basename(profile_id) == profile_id else None
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return summary
+
+
+@app.get("/profiles/{profile_id}/{name}")
+def get_profile_file(profile_id: str, name: str):
+    """下載 .collapsed（flame graph）或 .pstats 檔案"""
+    _require_profiling()
+    file_path = profile_registry.file_path(profile_id, name)
+    if file_path is None or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(file_path, filename=name,
+                        media_type='text/plain' if name.endswith('.collapsed') else 'application/octet-stream')
+
+
+@app.get("/lyrics/{video_id}")
+async def get_lyrics(request: Request, video_id: str):
+    response = await lyrics_responses.response(request, video_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Lyrics not found")
+    return response
+
+
+@app.get("/lyrics/{video_id}/at")
+async def get_lyrics_at(video_id: str, t: float):
+    """t 秒時正在唱的段落與單字"""
+    if not math.isfinite(t):
+        raise HTTPException(status_code=422, detail="t must be a finite number")
+    timeline = await asyncio.to_thread(timeline_cache.get, video_id)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail="Lyrics not found")
+    return timeline.at(t)
+
+
+async def handle_link(websocket: WebSocket, payload: Any):
+    """處理 link 訊息：下載音頻、取得歌詞並送回客戶端"""
+    force_realign = False
+    priority = 0
+    stream = True
+    inline = True
+    profile_mode: Optional[str] = None
+    # payload 可為連結字串，或 {"url": ..., "force_realign": ..., "priority": ..., "stream": ..., "inline": ..., "profile": ...}
+    # inline 為 False 時不直接送出歌詞，改為送出 /lyrics/{video_id} 的網址與 ETag
+    # profile 為 true / "sample" / "cprofile" 時分析此請求提交的工作（需啟用 PROFILING_ENABLED）
+    if isinstance(payload, dict):
+        force_realign = bool(payload.get("force_realign", False))
+        try:
+            priority = int(payload.get("priority", 0))
+        except (TypeError, ValueError, OverflowError):
+            await websocket.send_json({"type": "error", "payload": "Invalid priority"})
+            return
+        priority = min(max(priority, PRIORITY_RANGE[0]), PRIORITY_RANGE[1])
+        stream = bool(payload.get("stream", True))
+        inline = bool(payload.get("inline", True))
+        profile = payload.get("profile")
+        if profile:
+            profile_mode = profile if profile in PROFILE_MODES else 'sample'
+        payload = payload.get("url")
+    if not isinstance(payload, str):
+        await websocket.send_json({"type": "error", "payload": "Invalid payload"})
+        return
+    if not YTMUSIC_LINK_MATCH.match(payload):
+        await websocket.send_json({"type": "error", "payload": "Invalid link"})
+        return
+    video_id = YTMUSIC_ID_MATCH.search(
+        payload)[0]  # type: ignore
+    if not video_id:
+        await websocket.send_json({"type": "error", "payload": "Invalid link"})
+        return
+
+    # 分析設定只影響此任務（websocket 迴圈為每個請求建立獨立的任務）
+    profile: Optional[ProfileRequest] = None
+    if config.PROFILING_ENABLED:
+        profile = profile_registry.take(video_id)
+        if profile is None and profile_mode is not None:
+            profile = ProfileRequest(profile_mode, video_id)
+        profile_request.set(profile)
+
+    progress_sends = set()
+
+    def on_progress(stage: str, progress: Any):
+        if stage == 'segments_partial':
+            # 轉錄途中解出的字幕段落，完成後會再送出完整的 lyrics 取代
+            if not stream:
+                return
+            message = {"type": "segments_partial", "payload": progress}
+        else:
+            message = {"type": "progress", "payload": {"stage": stage, "progress": progress}}
+        task = asyncio.create_task(websocket.send_json(message))
+        progress_sends.add(task)
+        task.add_done_callback(progress_sends.discard)
+
+    # 檢查是否已有音頻文件
+    audio_path = find_audio_path(video_id)
+
+    # 下載音頻文件（如果需要），同一首歌同時只下載一次
+    # 下載轉檔途中音訊檔可能已出現，此時也要等待進行中的下載
+    if audio_path is None or job_flights.in_flight(('download', video_id)):
+        try:
+            info = await job_flights.do(
+                ('download', video_id),
+                lambda progress: download_executor.submit(
+                    download_audio, payload, video_id, priority=priority, on_progress=progress),
+                on_progress)
+        except Exception as e:
+            await websocket.send_json({"type": "error", "payload": str(e)})
+            return
     else:
-        file_size = os.path.getsize(file_path)
-        headers = {
-            'Content-Length': str(file_size),
-            'Content-Type': 'audio/mpeg',
-            'Accept-Ranges': 'bytes',
-        }
-        with open(file_path, 'rb') as f:
-            return Response(content=f.read(), headers=headers, media_type="audio/mpeg", status_code=200)
+        # 如果音頻已存在，從資訊檔取得視頻名稱（舊的下載才需要額外請求）
+        info = read_info(video_id) or await job_flights.do(
+            ('info', video_id),
+            lambda progress: download_executor.submit(
+                fetch_video_info, payload, video_id, priority=priority))
+    video_name = info.get('title') or video_id
+
+    audio_path = find_audio_path(video_id)
+    if audio_path is None:
+        await websocket.send_json({"type": "error", "payload": "Audio file not found"})
+        return
+
+    # 發送音頻路徑
+    await websocket.send_json({"type": "audio", "payload": f'/audio/{os.path.basename(audio_path)}'})
+
+    # 獲取歌詞並發送
+    try:
+        lyrics_json = await get_lyrics_by_video_name(
+            video_name, video_id, force_realign, priority, on_progress)
+        if inline:
+            with STAGE_SECONDS.time(stage='send_lyrics'):
+                await websocket.send_json({"type": "lyrics", "payload": lyrics_json})
+        else:
+            published = await asyncio.to_thread(lyrics_responses.publish, video_id, lyrics_json)
+            await websocket.send_json({"type": "json", "payload": published.message()})
+    except Exception as e:
+        await websocket.send_json({"type": "error", "payload": f"Error getting lyrics: {str(e)}"})
+
+    # 有工作被分析時送出結果網址（全部使用快取時沒有工作可分析）
+    if profile is not None and profile.jobs:
+        await websocket.send_json({"type": "profile", "payload": {"profile_id": profile.profile_id, "url": profile.url}})
+
+
+def _stored_song_title(video_id: str) -> Optional[str]:
+    """已有歌詞與音訊時回傳歌名（沒有資訊檔時為 video_id），否則回傳 None"""
+    if not lyrics_exists(video_id) or find_audio_path(video_id) is None:
+        return None
+    info = read_info(video_id) or {}
+    return info.get('title') or video_id
+
+
+async def handle_get_json(websocket: WebSocket, payload: Any):
+    """
+    處理 get_json 訊息：只送出歌詞的網址與 ETag，由瀏覽器以 HTTP 取得歌詞（可被瀏覽器與 CDN 快取）
+    payload 可為 video_id、連結，或 {"video_id": ...}
+    """
+    if isinstance(payload, dict):
+        payload = payload.get("video_id") or payload.get("url")
+    if isinstance(payload, str) and (link_match := YTMUSIC_LINK_MATCH.match(payload)):
+        payload = link_match.group(3)
+    if not isinstance(payload, str) or not VIDEO_ID_PATTERN.fullmatch(payload):
+        await websocket.send_json({"type": "error", "payload": "Invalid payload"})
+        return
+    video_id = payload
+
+    published = await asyncio.to_thread(lyrics_responses.current, video_id)
+    if published is None:
+        # 尚未發佈：已有歌詞與音訊時取得對齊後的歌詞（通常直接使用對齊快取）並發佈
+        title = await asyncio.to_thread(_stored_song_title, video_id)
+        if title is None:
+            await websocket.send_json({"type": "error", "payload": "Lyrics not found"})
+            return
+        try:
+            lyrics_json = await get_lyrics_by_video_name(title, video_id)
+            published = await asyncio.to_thread(lyrics_responses.publish, video_id, lyrics_json)
+        except Exception as e:
+            await websocket.send_json({"type": "error", "payload": f"Error getting lyrics: {str(e)}"})
+            return
+    await websocket.send_json({"type": "json", "payload": published.message()})
+
+
+async def _timed_request(kind: str, handler: Awaitable[None]):
+    """記錄 websocket 請求的處理時間與結果"""
+    started = time.perf_counter()
+    status = 'ok'
+    try:
+        await handler
+    except asyncio.CancelledError:
+        status = 'cancelled'
+        raise
+    except Exception:
+        status = 'error'
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        REQUEST_SECONDS.observe(seconds, type=kind, status=status)
+        log_event('request', type=kind, status=status, seconds=round(seconds, 3))
 
 
 @app.websocket("/api/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    while True:
-        try:
-            data: WebsocktMessageType = await websocket.receive_json()
-            print(data)
-            match data["type"]:
-                case "link":
-                    payload = data["payload"]
-                    if not isinstance(payload, str):
-                        await websocket.send_json({"type": "error", "payload": "Invalid payload"})
+    # 處理中的連結在背景執行，讓此迴圈能持續接收訊息並偵測斷線
+    link_task: Optional[asyncio.Task] = None
+    other_tasks: Set[asyncio.Task] = set()
+    try:
+        while True:
+            try:
+                data: WebsocktMessageType = await websocket.receive_json()
+                message_type = str(data.get("type"))
+                WS_MESSAGES.inc(type=message_type if message_type in ("link", "get_json", "get_audio") else "other")
+                log_event('ws_message', type=message_type, payload=data.get("payload"))
+                match data["type"]:
+                    case "link":
+                        # 新的連結取代尚未完成的連結
+                        if link_task and not link_task.done():
+                            link_task.cancel()
+                        link_task = asyncio.create_task(
+                            _timed_request("link", handle_link(websocket, data["payload"])))
                         continue
-                    if not YTMUSIC_LINK_MATCH.match(payload):
-                        await websocket.send_json({"type": "error", "payload": "Invalid link"})
+                    case "get_json":
+                        task = asyncio.create_task(
+                            _timed_request("get_json", handle_get_json(websocket, data["payload"])))
+                        other_tasks.add(task)
+                        task.add_done_callback(other_tasks.discard)
                         continue
-                    video_id = YTMUSIC_ID_MATCH.search(
-                        payload)[0]  # type: ignore
-                    if not video_id:
-                        await websocket.send_json({"type": "error", "payload": "Invalid link"})
+                    case _:
+                        await websocket.send_json({"type": "error", "payload": "Invalid type"})
                         continue
-
-                    # 檢查是否已有音頻文件
-                    audio_exists = os.path.exists(
-                        f'./downloads/audio/{video_id}.mp3')
-
-                    # 下載音頻文件（如果需要）
-                    if not audio_exists:
-                        ydl_opts = {
-                            'format': 'bestaudio/best',
-                            'postprocessors': [{
-                                'key': 'FFmpegExtractAudio',
-                                'preferredcodec': 'mp3',
-                                'preferredquality': '192',
-                            }],
-                            'outtmpl': f'./downloads/audio/{video_id}.%(ext)s',
-                        }
-                        with YoutubeDL(ydl_opts) as ydl:
-                            try:
-                                info = ydl.extract_info(payload, download=True)
-                                if (info is None):
-                                    raise Exception(
-                                        "Failed to extract video info")
-                                video_name = info.get('title', video_id)
-                            except Exception as e:
-                                await websocket.send_json({"type": "error", "payload": str(e)})
-                                continue
-                    else:
-                        # 如果音頻已存在，嘗試獲取視頻名稱（可能需要額外請求）
-                        try:
-                            with YoutubeDL({'skip_download': True}) as ydl:
-                                info = ydl.extract_info(
-                                    payload, download=False)
-                                if (info is None):
-                                    raise Exception(
-                                        "Failed to extract video info")
-                                video_name = info.get('title', video_id)
-                        except Exception:
-                            video_name = video_id  # 如果無法獲取名稱，使用ID代替
-
-                    # 發送音頻路徑
-                    await websocket.send_json({"type": "audio", "payload": f'/audio/{video_id}.mp3'})
-
-                    # 獲取歌詞並發送
-                    try:
-                        lyrics_json = await get_lyrics_by_video_name(video_name, video_id)
-                        await websocket.send_json({"type": "lyrics", "payload": lyrics_json})
-                    except Exception as e:
-                        await websocket.send_json({"type": "error", "payload": f"Error getting lyrics: {str(e)}"})
-                    continue
-                case _:
-                    await websocket.send_json({"type": "error", "payload": "Invalid type"})
-                    continue
-        except Exception as e:
-            if isinstance(e, WebSocketDisconnect):
+            except Exception as e:
+                if isinstance(e, WebSocketDisconnect):
+                    break
+                await websocket.close()
                 break
-            await websocket.close()
-            break
+    finally:
+        # 客戶端離開時，取消排隊中或執行中的下載、轉錄與對齊工作
+        if link_task and not link_task.done():
+            link_task.cancel()
+        for task in list(other_tasks):
+            task.cancel()
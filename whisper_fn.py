@@ -1,5 +1,18 @@
-import stable_whisper
 from stable_whisper.result import WhisperResult
+from stable_whisper.whisper_word_level.faster_whisper import faster_transcribe
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import config
+from model_registry import model_registry
+from job_executor import JobCancelled, JobContext, ProgressCallback, inference_executor
+from batched_transcribe import detect_language, transcribe_batch
+from metrics import TRANSCRIBE_BATCH_SONGS
+from chunked_transcribe import audio_duration, transcribe_chunked
+from stem_cache import stem_cache
+from pcm_cache import SAMPLE_RATE, pcm_cache
+from downloader import find_audio_path
+from lyrics_store import save_lyrics
 
 
 def universal_regroup(result: WhisperResult) -> WhisperResult:
@@ -21,13 +34,167 @@ def universal_regroup(result: WhisperResult) -> WhisperResult:
                           min_pause_duration=min_pause_for_split)
 
 
-async def transcribe_audio(video_id: str, model_name: str = 'medium'):
-    model = stable_whisper.load_faster_whisper(model_name)
+def segment_to_dict(segment: Any) -> Dict[str, Any]:
+    """將 faster-whisper 的段落轉為與 WhisperResult.to_dict() 相同的格式"""
+    words = [
+        {"word": word.word, "start": word.start, "end": word.end, "probability": word.probability}
+        for word in (segment.words or [])
+    ]
+    return {"start": segment.start, "end": segment.end, "text": segment.text, "words": words}
+
+
+class _SegmentTap:
+    """
+    包裝 faster-whisper 模型，每解出一個段落就立即回呼
+    stable-ts 仍會照常完成去噪、VAD 與重新分組，回呼只是提前取得原始段落
+    """
+
+    def __init__(self, model: Any, on_segment: Callable[[Dict[str, Any]], None]):
+        self._model = model
+        self._on_segment = on_segment
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._model, name)
+
+    def transcribe_original(self, audio: Any, **options):
+        segments, info = self._model.transcribe_original(audio, **options)
+        return self._tap(segments), info
+
+    def _tap(self, segments):
+        for segment in segments:
+            self._on_segment(segment_to_dict(segment))
+            yield segment
+
+
+def _prepare_audio(ctx: JobContext, video_id: str, model_name: str) -> Tuple[str, Any, Any]:
+    """取得音訊路徑、轉錄用的人聲與對齊用的音訊"""
+    aduio_file_path = find_audio_path(video_id)
+    if aduio_file_path is None:
+        raise FileNotFoundError(f"Audio file not found: {video_id}")
+
+    # Demucs 分離出的人聲依內容快取，轉錄與對齊共用
+    ctx.report('denoise', None)
+    vocals = stem_cache.get_vocal_stem(aduio_file_path)
+    ctx.check_cancelled()
+    align_audio = vocals if config.ALIGN_USE_VOCAL_STEM else pcm_cache.get_pcm(aduio_file_path)
+    ctx.annotate(video_id=video_id, model=model_name, audio_seconds=round(vocals.shape[-1] / SAMPLE_RATE, 3))
+    return aduio_file_path, vocals, align_audio
+
+
+def _align_and_save(ctx: JobContext, model: Any, video_id: str, align_audio: Any, result: Any):
+    ctx.report('align', 0)
+    result = model.align(align_audio, result,
+                         progress_callback=ctx.progress_callback('align')) # type: ignore
+    save_lyrics(video_id, result.to_dict())
+
+
+def _transcribe_audio(ctx: JobContext, video_id: str, model_name: str):
+    """在推論執行緒中轉錄並對齊音訊"""
+    aduio_file_path, vocals, align_audio = _prepare_audio(ctx, video_id, model_name)
+
+    ctx.report('load_model', None)
+    with model_registry.acquire(model_name) as model:
+        min_seconds = config.CHUNKED_TRANSCRIBE_MIN_SECONDS
+        if min_seconds > 0 and audio_duration(aduio_file_path) >= min_seconds:
+            # 長音訊在靜音處切段，交由程序池平行轉錄
+            result = transcribe_chunked(
+                ctx, vocals, model, model_name, regroup=universal_regroup)
+        else:
+            ctx.report('transcribe', 0)
+            # 解出的段落先以 segments_partial 推送，對齊完成後再以完整歌詞取代
+            streaming_model = _SegmentTap(
+                model, lambda segment: ctx.publish('segments_partial', [segment]))
+            result = faster_transcribe(
+                streaming_model, vocals, vad=True, regroup=universal_regroup, word_timestamps=True,
+                beam_size=config.WHISPER_BEAM_SIZE,
+                progress_callback=ctx.progress_callback('transcribe'), ) # type: ignore
+
+        _align_and_save(ctx, model, video_id, align_audio, result)
+
+
+def _transcribe_batch(items: List[Tuple[JobContext, tuple]]) -> List[Any]:
+    """
+    合併執行多個排隊中的轉錄工作：相同語言的歌曲以批次推論一起轉錄，再各自對齊
+    長音訊仍使用分段平行轉錄；單一工作的錯誤或取消不影響其他工作
+    """
+    results: List[Any] = [None] * len(items)
+    prepared: Dict[int, Tuple[Any, Any]] = {}
+    for i, (ctx, (video_id, model_name)) in enumerate(items):
+        try:
+            aduio_file_path = find_audio_path(video_id)
+            min_seconds = config.CHUNKED_TRANSCRIBE_MIN_SECONDS
+            if aduio_file_path is not None and min_seconds > 0 and audio_duration(aduio_file_path) >= min_seconds:
+                _transcribe_audio(ctx, video_id, model_name)
+                continue
+            _, vocals, align_audio = _prepare_audio(ctx, video_id, model_name)
+            prepared[i] = (vocals, align_audio)
+        except BaseException as e:
+            results[i] = e
+    if not prepared:
+        return results
+
+    def report(indices: List[int], stage: str) -> List[int]:
+        """回報各工作的進度，回傳尚未取消的工作"""
+        remaining = []
+        for i in indices:
+            try:
+                items[i][0].report(stage, None if stage != 'transcribe' else 0)
+                remaining.append(i)
+            except JobCancelled as e:
+                results[i] = e
+        return remaining
+
+    # 同一批次的工作使用相同的模型（batch_key 包含模型名稱）
+    model_name = items[0][1][1]
+    if not report(list(prepared), 'load_model'):
+        return results
+    with model_registry.acquire(model_name) as model:
+        languages: Dict[str, List[int]] = {}
+        for i in report(list(prepared), 'detect_language'):
+            try:
+                languages.setdefault(detect_language(model, prepared[i][0]), []).append(i)
+            except Exception as e:
+                results[i] = e
+
+        for language, indices in languages.items():
+            indices = report(indices, 'transcribe')
+            if not indices:
+                continue
+            TRANSCRIBE_BATCH_SONGS.observe(len(indices))
+
+            def on_segment(owner: int, segment: Dict[str, Any], indices: List[int] = indices):
+                ctx = items[indices[owner]][0]
+                if ctx.cancelled:
+                    return
+                ctx.publish('segments_partial', [segment])
+                duration = prepared[indices[owner]][0].shape[-1] / SAMPLE_RATE
+                try:
+                    ctx.report('transcribe', min(segment['end'] / duration, 1.0) if duration else None)
+                except JobCancelled:
+                    pass
+
+            try:
+                segments = transcribe_batch(model, [prepared[i][0] for i in indices], language, on_segment)
+            except Exception as e:
+                for i in indices:
+                    results[i] = e
+                continue
 
-    aduio_file_path = f'./downloads/audio/{video_id}.mp3'
+            for i, song_segments in zip(indices, segments):
+                ctx, (video_id, _) = items[i]
+                try:
+                    ctx.check_cancelled()
+                    result = universal_regroup(WhisperResult({"segments": song_segments, "language": language}))
+                    _align_and_save(ctx, model, video_id, prepared[i][1], result)
+                except BaseException as e:
+                    results[i] = e
+    return results
 
-    result = model.transcribe(
-        aduio_file_path, vad=True, denoiser="demucs", regroup=universal_regroup, word_timestamps=True, ) # type: ignore
 
-    result = model.align(aduio_file_path, result) # type: ignore
-    result.save_as_json(f'./downloads/lyrics/{video_id}.json')
+async def transcribe_audio(video_id: str, model_name: str = config.WHISPER_MODEL, priority: int = 0,
+                           on_progress: Optional[ProgressCallback] = None):
+    # 排隊中的其他轉錄工作會合併為一次批次推論
+    await inference_executor.submit(_transcribe_audio, video_id, model_name,
+                                    priority=priority, on_progress=on_progress,
+                                    batch_key=('transcribe', model_name), batch_fn=_transcribe_batch,
+                                    max_batch=config.TRANSCRIBE_BATCH_SONGS if config.BATCHED_TRANSCRIBE else 1)